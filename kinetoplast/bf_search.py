@@ -5,166 +5,457 @@ Date created: 05/29/2020
 Date last modified: 08/30/20120
 Python Version: 3.7.2
 '''
-from random import choice
-import networkx as nx
-import xlsxwriter
-from graph_funcs import export_graph_pic
+from bisect import bisect_left, insort
+import numpy as np
+from results_io import excel_io, excel_io_summary, summary_header
+from graph_funcs import export_graph_pic, kpGraph, from_networkx
 import os
 
-#Function to randomly remove a given number of nodes from the graph
-def dissolve(n, G):
-    #Iterate as many times as the user requests
-    for i in range(n):
-        #Remove a random node
-        G.remove_node(choice(list(G.nodes)))
+#Function to draw the order nodes will be removed in during a dissolution, as one random permutation of the graph's nodes. Drawing it once up front makes each removal
+#O(1), and since the order is just a list it can be saved with save_order() and replayed exactly. Pass a seed to get the same order every time. A kpGraph node standing for a
+#stack of boundary copies (see kpGraph.mult) is listed once per copy, so every copy is as likely to go next as any other node, just as if the copies were really there
+def removal_order(G,seed=None):
+    nodes=list(G.nodes)
+    if isinstance(G,kpGraph):
+        nodes=np.repeat(nodes,G.mult).tolist()
+    rng=np.random.default_rng(seed)
+    return [nodes[i] for i in rng.permutation(len(nodes))]
+
+#Function to save a removal order next to a datafile, so the dissolution can be replayed later
+def save_order(order,excel_name):
+    np.save(excel_name+'_order.npy',np.asarray(order))
+    return
+
+#Function to load a removal order saved by save_order()
+def load_order(excel_name):
+    return np.load(excel_name+'_order.npy').tolist()
+
+#Function to remove the next n nodes in the removal order from the graph. removed is the number of nodes already taken out, and the updated count is handed back with the graph
+def dissolve(n, G, order, removed=0):
+    G.remove_nodes_from(order[removed:(removed+n)])
     #Return the resultant graph
-    return G
+    return G, min(removed+n,len(order))
 
 #Same as dissolve(), but will flag whenever a boundary stack has been entirely wiped out
-def dissolve_flag_bound(n,G,sat,bound_dict):
+def dissolve_flag_bound(n,G,sat,bound_dict,order,removed=0):
     bound_broke=False
-    for i in range(n):
-        node=choice(list(G.nodes))
+    for node in order[removed:(removed+n)]:
         #If the node to be removed is flagged as a boundary node
         if G.nodes[node]['Bound?']:
             #Subtract one from its cell's dictionary entry. Or, if it dosen't have an entry yet, create one, noting that the cell contains one less node than the saturation
-            try:
-                bound_dict[G.nodes[node]['Cell']]-=1
-            except:
-                bound_dict[G.nodes[node]['Cell']]=(sat-1)
+            bound_dict[G.nodes[node]['Cell']]=bound_dict.get(G.nodes[node]['Cell'],sat)-1
             #If the number of nodes in the cell will be 0 once this node is removed, flag this as a new break in the boundary
             if bound_dict[G.nodes[node]['Cell']]==0:
                 bound_broke=True
         #Remove the node
         G.remove_node(node)
-    return G, bound_dict,bound_broke
+    return G, bound_dict,bound_broke,min(removed+n,len(order))
+
+#Function to find the root of a node's component in the union-find forest. Every node passed on the way up is pointed directly at the root (path compression), so repeated
+#lookups stay close to constant time
+def _find(parent,node):
+    root=node
+    while parent[root]!=root:
+        root=parent[root]
+    while parent[node]!=root:
+        parent[node],node=root,parent[node]
+    return root
+
+#Function to add one component of the given size to the size histogram. sizes is the sorted list of distinct sizes in the histogram, kept up to date so the step tuples can
+#be read off in order without sorting
+def _hist_add(hist,sizes,size):
+    if size in hist:
+        hist[size]+=1
+    else:
+        hist[size]=1
+        insort(sizes,size)
+
+#Function to take one component of the given size out of the size histogram
+def _hist_remove(hist,sizes,size):
+    if hist[size]==1:
+        del hist[size]
+        del sizes[bisect_left(sizes,size)]
+    else:
+        hist[size]-=1
+
+#Function to pull out everything uf_search() needs from a graph: its nodes, a lookup from node to position, and each node's neighbors by position. The graph itself is only
+#read, never changed, so one base can be built once and shared by any number of dissolutions of the same graph
+def base_arrays(G):
+    #A kpGraph already holds its neighbor lists as CSR arrays
+    if isinstance(G,kpGraph):
+        return csr_base(G.indptr,G.indices)
+    nodes=list(G.nodes)
+    pos={node:i for i,node in enumerate(nodes)}
+    adj=[[pos[neighbor] for neighbor in G.adj[node]] for node in nodes]
+    return nodes,pos,adj
+
+#Same as removal_order(), but draws the order from a base (from base_arrays() or csr_base()) instead of the graph, so it gives the same order for the same seed. Pass the
+#graph's multiplicities (kpGraph.mult) if it has any
+def base_removal_order(base,seed=None,mult=None):
+    nodes=base[0]
+    if mult is not None:
+        nodes=np.repeat(nodes,mult).tolist()
+    rng=np.random.default_rng(seed)
+    return [nodes[i] for i in rng.permutation(len(nodes))]
+
+#Neighbor lists read straight out of CSR arrays (see graph_funcs.graph_arrays()). adj[i] is a memoryview slice of indices, which hands back plain ints without copying
+#anything, so arrays attached from shared memory stay shared
+class csrAdjacency:
+    def __init__(self,indptr,indices):
+        self.indptr=memoryview(np.ascontiguousarray(indptr,dtype=np.int64))
+        self.indices=memoryview(np.ascontiguousarray(indices,dtype=np.int64))
+
+    def __getitem__(self,node):
+        return self.indices[self.indptr[node]:self.indptr[node+1]]
+
+    def __len__(self):
+        return len(self.indptr)-1
+
+#Function to build a base for iter_search() from CSR arrays instead of a graph, so a dissolution can run without the networkx graph at all (pass None for G, along with an order
+#from base_removal_order()). Nodes are just their positions, 0 to n-1
+def csr_base(indptr,indices):
+    num_nodes=len(indptr)-1
+    return range(num_nodes),range(num_nodes),csrAdjacency(indptr,indices)
+
+#Function to run an entire dissolution as a generator, yielding each recorded step as soon as it's known. Uses the Newman-Ziff algorithm: the removal order is fixed up front,
+#then the nodes are added back in reverse order and merged with a weighted union-find, which costs about as much as one connected_components() call. Every merge is written to a
+#log along the way (at most one entry per node), so the dissolution can then be played forward by undoing the merges one removal at a time, yielding steps in the same order
+#the old forward search found them. Only the histogram and the merge log are ever held, so memory doesn't depend on how many steps get recorded. Each step is a tuple of
+#(component size, number of components of that size) pairs, largest first, or a summary row if summary is True (see summary_search()). G is never modified; removed nodes
+#only exist in this run's own union-find arrays. Pass base (from base_arrays()) to skip rebuilding it for every run on the same graph
+def iter_search(step,G,thresh,order=None,base=None,summary=False):
+    if base is None:
+        base=base_arrays(G)
+    nodes,pos,adj=base
+    num_nodes=len(nodes)
+    #Draw the removal order if the caller didn't supply one
+    if order is None:
+        order=removal_order(G)
+    order=[pos[node] for node in order]
+    #The forward search never records anything if the graph starts out no bigger than the threshold
+    if len(order)<=thresh:
+        return
+    #An order longer than the graph lists some nodes once per boundary copy
+    if len(order)>num_nodes:
+        yield from _iter_search_mult(step,thresh,order,adj,summary)
+        return
+    #parent is the union-find forest, size holds the component size at each root, and present notes which nodes have been added back so far
+    parent=list(range(num_nodes))
+    size=[1]*num_nodes
+    present=[False]*num_nodes
+    #Histogram of component sizes, keyed by size with the number of components of that size as the entry, plus the sorted list of sizes present in it
+    hist=dict()
+    sizes=list()
+    #Running totals for the summary rows: number of components, sum of the squared component sizes, and number of edges between nodes that are back
+    num_comps=0
+    sq_sum=0
+    num_edges=0
+    #The merge log. Adding node order[k] merged the component pairs with sizes (merged_a[i],merged_b[i]) for i from log_start[k] up to log_end[k], and brought edges_added[k]
+    #edges back with it
+    merged_a=list()
+    merged_b=list()
+    log_start=[0]*num_nodes
+    log_end=[0]*num_nodes
+    edges_added=[0]*num_nodes
+    for k in range(num_nodes-1,-1,-1):
+        #Add node order[k] back to the graph as a component of its own
+        node=order[k]
+        present[node]=True
+        _hist_add(hist,sizes,1)
+        num_comps+=1
+        sq_sum+=1
+        root=node
+        log_start[k]=len(merged_a)
+        #Merge it with the component of every neighbor that is already back
+        for neighbor in adj[node]:
+            if present[neighbor]:
+                edges_added[k]+=1
+                adj_root=_find(parent,neighbor)
+                if adj_root!=root:
+                    merged_a.append(size[root])
+                    merged_b.append(size[adj_root])
+                    num_comps-=1
+                    sq_sum+=2*size[root]*size[adj_root]
+                    _hist_remove(hist,sizes,size[root])
+                    _hist_remove(hist,sizes,size[adj_root])
+                    #Hang the smaller tree off the larger one to keep the trees shallow
+                    if size[root]<size[adj_root]:
+                        root,adj_root=adj_root,root
+                    parent[adj_root]=root
+                    size[root]+=size[adj_root]
+                    _hist_add(hist,sizes,size[root])
+        log_end[k]=len(merged_a)
+        num_edges+=edges_added[k]
+    #The union-find arrays aren't needed for the forward pass
+    del parent,size,present
+    #Now play the dissolution forward. Steps are recorded after every [step] removals, and only then: if the graph runs out of nodes before the largest component gets down to
+    #the threshold, the last full step is the last one recorded. That way step i is always exactly i*step dissolutions in, which is how the results get labelled
+    for k in range(num_nodes+1):
+        if k>0:
+            #Remove node order[k-1] by undoing the merges it caused, last one first, then taking its own singleton component away
+            for i in range(log_end[k-1]-1,log_start[k-1]-1,-1):
+                _hist_remove(hist,sizes,merged_a[i]+merged_b[i])
+                _hist_add(hist,sizes,merged_a[i])
+                _hist_add(hist,sizes,merged_b[i])
+                num_comps+=1
+                sq_sum-=2*merged_a[i]*merged_b[i]
+            _hist_remove(hist,sizes,1)
+            num_comps-=1
+            sq_sum-=1
+            num_edges-=edges_added[k-1]
+        if k%step==0:
+            if summary:
+                yield _summary_row(k,hist,sizes,num_nodes-k,num_comps,sq_sum,num_edges)
+            else:
+                #Two-tuples of (component size, number of components with this size), largest components first
+                yield tuple((comp_size,hist[comp_size]) for comp_size in reversed(sizes))
+            #Stop at the first step where the largest component is no bigger than the threshold
+            if len(sizes)==0 or sizes[-1]<=thresh:
+                return
+
+#Function to change the number of components of the given size in the size histogram by change, which can be more than one either way
+def _hist_change(hist,sizes,size,change):
+    count=hist.get(size,0)+change
+    if count==0:
+        del hist[size]
+        del sizes[bisect_left(sizes,size)]
+    else:
+        if size not in hist:
+            insort(sizes,size)
+        hist[size]=count
+
+#Function to change the size histogram and note the change in the log, so it can be backed out later
+def _log_change(hist,sizes,log_size,log_change,size,change):
+    _hist_change(hist,sizes,size,change)
+    log_size.append(size)
+    log_change.append(change)
+
+#Same as iter_search(), but for a graph where some nodes stand for a whole stack of boundary copies (see kpGraph.mult), with order listing those nodes once per copy. Copies in a
+#stack never link to each other, only to the copies in the neighboring stacks, so a node with none of its neighbors back yet counts as one component of size 1 for every copy
+#of it that is back, while a node with a neighbor back pulls all of its copies into that neighbor's component. Component sizes count copies, and each removal takes away one
+#copy, so the steps come out exactly as they would have for the graph with every copy added in full. A merge can now take a whole handful of size 1 components at once, so
+#instead of merged pairs the log keeps every change made to the histogram, and the forward pass backs them out in reverse
+def _iter_search_mult(step,thresh,order,adj,summary):
+    num_nodes=len(adj)
+    num_copies=len(order)
+    #count holds how many copies of each node are back, size the number of copies in the component at each root, and verts the number of nodes in it
+    count=[0]*num_nodes
+    parent=list(range(num_nodes))
+    size=[0]*num_nodes
+    verts=[1]*num_nodes
+    hist=dict()
+    sizes=list()
+    num_comps=0
+    sq_sum=0
+    num_edges=0
+    #The change log. Adding copy order[k] changed the number of components of size log_size[i] by log_change[i] for i from log_start[k] up to log_end[k], changed the number of
+    #components by comps_added[k] and the sum of squared sizes by sq_added[k], and brought edges_added[k] edges back with it
+    log_size=list()
+    log_change=list()
+    log_start=[0]*num_copies
+    log_end=[0]*num_copies
+    comps_added=[0]*num_copies
+    sq_added=[0]*num_copies
+    edges_added=[0]*num_copies
+    for k in range(num_copies-1,-1,-1):
+        node=order[k]
+        log_start[k]=len(log_size)
+        old_comps=num_comps
+        old_sq=sq_sum
+        #The copy links to every copy of its neighbors that is already back
+        for neighbor in adj[node]:
+            edges_added[k]+=count[neighbor]
+        if count[node]>0:
+            #Another copy of a node that's already back. If the node has no neighbors back, the copy is a component of its own; otherwise it joins the node's component
+            root=_find(parent,node)
+            if verts[root]==1:
+                _log_change(hist,sizes,log_size,log_change,1,1)
+                num_comps+=1
+                sq_sum+=1
+            else:
+                _log_change(hist,sizes,log_size,log_change,size[root],-1)
+                _log_change(hist,sizes,log_size,log_change,size[root]+1,1)
+                sq_sum+=2*size[root]+1
+            size[root]+=1
+            count[node]+=1
+        else:
+            #Add the node's first copy back as a component of its own, then merge it with the component of every neighbor that is already back
+            count[node]=1
+            size[node]=1
+            _log_change(hist,sizes,log_size,log_change,1,1)
+            num_comps+=1
+            sq_sum+=1
+            root=node
+            for neighbor in adj[node]:
+                if count[neighbor]>0:
+                    adj_root=_find(parent,neighbor)
+                    if adj_root!=root:
+                        #Take both components out of the histogram. A component of a single node is one component of size 1 per copy
+                        for comp_root in (root,adj_root):
+                            if verts[comp_root]==1:
+                                _log_change(hist,sizes,log_size,log_change,1,-size[comp_root])
+                                num_comps-=size[comp_root]
+                                sq_sum-=size[comp_root]
+                            else:
+                                _log_change(hist,sizes,log_size,log_change,size[comp_root],-1)
+                                num_comps-=1
+                                sq_sum-=size[comp_root]**2
+                        #Hang the smaller tree off the larger one to keep the trees shallow
+                        if size[root]<size[adj_root]:
+                            root,adj_root=adj_root,root
+                        parent[adj_root]=root
+                        size[root]+=size[adj_root]
+                        verts[root]+=verts[adj_root]
+                        _log_change(hist,sizes,log_size,log_change,size[root],1)
+                        num_comps+=1
+                        sq_sum+=size[root]**2
+        log_end[k]=len(log_size)
+        comps_added[k]=num_comps-old_comps
+        sq_added[k]=sq_sum-old_sq
+        num_edges+=edges_added[k]
+    #The union-find arrays aren't needed for the forward pass
+    del parent,size,verts,count
+    #Now play the dissolution forward, one copy at a time, recording steps the same way iter_search() does
+    for k in range(num_copies+1):
+        if k>0:
+            #Remove copy order[k-1] by backing out the changes adding it made, last one first
+            for i in range(log_end[k-1]-1,log_start[k-1]-1,-1):
+                _hist_change(hist,sizes,log_size[i],-log_change[i])
+            num_comps-=comps_added[k-1]
+            sq_sum-=sq_added[k-1]
+            num_edges-=edges_added[k-1]
+        if k%step==0:
+            if summary:
+                yield _summary_row(k,hist,sizes,num_copies-k,num_comps,sq_sum,num_edges)
+            else:
+                yield tuple((comp_size,hist[comp_size]) for comp_size in reversed(sizes))
+            if len(sizes)==0 or sizes[-1]<=thresh:
+                return
+
+#Function to run a whole dissolution and collect every step from iter_search(). Returns the same master tuple as the old bf_search(), or an array of summary rows if summary is
+#True
+def uf_search(step,G,thresh,order=None,base=None,summary=False):
+    steps=iter_search(step,G,thresh,order,base,summary)
+    if summary:
+        return np.array(list(steps),dtype=float).reshape(-1,len(summary_header))
+    return tuple(steps)
+
+#Function to build one summary row from the union-find's running totals. The second largest component is the largest one if there's a tie for first. The mean finite cluster
+#size is the size of the component a random surviving node outside the largest component belongs to, on average (sum of s^2 over sum of s, leaving out the largest component)
+def _summary_row(dissolutions,hist,sizes,num_present,num_comps,sq_sum,num_edges):
+    largest=0
+    second=0
+    if len(sizes)>0:
+        largest=sizes[-1]
+        if hist[largest]>1:
+            second=largest
+        elif len(sizes)>1:
+            second=sizes[-2]
+    finite=num_present-largest
+    mean_finite=0
+    if finite>0:
+        mean_finite=(sq_sum-largest**2)/finite
+    return (dissolutions,largest,second,num_comps,mean_finite,num_edges)
+
+#Function to run a dissolution that only records summary statistics. Instead of every (size, count) pair, each step gets one row of summary_header: number of dissolutions,
+#largest component, second largest component, number of components, mean finite cluster size, and number of surviving edges. Returns a (steps, 6) array, so the memory and
+#output size only grow with the number of steps. Use iter_search(...,summary=True) to get the rows one at a time instead
+def summary_search(step,G,thresh,order=None,base=None):
+    return uf_search(step,G,thresh,order,base,summary=True)
 
 #Function to delete nodes and track the number and size of compoenents
-def bf_search(step,G,thresh):
-    #Define list to hold all the component zise info at every step
-    master=list()
-    #The largest component in G is assumed to contain all the nodes at the start
-    max_size=nx.number_of_nodes(G)
-    #Go until every componet in G is smaller than the given threshold size
-    while max_size>thresh:
-        #Define list to hold all the component sizes at this step
-        cur_step_info=list()
-        del cur_step_info[:]
-        #Generate a list of component sizes. There will be one entry for each component, being the number of nodes in the component. The list will be in descending order.
-        components=[len(c) for c in sorted(nx.connected_components(G), key=len, reverse=True)]
-        prev_component=0
-        #Run through each component length
-        for component in components:
-            #If the components with this length have not already been tallied
-            if component !=prev_component:
-                #Add a two-tuple to the current step list, the first element being the length of the component, the second being the number of components with this length
-                cur_step_info.append((component,components.count(component)))
-                prev_component=component
-        #Add the current step info to the master list
-        master.append(tuple(cur_step_info))
-        #Get the largest component at this step
-        max_size=components[0]
-        #Dissolve more nodes in G
-        G=dissolve(step,G)
-    #Return the master list
-    return tuple(master)
+def bf_search(step,G,thresh,order=None,base=None):
+    #The union-find dissolution does all the work; see iter_search(), which hands out the same steps one at a time
+    return uf_search(step,G,thresh,order,base)
 
-#Does the same thing as bf_search(), but also records when the first and second breaks in the boundary ring appear
-def bf_search_flag_bound(step,G,thresh,sat):
-    master=list()
-    max_size=nx.number_of_nodes(G)
+#Does the same thing as iter_search(), but also records when the first and second breaks in the boundary ring appear
+def iter_search_flag_bound(step,G,thresh,sat,order=None,base=None):
+    #Fix the removal order here so the boundary breaks can be found from the same order the union-find uses
+    if order is None:
+        order=removal_order(G)
+    #Look up the boundary flags of every node. A kpGraph keeps them in arrays indexed by node
+    if isinstance(G,kpGraph):
+        bound=G.bound.tolist()
+        cell=G.cell.tolist()
+    else:
+        bound={node:G.nodes[node]['Bound?'] for node in G.nodes}
+        cell={node:G.nodes[node].get('Cell') for node in G.nodes}
     bound_dict=dict()
-    first_broke=True
-    second_broke=True
-    bound_broke=False
-    while max_size>thresh:
-        cur_step_info=list()
-        del cur_step_info[:]
-        components=[len(c) for c in sorted(nx.connected_components(G), key=len, reverse=True)]
-        prev_component=0
-        for component in components:
-            if component !=prev_component:
-                cur_step_info.append((component,components.count(component)))
-                prev_component=component
-        #If we have not yet had the first hole in the boundary appear and a hole in the boundary has just appeared
-        if first_broke and bound_broke:
-            #Note it in the output file
-            master.append(tuple(cur_step_info+['Boundary Breaks Here']))
-            first_broke=False
-        #If we have had one hole in the boundary appear but not two, and a new hole in the boundary has just appeared
-        elif second_broke and bound_broke:
-            #Flag it in the output file
-            master.append(tuple(cur_step_info+['Boundary Splits in Two Here']))
-            second_broke=False
-        else:
-            master.append(tuple(cur_step_info))
-        max_size=components[0]
-        G, bound_dict,bound_broke=dissolve_flag_bound(step,G,sat,bound_dict)
-    return tuple(master)
+    breaks=list()
+    #Run through the removals in order
+    for removal in range(len(order)):
+        node=order[removal]
+        #If the node to be removed is flagged as a boundary node
+        if bound[node]:
+            #Subtract one from its cell's dictionary entry, noting that the cell starts out with as many nodes as the saturation
+            bound_dict[cell[node]]=bound_dict.get(cell[node],sat)-1
+            #If the cell is now empty, the boundary breaks during this step's dissolutions, so the break shows up at the next recorded step
+            if bound_dict[cell[node]]==0:
+                breaks.append(removal//step+1)
+    first=None
+    second=None
+    if len(breaks)>0:
+        first=breaks[0]
+        #The second break has to come from a later step than the first one
+        later=[b for b in breaks if b>first]
+        if len(later)>0:
+            second=later[0]
+    for i,cur_step_info in enumerate(iter_search(step,G,thresh,order,base)):
+        #Note the first hole in the boundary in the output file, and the step where the boundary splits in two
+        if i==first:
+            cur_step_info=cur_step_info+('Boundary Breaks Here',)
+        elif i==second:
+            cur_step_info=cur_step_info+('Boundary Splits in Two Here',)
+        yield cur_step_info
 
-#Doest the same thing as bf-search(), but also periodically exports component plots at pre-defined dissolution steps (called "critical points")
-def bf_search_with_pics(step,G,thresh,crit_points,path):
+#Does the same thing as bf_search(), but also records when the first and second breaks in the boundary ring appear
+def bf_search_flag_bound(step,G,thresh,sat,order=None,base=None):
+    return tuple(iter_search_flag_bound(step,G,thresh,sat,order,base))
+
+#Does the same thing as iter_search(), but also periodically exports component plots at pre-defined dissolution steps (called "critical points"). G isn't modified; the
+#dissolved graph is tracked with a mask of the nodes still alive, and the pictures leave out the nodes that aren't
+def iter_search_with_pics(step,G,thresh,crit_points,path,order=None,base=None):
     #Create a file to house the component plots, if it does not already exist
     if not os.path.exists(path):
         os.makedirs(path)
-    dissolutions=0
+    #The pictures are drawn from a kpGraph. Its nodes are numbered in the same order as the base's, so the alive mask lines up with them
+    pic_graph=G
+    if not isinstance(G,kpGraph):
+        pic_graph=from_networkx(G)
     #Export a component plot before anything has happened
-    export_graph_pic(G,dissolutions,path)
-    #Define list to hold all the component zise info at every step
-    master=list()
-    #The largest component in G is assumed to contain all the nodes at the start
-    max_size=nx.number_of_nodes(G)
-    #Go until every componet in G is smaller than the given threshold size
-    while max_size>thresh:
-        #If we are at a critical point, export a component picture
+    export_graph_pic(pic_graph,0,path)
+    #Fix the removal order so the pictures can be taken along the same dissolution the union-find tracks
+    if order is None:
+        order=removal_order(G)
+    if base is None:
+        base=base_arrays(G)
+    nodes,pos,adj=base
+    #A node stays in the pictures until every one of its boundary copies has been removed
+    left=[0]*len(nodes)
+    for node in order:
+        left[pos[node]]+=1
+    alive=[True]*len(nodes)
+    removed=0
+    num_steps=0
+    #Run through each recorded step
+    for cur_step_info in iter_search(step,G,thresh,order,base):
+        dissolutions=num_steps*step
+        #If we are at a critical point, catch the mask up to this step and export a component picture
         if dissolutions in crit_points:
-            export_graph_pic(G,dissolutions,path)
-        #Define list to hold all the component sizes at this step
-        cur_step_info=list()
-        del cur_step_info[:]
-        #Generate a list of component sizes. There will be one entry for each component, being the number of nodes in the component. The list will be in descending order.
-        components=[len(c) for c in sorted(nx.connected_components(G), key=len, reverse=True)]
-        prev_component=0
-        #Run through each component length
-        for component in components:
-            #If the components with this length have not already been tallied
-            if component !=prev_component:
-                #Add a two-tuple to the current step list, the first element being the length of the component, the second being the number of components with this length
-                cur_step_info.append((component,components.count(component)))
-                prev_component=component
-        #Add the current step info to the master list
-        master.append(tuple(cur_step_info))
-        #Get the largest component at this step
-        max_size=components[0]
-        #Dissolve more nodes in G
-        G=dissolve(step,G)
-        dissolutions+=step
-    #At the end, export one last component picture
-    export_graph_pic(G,dissolutions,path)
-    #Return the master list
-    return tuple(master)
-
-#Function to write results to file
-def excel_io(master,step_size, excel_name):
-    #Create output file
-    workbook=xlsxwriter.Workbook(excel_name+".xlsx")
-    #Add a worksheet to the output file
-    worksheet = workbook.add_worksheet()
-    #Add header
-    worksheet.write(0, 0, 'Dissolutions; Step size = '+str(step_size))
-    worksheet.write(0, 1, 'From here on, columns give pairs of numbers, 1st being component size and 2nd being the number of components of that size')
-    cur_row=1
-    #Run through each step
-    for step in master:
-        #Write the number of dissolutions at this step in the left column
-        worksheet.write(cur_row, 0, str(((cur_row-1)*step_size)))
-        cur_col=1
-        #Run through each component size tuple
-        for component in step:
-            #Write the tuple to the file
-            worksheet.write(cur_row, cur_col, str(component))
-            cur_col+=1
-        cur_row+=1
-    #Closet the output workbook
-    workbook.close()
-    return
+            for node in order[removed:dissolutions]:
+                left[pos[node]]-=1
+                alive[pos[node]]=left[pos[node]]>0
+            removed=dissolutions
+            export_graph_pic(pic_graph,dissolutions,path,alive)
+        num_steps+=1
+        yield cur_step_info
+    #At the end, dissolve the final step and export one last component picture
+    dissolutions=min(num_steps*step,len(order))
+    for node in order[removed:dissolutions]:
+        left[pos[node]]-=1
+        alive[pos[node]]=left[pos[node]]>0
+    export_graph_pic(pic_graph,dissolutions,path,alive)
+
+#Doest the same thing as bf-search(), but also periodically exports component plots at pre-defined dissolution steps (called "critical points")
+def bf_search_with_pics(step,G,thresh,crit_points,path,order=None,base=None):
+    return tuple(iter_search_with_pics(step,G,thresh,crit_points,path,order,base))
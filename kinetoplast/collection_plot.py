@@ -9,12 +9,12 @@ Python Version: 3.11.1
 Like collection_plot, but better in every way. Switched from xlrd to openpyxl, and now compatible with new file heirarchy
 '''
 
-import openpyxl
 import os
 from matplotlib.collections import LineCollection
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 import numpy as np
+import results_io as rio
 
 class collectionPlot:
     def __init__(self,folder,autogenFolder=False):
@@ -37,8 +37,9 @@ class collectionPlot:
         all_y={}
         fileLis=os.listdir(self.infolder)
         for f in fileLis:
-            if self._isExcel(f):
-                f2=f.rstrip('.xlsx')
+            #compTracker saves the averages as .npz files, and used to save them as excel files. Skip excel files that just duplicate an .npz file
+            if self._isResults(f) or (self._isExcel(f) and f.split('.')[0]+'.npz' not in fileLis):
+                f2=f.split('.')[0]
                 f_lis=f2.split('sat')
                 satstr=''
                 for a in f_lis[-1]:
@@ -46,9 +47,15 @@ class collectionPlot:
                         satstr+=a
                 sat=int(satstr)
                 all_dat[f]=['','',sat]
-                all_dat[f][0],all_dat[f][1]=self.read_data(f)
+                if self._isResults(f):
+                    all_dat[f][0],all_dat[f][1]=self.read_results_data(f)
+                else:
+                    all_dat[f][0],all_dat[f][1]=self.read_data(f)
         return all_dat
 
+    def _isResults(self,f):
+        return f.split('.')[-1]=='npz'
+
     def _isExcel(self,f):
         fLis=f.split('.')
         ext=fLis[1]
@@ -56,40 +63,17 @@ class collectionPlot:
             return True
         else:
             return False
-    #Function to load bf_search output datafile
-    def excel_loader(self,io_name):
-        #Load the workbook
-        wb=openpyxl.load_workbook(io_name)
-        #Return the workbook and worksheet
-        return wb, wb[wb.sheetnames[0]]
-        
+    #Function to read an xlsx file of averages written by compTracker.export_data()
     def read_data(self,f):
-        wb,ws=self.excel_loader(self.infolder+f)
-        #Get total number of rows. For whatever reason the indexing starts at 1 in this module, not 0
-        tot_rows=ws.max_row
-        #Row 1 is header. Start at row 2
-        cur_row=2
-        x_coords=list()
-        y_coords=list()
-        while cur_row<=tot_rows:
-            #The x-coordinate (number of dissolutions) is the same for all points in the row
-            x_coord=int(ws.cell(cur_row,1).value)
-            x_coords.append(x_coord)
-            #Colummn 1 is the number of dissolutions. Starting with column 2, each entry is a pair: (component size, number of components with this size)
-            cur_col=2
-            #Get the pair as a string
-            cur_y=ws.cell(cur_row,cur_col).value
-            y_coords_cur=[]
-            #An empty cell returns None type; go until we run into that
-            while cur_y!=None :
-                y_coords_cur.append(cur_y)
-                cur_col+=1
-                cur_y=ws.cell(cur_row,cur_col).value
-            y_coords.append(tuple(y_coords_cur))
-            del y_coords_cur[:]
-            cur_row+=1
-        wb.close()
-        return tuple(x_coords),tuple(y_coords)
+        return self.averages_data(rio.read_excel_averages(self.infolder+f))
+
+    #Same as read_data(), but for the .npz files compTracker.export_data() writes
+    def read_results_data(self,f):
+        with np.load(self.infolder+f) as dat:
+            return self.averages_data(dat)
+
+    def averages_data(self,dat):
+        return tuple(dat['dissolutions'].tolist()),tuple(tuple(y) for y in dat['avg_sizes'].tolist())
 
 #Code courtesy of Brendan Artley
     def hex_to_RGB(self,hex_str):
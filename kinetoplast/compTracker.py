@@ -9,9 +9,11 @@ import openpyxl
 from matplotlib import pyplot as plt
 import os
 import numpy as np
+import results_io as rio
 
 class compTracker:
-    def __init__(self,folder,autogenFolder=False,thresh=0):
+    #If results (a list of dissolutionResults, like the ones the kinetoplast dissolve methods return) is given, those are averaged instead of the datafiles in the folder
+    def __init__(self,folder,autogenFolder=False,thresh=0,results=None):
         if folder[-1]!='\\':
             folder+='\\'
         self.folder=folder
@@ -27,7 +29,10 @@ class compTracker:
         self.min_x=np.inf
         self.max_num_y=0
         self.num_f=0
-        self.all_dat=self._load_data()
+        if results is None:
+            self.all_dat=self._load_data()
+        else:
+            self.all_dat=self._use_results(results)
         self.averager()
         return
 
@@ -38,12 +43,33 @@ class compTracker:
         all_y={}
         fileLis=os.listdir(self.infolder)
         for f in fileLis:
-            if self._isExcel(f):
+            if self._isResults(f):
+                results=rio.read_results(self.infolder+f)
+            #Old runs were saved as excel files. Skip any that are just an export of a results file that's already being read
+            elif self._isExcel(f) and f.split('.')[0]+'.npz' not in fileLis:
+                results=rio.read_excel(self.infolder+f)
+            else:
+                continue
+            #Summary-only runs don't have the component sizes this needs
+            if not rio.is_summary(results):
                 self.num_f+=1
                 all_dat[f]=['','']
-                all_dat[f][0],all_dat[f][1]=self.read_data(f)
+                all_dat[f][0],all_dat[f][1]=self.read_results_data(results)
+        return all_dat
+
+    #Same as _load_data(), but for results that are already in memory
+    def _use_results(self,results):
+        all_dat={}
+        for i in range(len(results)):
+            if not rio.is_summary(results[i]):
+                self.num_f+=1
+                all_dat[i]=['','']
+                all_dat[i][0],all_dat[i][1]=self.read_results_data(results[i])
         return all_dat
 
+    def _isResults(self,f):
+        return f.split('.')[-1]=='npz'
+
     def _isExcel(self,f):
         fLis=f.split('.')
         ext=fLis[1]
@@ -52,43 +78,21 @@ class compTracker:
         else:
             return False
         
-    def read_data(self,f):
-        wb,ws=self.excel_loader(self.infolder+f)
-        #Get total number of rows. For whatever reason the indexing starts at 1 in this module, not 0
-        tot_rows=ws.max_row
-        #Row 1 is header. Start at row 2
-        cur_row=2
-        x_coords=list()
+    #Function to pull the dissolution counts and the component sizes at each step out of results loaded with results_io.read_results() or results_io.read_excel()
+    def read_results_data(self,results):
+        x_coords=tuple(results['dissolutions'].tolist())
         y_coords=list()
-        while cur_row<=tot_rows:
-            #The x-coordinate (number of dissolutions) is the same for all points in the row
-            x_coord=int(ws.cell(cur_row,1).value)
-            x_coords.append(x_coord)
-            #Colummn 1 is the number of dissolutions. Starting with column 2, each entry is a pair: (component size, number of components with this size)
-            cur_col=2
-            #Get the pair as a string
-            cur_pair=ws.cell(cur_row,cur_col).value
-            y_coords_cur=[]
-            #An empty cell returns None type; go until we run into that
-            while cur_pair!=None and cur_pair!='Boundary Breaks Here' and cur_pair!='Boundary Splits in Two Here':
-                #Convert string to a tuple. The first element is the component size (which we want) and the second is the number of componenets of that size (which we don't)
-                cur_pair=eval(cur_pair)
-                #Omit components with size < the threshold size
-                if cur_pair[0]>=self.thresh:
-                    y_coords_cur.append(cur_pair[0])
-                cur_col+=1
-                cur_pair=ws.cell(cur_row,cur_col).value
-            y_coords.append(tuple(y_coords_cur))
-            del y_coords_cur[:]
-            if cur_col-2>self.max_num_y:
-                self.max_num_y=cur_col-2
-            cur_row+=1
-        if cur_row-2>self.max_x:
-            self.max_x=cur_row-2
-        if cur_row-2<self.min_x:
-            self.min_x=cur_row-2
-        wb.close()
-        return tuple(x_coords),tuple(y_coords)
+        #Omit components with size < the threshold size
+        for sizes in rio.step_sizes(results):
+            y_coords.append(tuple(sizes[sizes>=self.thresh].tolist()))
+        num_steps=len(x_coords)
+        if num_steps>0 and np.diff(results['offsets']).max()>self.max_num_y:
+            self.max_num_y=int(np.diff(results['offsets']).max())
+        if num_steps>self.max_x:
+            self.max_x=num_steps
+        if num_steps<self.min_x:
+            self.min_x=num_steps
+        return x_coords,tuple(y_coords)
 
     #Only data up to the run with the smallest number of dissolution steps will be used
     def averager(self):
@@ -111,13 +115,6 @@ class compTracker:
         self.avg_y=tuple(sum_y)
         return
         
-    #Function to load bf_search output datafile
-    def excel_loader(self,io_name):
-        #Load the workbook
-        wb=openpyxl.load_workbook(io_name)
-        #Return the workbook and worksheet
-        return wb, wb[wb.sheetnames[0]]
-
     def plotLargestComp(self):
         ydat=list(k[0] for k in self.avg_y)
         #Create the figure object
@@ -146,11 +143,15 @@ class compTracker:
         plt.clf()
         return
 
-    def export_data(self,outfolder='',extraName=''):
+    def export_data(self,outfolder='',extraName='',excel=False):
         if outfolder=='':
             outfolder=self.infolder
         if outfolder[-1]!='\\':
             outfolder+='\\'
+        #Save the averages as a results_io-style .npz file for collectionPlot to read. The excel version is optional
+        np.savez_compressed(outfolder+'average_component_sizes'+extraName+'.npz',dissolutions=np.array(self.avg_x),avg_sizes=np.array(self.avg_y,dtype=float))
+        if not excel:
+            return
         wb=openpyxl.Workbook()
         ws=wb.active
         ws['A1']='Dissolutions'
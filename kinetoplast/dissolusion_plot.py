@@ -8,72 +8,35 @@ Python Version: 3.7.2
 '''
 Generates a plot of bf_search data
 '''
-import openpyxl
+import numpy as np
 import matplotlib.pyplot as plt
+import results_io as rio
 
-#Function to load bf_search output datafile
-def excel_loader(io_name):
-    #Load the workbook
-    wb=openpyxl.load_workbook(io_name+'.xlsx')
-    #Return the workbook and worksheet
-    return wb, wb[wb.sheetnames[0]]
+#Function to gather the x-y coordinate data from an xlsx datafile written by excel_io(). Returns the same things as results_retriever()
+def data_retriever(io_name,flag_bound,thresh):
+    return results_retriever(rio.read_excel(io_name),flag_bound,thresh)
 
-#Function to gather the x-y coordinate data from the datafile
-def data_retriever(ws,flag_bound,thresh):
-    #Get total number of rows. For whatever reason the indexing starts at 1 in this module, not 0
-    tot_rows=ws.max_row
-    #Row 1 is header. Start at row 2
-    cur_row=2
-    x_coords=list()
-    y_coords=list()
+#Function to gather the x-y coordinate data from results loaded with results_io.read_results(). Returns the same things as data_retriever()
+def results_retriever(results,flag_bound,thresh):
+    #Every component size at a step gets plotted at that step's number of dissolutions
+    x_coords=np.repeat(results['dissolutions'],np.diff(results['offsets']))
+    y_coords=results['sizes']
+    #Omit components with size < the threshold size
+    keep=y_coords>=thresh
     bound_break_x1=''
     bound_break_y1=''
     bound_break_x2=''
     bound_break_y2=''
-    #Run through each row
-    while cur_row<=tot_rows:
-        #The x-coordinate (number of dissolutions) is the same for all points in the row
-        x_coord=int(ws.cell(cur_row,1).value)
-        #Colummn 1 is the number of dissolutions. Starting with column 2, each entry is a pair: (component size, number of components with this size)
-        cur_col=2
-        #Get the pair as a string
-        cur_pair=ws.cell(cur_row,cur_col).value
-        #An empty cell returns None type; go until we run into that
-        while cur_pair!=None and cur_pair!='Boundary Breaks Here' and cur_pair!='Boundary Splits in Two Here':
-            #Convert string to a tuple. The first element is the component size (which we want) and the second is the number of componenets of that size (which we don't)
-            try:
-                cur_pair=eval(cur_pair)
-            except:
-                print(type(cur_pair))
-                int('a')
-            #Omit components with size < the threshold size
-            if cur_pair[0]>=thresh:
-                y_coords.append(cur_pair[0])
-                x_coords.append(x_coord)
-            cur_col+=1
-            cur_pair=ws.cell(cur_row,cur_col).value
-        #If the user wants to flag where the boundary first breaks apart
-        if flag_bound:
-            #Find the row in the datafile with the phrase 'Boundary Breaks Here' printed after the list of component sizes
-            if cur_pair=='Boundary Breaks Here':
-                bound_break_x1=list()
-                bound_break_y1=list()
-                #Take note of the x/y values at this step.
-                for i in range(len(x_coords)):
-                    if x_coords[i]==x_coord:
-                        bound_break_y1.append(y_coords[i])
-                        bound_break_x1.append(x_coord)
-            #Do same for the row with the phrase 'Boundary Splits in Two Here'
-            elif cur_pair=='Boundary Splits in Two Here':
-                bound_break_x2=list()
-                bound_break_y2=list()
-                for i in range(len(x_coords)):
-                    if x_coords[i]==x_coord:
-                        bound_break_y2.append(y_coords[i])
-                        bound_break_x2.append(x_coord)
-        cur_row+=1
-    #Return the x and y coordinate tuples
-    return tuple(x_coords),tuple(y_coords),bound_break_x1,bound_break_y1,bound_break_x2,bound_break_y2
+    #If the user wants to flag where the boundary first breaks apart, take note of the x/y values at the steps flagged as the first break and the split into two
+    if flag_bound:
+        step_of=np.repeat(results['flags'],np.diff(results['offsets']))
+        if np.any(results['flags']==1):
+            bound_break_x1=x_coords[keep&(step_of==1)].tolist()
+            bound_break_y1=y_coords[keep&(step_of==1)].tolist()
+        if np.any(results['flags']==2):
+            bound_break_x2=x_coords[keep&(step_of==2)].tolist()
+            bound_break_y2=y_coords[keep&(step_of==2)].tolist()
+    return tuple(x_coords[keep].tolist()),tuple(y_coords[keep].tolist()),bound_break_x1,bound_break_y1,bound_break_x2,bound_break_y2
 
 #Function do the actual plotting
 def plotter(x_coords, y_coords,io_name,bound_break_x1,bound_break_y1,bound_break_x2,bound_break_y2,flag_bound):
@@ -99,11 +62,14 @@ def plotter(x_coords, y_coords,io_name,bound_break_x1,bound_break_y1,bound_break
 
 #Function to allow this program to act as an externally-called module rather than a script
 def module_main(pic_io_name,data_io_name,flag_bound=False,thresh=10):
-    #Grab the input datafile
-    wb,ws=excel_loader(data_io_name)
-    #Extract point coordinates from the datafile
-    x_coords, y_coords,bound_break_x1,bound_break_y1,bound_break_x2,bound_break_y2=data_retriever(ws,flag_bound,thresh)
-    wb.close()
+    #Grab the input datafile and plot it
+    plot_results(pic_io_name,rio.read_results(data_io_name),flag_bound,thresh)
+    return
+
+#Function to plot results that are already in memory, like the dissolutionResults the kinetoplast dissolve methods return
+def plot_results(pic_io_name,results,flag_bound=False,thresh=10):
+    #Extract point coordinates from the results
+    x_coords, y_coords,bound_break_x1,bound_break_y1,bound_break_x2,bound_break_y2=results_retriever(results,flag_bound,thresh)
     #Generate the plot
     plotter(x_coords,y_coords,pic_io_name,bound_break_x1,bound_break_y1,bound_break_x2,bound_break_y2,flag_bound)
     return
@@ -113,10 +79,8 @@ if __name__=='__main__':
     flag_bound=False
     #Define the name of the both the input and output files
     io_name="20200607_RKP_NM_hexagonalGrid_10"
-    #Grab the input datafile
-    wb,ws=excel_loader(io_name)
-    #Extract point coordinates from the datafile
-    x_coords, y_coords,bound_break_x1,bound_break_y1,bound_break_x2,bound_break_y2=data_retriever(ws,flag_bound)
+    #Grab the input datafile and extract point coordinates from it
+    x_coords, y_coords,bound_break_x1,bound_break_y1,bound_break_x2,bound_break_y2=data_retriever(io_name,flag_bound,10)
     #Generate the plot
     plotter(x_coords,y_coords,io_name,bound_break_x1,bound_break_y1,bound_break_x2,bound_break_y2,flag_bound)
 #main()
@@ -8,62 +8,19 @@ Python Version: 3.7.2
 '''
 Generates a plot of bf_search data
 '''
-import xlrd
 import matplotlib.pyplot as plt
 import os
+import results_io as rio
 
-#Function to load bf_search output datafile
-def excel_loader(path):
-    #Load the workbook
-    wb=xlrd.open_workbook(path+'.xlsx')
-    #Return the workbook and worksheet
-    return wb, wb.sheets()[0]
-
-#Function to gather the x-y coordinate data from the datafile
-def data_retriever(ws):
-    #Get total number of rows
-    tot_rows=ws.nrows - 1
-    #Row 0 is header. Start at row 1
-    cur_row=1
-    x_coords=list()
+#Function to gather the x-y coordinate data from a datafile written by excel_io()
+def data_retriever(path):
+    results=rio.read_excel(path)
     y_coords=list()
-    #Run through each row
-    while cur_row<=tot_rows:
-        #The x-coordinate (number of dissolutions) is the same for all points in the row
-        x_coord=int(str(ws.cell(cur_row, 0)).lstrip("text: '").rstrip("'"))
-        #Colummn 0 is the number of dissolutions. Starting with column 1, each entry is a pair: (component size, number of components with this size)
-        cur_col=1
-        y_coord_row=list()
-        del y_coord_row[:]
-        #Get the pair as a string
-        cur_pair=str(ws.cell(cur_row,cur_col)).lstrip("text: '").rstrip("'")
-        #When an empty cell is reached, it will return "mpty: ''". So, go until this is returned
-        while cur_pair[0]=='(':
-            #Start extracting the y_coordinate
-            y_coord_raw=''
-            #Run through each character in the pair string
-            for el in cur_pair[1:]:
-                #When we hit a comma, we're done
-                if el!=',':
-                    y_coord_raw+=el
-                else:
-                    break
-            #Omit components with size <= the threshold size (10)
-            if int(y_coord_raw)>10:
-                y_coord_row.append(int(y_coord_raw))
-            cur_col+=1
-            #For the rows with maximum length, the ws object dosen't even load further empty columns, so this will return an error. If this happens, we are done processing
-            #the row
-            try:
-                cur_pair=str(ws.cell(cur_row,cur_col)).lstrip("text: '").rstrip("'")
-            except:
-                break
-        #Add the x and y coordinates to the master lists, with the y-values being a tuple associated with the x-value
-        x_coords.append(x_coord)
-        y_coords.append(tuple(y_coord_row))
-        cur_row+=1
+    for sizes in rio.step_sizes(results):
+        #Omit components with size <= the threshold size (10)
+        y_coords.append(tuple(sizes[sizes>10].tolist()))
     #Return the x and y coordinate tuples
-    return tuple(x_coords),tuple(y_coords)
+    return tuple(results['dissolutions'].tolist()),tuple(y_coords)
 
 #Function do the actual plotting
 def plotter(x_coords, y_coords,export_name,io_name):
@@ -122,8 +79,7 @@ if __name__=='__main__':
     for file_name in os.listdir():
         if file_name[-5:]=='.xlsx':
             path=direct+'\\'+file_name
-            wb,ws=excel_loader(path)
-            x_coords, y_coords=data_retriever(ws)
+            x_coords, y_coords=data_retriever(path)
             #Add them to the appropriate lists
             x_master.append(x_coords)
             y_master.append(y_coords)
@@ -131,4 +87,4 @@ if __name__=='__main__':
     x_coords, y_coords=medianizer(x_master, y_master)
     #Generate the plot
     plotter(x_coords,y_coords,export_name,io_name)
-main()
+#main()
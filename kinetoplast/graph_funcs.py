@@ -7,14 +7,27 @@ Python Version: 3.7.2
 '''
 import networkx as nx
 import numpy as np
+from scipy.sparse import csr_matrix, issparse
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from multiprocessing import shared_memory
+
+#Function to pull the edges out of an adjacency matrix as an (n,2) array, lower index first. Each edge shows up once, ordered by its lower index and then its higher one
+def edge_array(adj_mtx):
+    #The compilers hand over a sparse adjacency matrix. A dense one still works (handy when debugging small grids), but gets converted
+    if not issparse(adj_mtx):
+        adj_mtx=csr_matrix(np.asarray(adj_mtx))
+    adj_mtx=csr_matrix(adj_mtx)
+    rows=np.repeat(np.arange(adj_mtx.shape[0]),np.diff(adj_mtx.indptr))
+    cols=adj_mtx.indices
+    upper=cols>rows
+    return np.column_stack((rows[upper],cols[upper]))
 
 #Function to turn the grid and adjacency matrix into a networkx graph object
 def to_network(adj_mtx,grid,idm, flag_bound=False):
-    #Create an empty graph object
-    G=nx.Graph()
-    #Add every center as a node in the graph
-    G.add_nodes_from(range((len(adj_mtx))))
+    num_nodes=adj_mtx.shape[0]
+    #Gather each node's attributes into a list indexed by node index
+    attrs=[dict() for i in range(num_nodes)]
     cell_num=0
     #Run through each row in the grid
     for ybox in range(len(grid)):
@@ -29,72 +42,277 @@ def to_network(adj_mtx,grid,idm, flag_bound=False):
                 node_ind=idm[ybox][xbox][node]
                 coords=cell[node]
                 #Assign the center's node the coordinates in the grid
-                G.nodes[node_ind]['Coords']=coords
+                attrs[node_ind]['Coords']=coords
                 #If we're flagging the boundary
                 if flag_bound:
-                    #If the last entry in the node tuple flags this as a boundary cell
+                    #If the last entry in the node tuple flags this as a boundary cell, the whole stack from here on is flagged as a boundary
                     if coords[-1]==True:
-                        #Flag this as a boundary cell
                         bound_cell=True
-                    #If the first node in this cell was flagged as a boundary, thereby flagging the whole stack as a boundary
+                    #Boundary nodes get a 'Bound?' property with a value of True and a "Cell" number to identify them with other nodes in the same boundary cell. Everything else
+                    #gets a value of False to maintain consistancy across all nodes
+                    attrs[node_ind]['Bound?']=bound_cell
                     if bound_cell:
-                        #Give the node a 'Bound?' property with a value of True
-                        G.nodes[node_ind]['Bound?']=True
-                        #Assign the stack/box in which this node lives a unique "Cell" number to identify it with other nodes in the same boundary cell
-                        G.nodes[node_ind]['Cell']=cell_num
-                    else:
-                        #Give it a value of False to maintain consistancy across all nodes
-                        G.nodes[node_ind]['Bound?']=False
-                #Find all vertices the current node is already linked to
-                cur_neighbors=nx.neighbors(G,node_ind)
-                #Run through the node's row in the adjacency matrix
-                for ind2 in range(len(adj_mtx[node_ind])):
-                    #If there is not already an edge connecting the two nodes and the adjacency matrix says there should be
-                    if ind2 not in cur_neighbors and adj_mtx[node_ind][ind2]==1:
-                        #Add an edge
-                        G.add_edge(node_ind,ind2)
+                        attrs[node_ind]['Cell']=cell_num
+    #Create the graph and add every node with its attributes, then every edge, in one go each. Adding the edges lower index first in ascending order gives every node the same
+    #neighbor ordering the old row-by-row scan did
+    G=nx.Graph()
+    G.add_nodes_from(zip(range(num_nodes),attrs))
+    G.add_edges_from(edge_array(adj_mtx).tolist())
     return G
 
+#Compact graph of the kinetoplast model, backed by NumPy arrays instead of networkx's dict-of-dicts. Nodes are numbered 0 to n-1. The neighbors of node i are
+#indices[indptr[i]:indptr[i+1]], in ascending order (the same CSR layout scipy uses), and every edge shows up once from each end. coords holds each node's x and y coordinates
+#and rad its radius. flag is the optional last entry of the node's grid tuple (1 for True, 0 for False, -1 if the tuple doesn't have one), and bound and cell are the boundary
+#flags, with a cell of -1 for nodes outside any boundary cell. mult is the number of identical boundary copies each node stands for (see grid_gen.stack_multiplicity()), 1 for
+#an ordinary node. The dissolution search, degree statistics, and plotting all work on it directly; use to_networkx() to get a networkx graph for anything else
+class kpGraph:
+    __slots__=('indptr','indices','coords','rad','flag','bound','cell','mult')
+
+    def __init__(self,indptr,indices,coords,rad,flag,bound,cell,mult=None):
+        self.indptr=indptr
+        self.indices=indices
+        self.coords=coords
+        self.rad=rad
+        self.flag=flag
+        self.bound=bound
+        self.cell=cell
+        if mult is None:
+            mult=np.ones(len(indptr)-1,dtype=np.int64)
+        self.mult=mult
+
+    @property
+    def nodes(self):
+        return range(len(self.indptr)-1)
+
+    def number_of_nodes(self):
+        return len(self.indptr)-1
+
+    def number_of_edges(self):
+        return len(self.indices)//2
+
+    #Method to get every node's degree as an array
+    def degree(self):
+        return np.diff(self.indptr)
+
+    #Method to get the degree each copy of every node would have if every boundary copy were really there: a link to a node standing for several copies is a link to each of
+    #them. Same as degree() when nothing has a multiplicity
+    def copy_degree(self):
+        rows=np.repeat(np.arange(self.number_of_nodes()),self.degree())
+        return np.bincount(rows,weights=self.mult[self.indices],minlength=self.number_of_nodes()).astype(np.int64)
+
+    def neighbors(self,node):
+        return self.indices[self.indptr[node]:self.indptr[node+1]]
+
+    #Method to get the edges as an (n,2) array, lower index first, like edge_array()
+    def edge_array(self):
+        rows=np.repeat(np.arange(self.number_of_nodes()),self.degree())
+        upper=self.indices>rows
+        return np.column_stack((rows[upper],self.indices[upper]))
+
+    #Method to get the number of nodes the graph stands for, counting every boundary copy. This is how many removals a full dissolution takes
+    def number_of_copies(self):
+        return int(np.sum(self.mult))
+
+    #Method to build the same networkx graph to_network() would have, for ad-hoc analysis. The graph is a copy, so changing it doesn't change this one. Nodes standing for more
+    #than one boundary copy get a 'Multiplicity' attribute rather than being expanded
+    def to_networkx(self):
+        coords=self.coords.tolist()
+        rad=self.rad.tolist()
+        flag=self.flag.tolist()
+        bound=self.bound.tolist()
+        cell=self.cell.tolist()
+        mult=self.mult.tolist()
+        attrs=[dict() for i in range(len(coords))]
+        for node in range(len(coords)):
+            attrs[node]['Coords']=tuple(coords[node])+(rad[node],)
+            if flag[node]>=0:
+                attrs[node]['Coords']+=(flag[node]==1,)
+            attrs[node]['Bound?']=bound[node]
+            if bound[node]:
+                attrs[node]['Cell']=cell[node]
+            if mult[node]>1:
+                attrs[node]['Multiplicity']=mult[node]
+        G=nx.Graph()
+        G.add_nodes_from(zip(range(len(coords)),attrs))
+        G.add_edges_from(self.edge_array().tolist())
+        return G
+
+#Function to get the CSR indptr and indices arrays of a kpGraph from an edge array (like the one edge_array() gives)
+def _csr_arrays(edges,num_nodes):
+    #List every edge from both ends, then sort by node so each node's neighbors end up together, in ascending order
+    rows=np.concatenate((edges[:,0],edges[:,1])).astype(np.int64)
+    cols=np.concatenate((edges[:,1],edges[:,0])).astype(np.int64)
+    edge_order=np.lexsort((cols,rows))
+    indptr=np.zeros(num_nodes+1,dtype=np.int64)
+    indptr[1:]=np.cumsum(np.bincount(rows,minlength=num_nodes))
+    return indptr,cols[edge_order]
+
+#Function to get the coords, rad, and flag arrays of a kpGraph from a list of grid tuples
+def _tuple_arrays(tuples):
+    coords=np.array([t[:2] for t in tuples],dtype=float).reshape(len(tuples),2)
+    rad=np.array([t[2] for t in tuples],dtype=float)
+    flag=np.array([int(t[3]) if len(t)>3 else -1 for t in tuples],dtype=np.int8)
+    return coords,rad,flag
+
+#Function to build a kpGraph from an edge array (like the one edge_array() gives) and each node's grid tuple, boundary flags, and multiplicity
+def _kpgraph_from(edges,tuples,bound,cell,mult=None):
+    indptr,indices=_csr_arrays(edges,len(tuples))
+    coords,rad,flag=_tuple_arrays(tuples)
+    if mult is not None:
+        mult=np.array(mult,dtype=np.int64)
+    return kpGraph(indptr,indices,coords,rad,flag,np.array(bound,dtype=bool),np.array(cell,dtype=np.int64),mult)
+
+#Function to spread the stack multiplicities in mult (from grid_gen.stack_multiplicity()) over the nodes: the first node of every stack stands for that many copies
+def _node_mult(grid,idm,mult,num_nodes):
+    node_mult=np.ones(num_nodes,dtype=np.int64)
+    for ybox in range(len(grid)):
+        for xbox in range(len(grid[ybox])):
+            node_mult[idm[ybox][xbox][0]]=int(mult[ybox][xbox])
+    return node_mult
+
+#Function to turn the grid and adjacency matrix into a kpGraph. Nodes and flags are the same as to_network() gives. If the boundary copies were counted in mult (from
+#grid_gen.stack_multiplicity()) rather than added to the grid, the first node of every stack stands for that many copies
+def to_graph(adj_mtx,grid,idm,flag_bound=False,mult=None):
+    num_nodes=adj_mtx.shape[0]
+    #Gather each node's grid tuple and boundary flags into lists indexed by node index
+    tuples=[None]*num_nodes
+    bound=[False]*num_nodes
+    cell=[-1]*num_nodes
+    cell_num=0
+    #Run through each row in the grid
+    for ybox in range(len(grid)):
+        #Run through each cell in the row
+        for xbox in range(len(grid[ybox])):
+            #Run through each node in the cell
+            cur_cell=grid[ybox][xbox]
+            bound_cell=False
+            cell_num+=1
+            for node in range(len(cur_cell)):
+                node_ind=idm[ybox][xbox][node]
+                tuples[node_ind]=cur_cell[node]
+                #If we're flagging the boundary, the whole stack from the first node whose tuple ends in True on is a boundary cell, same as in to_network()
+                if flag_bound:
+                    if cur_cell[node][-1]==True:
+                        bound_cell=True
+                    bound[node_ind]=bound_cell
+                    if bound_cell:
+                        cell[node_ind]=cell_num
+    node_mult=None
+    if mult is not None:
+        node_mult=_node_mult(grid,idm,mult,num_nodes)
+    return _kpgraph_from(edge_array(adj_mtx),tuples,bound,cell,node_mult)
+
+#Function to add the nodes compiled by grid_gen.to_graph_delta() or to_graph_hex_delta() to a kpGraph, instead of building the whole thing again with to_graph(). new is the
+#array of new nodes those functions return; everything G already has is kept, and the neighbor lists are rebuilt from the new adjacency matrix. The flags and multiplicities
+#work the same as in to_graph()
+def extend_graph(G,adj_mtx,grid,idm,new,flag_bound=False,mult=None):
+    num_nodes=adj_mtx.shape[0]
+    tuples=[grid[ybox][xbox][node] for ind,ybox,xbox,node in new.tolist()]
+    bound=np.zeros(len(tuples),dtype=bool)
+    cell=np.full(len(tuples),-1,dtype=np.int64)
+    if flag_bound:
+        #Cells are numbered from 1, running through each row in turn
+        row_starts=np.cumsum([0]+[len(row) for row in grid])
+        for i,(ind,ybox,xbox,node) in enumerate(new.tolist()):
+            #A node is in a boundary cell if it or any node before it in the stack is flagged
+            if any(stack_node[-1]==True for stack_node in grid[ybox][xbox][:(node+1)]):
+                bound[i]=True
+                cell[i]=row_starts[ybox]+xbox+1
+    coords,rad,flag=_tuple_arrays(tuples)
+    if mult is not None:
+        node_mult=_node_mult(grid,idm,mult,num_nodes)
+    else:
+        node_mult=np.concatenate((G.mult,np.ones(len(tuples),dtype=np.int64)))
+    indptr,indices=_csr_arrays(edge_array(adj_mtx),num_nodes)
+    return kpGraph(indptr,indices,np.concatenate((G.coords,coords)),np.concatenate((G.rad,rad)),np.concatenate((G.flag,flag)),np.concatenate((G.bound,bound)),
+                   np.concatenate((G.cell,cell)),node_mult)
+
+#Function to turn a networkx graph (like the ones to_network() made, or that older runs pickled) into a kpGraph. Nodes are renumbered in the order G lists them
+def from_networkx(G):
+    nodes=list(G.nodes)
+    pos={node:i for i,node in enumerate(nodes)}
+    edges=np.array([(pos[u],pos[v]) for u,v in G.edges],dtype=np.int64).reshape(-1,2)
+    tuples=[G.nodes[node]['Coords'] for node in nodes]
+    bound=[G.nodes[node].get('Bound?',False) for node in nodes]
+    cell=[G.nodes[node].get('Cell',-1) if G.nodes[node].get('Bound?',False) else -1 for node in nodes]
+    mult=[G.nodes[node].get('Multiplicity',1) for node in nodes]
+    return _kpgraph_from(edges,tuples,bound,cell,mult)
+
+#Function to get the arrays behind a compiled graph: CSR indptr/indices, coords, the bound and cell flags, and the multiplicities (see kpGraph). networkx graphs get converted
+#first
+def graph_arrays(G):
+    if not isinstance(G,kpGraph):
+        G=from_networkx(G)
+    return {'indptr':G.indptr,'indices':G.indices,'coords':G.coords,'bound':G.bound,'cell':G.cell,'mult':G.mult}
+
+#Function to copy the arrays from graph_arrays() into shared memory once, so any number of worker processes can attach to that one copy instead of each being sent its own.
+#Returns the shared memory blocks, which have to stay open until every worker is done (then pass them to release_graph()), and a small spec to hand to attach_graph()
+def publish_graph(arrays):
+    blocks=[]
+    spec=dict()
+    for key in arrays:
+        arr=np.ascontiguousarray(arrays[key])
+        #Shared memory blocks can't be empty, so an empty array still gets one byte
+        block=shared_memory.SharedMemory(create=True,size=max(arr.nbytes,1))
+        np.ndarray(arr.shape,dtype=arr.dtype,buffer=block.buf)[...]=arr
+        blocks.append(block)
+        spec[key]=(block.name,arr.shape,arr.dtype.str)
+    return blocks,spec
+
+#Function to attach to a graph published with publish_graph(). The arrays are views straight onto the shared memory, so nothing gets copied. Returns the arrays and the blocks
+#behind them; keep the blocks around for as long as the arrays are in use
+def attach_graph(spec):
+    arrays=dict()
+    blocks=[]
+    for key in spec:
+        name,shape,dtype=spec[key]
+        block=shared_memory.SharedMemory(name=name)
+        arrays[key]=np.ndarray(shape,dtype=dtype,buffer=block.buf)
+        blocks.append(block)
+    return arrays,blocks
+
+#Function to free a graph published with publish_graph() once every worker is done with it
+def release_graph(blocks):
+    for block in blocks:
+        block.close()
+        block.unlink()
+    return
+
+#Function to draw a kpGraph's edges and nodes into the current figure, leaving out any node where alive is False (and its edges)
+def _draw_graph(G,alive=None,node_color='#1f78b4',node_size=5):
+    edges=G.edge_array()
+    coords=G.coords
+    if alive is not None:
+        alive=np.asarray(alive,dtype=bool)
+        edges=edges[alive[edges[:,0]]&alive[edges[:,1]]]
+        coords=coords[alive]
+    ax=plt.gca()
+    #Draw every edge as one collection rather than one plot call each, with the endpoints marked like the '.b-' lines used to
+    ax.add_collection(LineCollection(G.coords[edges],colors='b',linewidths=1))
+    ends=G.coords[edges.reshape(-1)]
+    ax.plot(ends[:,0],ends[:,1],'.b',markersize=node_size,linestyle='none')
+    ax.scatter(coords[:,0],coords[:,1],s=node_size,c=node_color)
+    ax.autoscale_view()
+    return
+
 #Function to plot a graph version of the kinetoplast model
 def graph_visualizer(kpn):
-    #Run throughe each edge
-    for edge in kpn.edges:
-        #Extract the coordinates of its two endpoints and plot them with a line connecting them
-        link_x=(kpn.nodes[edge[0]]['Coords'][0],kpn.nodes[edge[1]]['Coords'][0])
-        link_y=(kpn.nodes[edge[0]]['Coords'][1],kpn.nodes[edge[1]]['Coords'][1])
-        plt.plot(link_x,link_y,'.b-')
-    x=list()
-    y=list()
-    #Run through each node
-    for node in kpn.nodes:
-        try:
-            #Collect their coordinates
-            x.append(kpn.nodes[node]['Coords'][0])
-            y.append(kpn.nodes[node]['Coords'][1])
-        except:
-            print(node)
-    #Plot them all
-    plt.scatter(x,y)
+    if not isinstance(kpn,kpGraph):
+        kpn=from_networkx(kpn)
+    _draw_graph(kpn,node_color='C0',node_size=20)
     #Display the plot
     plt.show()
     return
 
-#Function to export a component plot mid-dissolution
-def export_graph_pic(G,dissolutions,path):
-    #Create a position dictionary, with node indices as keys and node coordinates as entries
-    pos_dict=dict()
-    for node in G.nodes:
-        pos_dict[node]=G.nodes[node]['Coords']
+#Function to export a component plot mid-dissolution. alive is an optional mask of the nodes still in the graph; the rest (and their edges) are left out
+def export_graph_pic(G,dissolutions,path,alive=None):
+    if not isinstance(G,kpGraph):
+        G=from_networkx(G)
     #Create an empty matplotlib figure
     fig = plt.figure(figsize=(13.333,10))
-    #Draw the nodes with nx's built-in function. The function uses matplotlib to do the actual rendering, but I have a feeling it's more optimized than my code
-    nx.draw_networkx_nodes(G,pos=pos_dict,node_size=5)
-    #Theoretically, nx's built-in function to plot edges, nx.draw_networkx_edges(G,pos=pos_dict), should do this, but matplotlib raises an error when I try to use that.
-    #So, do this part manually.
-    for edge in G.edges:
-        link_x=(pos_dict[edge[0]][0],pos_dict[edge[1]][0])
-        link_y=(pos_dict[edge[0]][1],pos_dict[edge[1]][1])
-        plt.plot(link_x,link_y,'.b-', linewidth=1, markersize=5)
+    _draw_graph(G,alive)
+    #No axis ticks or labels, as nx.draw_networkx_nodes() used to leave it
+    plt.tick_params(axis='both',which='both',bottom=False,left=False,labelbottom=False,labelleft=False)
     #Add the title to the figure
     fig.suptitle(('KP Model After '+str(dissolutions)+ ' Dissolutions'), fontsize=20)
     #Save the figure with 300 dots per inch
@@ -106,6 +324,9 @@ def export_graph_pic(G,dissolutions,path):
 
 #Function to compute average degree of the graph
 def avg_deg(G):
+    #A kpGraph's degrees come straight from its CSR arrays. Every copy of a node counts, with the degree it would have in the graph with every copy added in full
+    if isinstance(G,kpGraph):
+        return float(np.sum(G.copy_degree()*G.mult)/G.number_of_copies())
     #Get a list of two-tuples, first element being a node index and second being its degree
     lis=tuple(G.degree())
     #Extract all the degrees
@@ -116,6 +337,8 @@ def avg_deg(G):
 
 #Function to compute minimum degree of the graph
 def min_deg(G):
+    if isinstance(G,kpGraph):
+        return int(np.min(G.copy_degree()))
     #Get a list of two-tuples, first element being a node index and second being its degree
     lis=tuple(G.degree())
     #Extract all the degrees
@@ -0,0 +1,139 @@
+'''
+Module name: graph_store.py
+Author: Nathaniel Morrison
+Date created: 10/18/2026
+Date last modified: 10/18/2026
+Python Version: 3.11.1
+'''
+'''
+On-disk store of compiled graphs. Each graph is saved as a folder of raw .npy arrays (the kpGraph's CSR and node arrays, plus where each node sits in the grid) named after a
+hash of whatever it was built from: lattice type, dimensions, radius, saturation, maxi circles, and RNG seed. Asking for the same graph again just loads the arrays back instead
+of generating and compiling the grid all over, and every run that uses the graph points at the one copy in the store rather than pickling its own. Since the arrays are raw .npy
+files, they can also be memory-mapped (see open_graph()), so any number of processes can dissolve the same graph out of the OS's file cache, even a graph bigger than RAM.
+'''
+import hashlib
+import json
+import os
+import numpy as np
+from scipy.sparse import csr_matrix
+from graph_funcs import kpGraph
+
+#Arrays every stored graph has (see pack_graph()). stack_mult is only there if the boundary copies were counted
+graph_keys=('indptr','indices','coords','rad','flag','bound','cell','mult','loc','row_len')
+
+#Function to get the store key of a graph from the parameters it's built from. Anything else that changes the graph (like the sub-lattice spacing, or multiplicity boundaries)
+#can be passed as an extra keyword. Leave the seed as None only if nothing random goes into the graph
+def graph_key(lattice,rows,columns,rad,saturation,maxi_rad=None,maxi_amount=0,seed=None,**options):
+    params=dict(options,lattice=lattice,rows=rows,columns=columns,rad=rad,saturation=saturation,maxi_rad=maxi_rad,maxi_amount=maxi_amount,seed=seed)
+    return hashlib.sha256(json.dumps(params,sort_keys=True,default=str).encode()).hexdigest()[:32]
+
+#Function to get a store key from the packed arrays themselves, for graphs that weren't built straight from a set of parameters (say, one added to a step at a time)
+def content_key(arrays):
+    h=hashlib.sha256()
+    for key in sorted(arrays):
+        arr=np.ascontiguousarray(arrays[key])
+        h.update((key+arr.dtype.str+str(arr.shape)).encode())
+        h.update(arr.tobytes())
+    return h.hexdigest()[:32]
+
+#Function to pack a compiled graph into arrays: the kpGraph's arrays, the grid position (row, cell, place in the cell) of every node, the length of every row of the grid, and
+#the stack multiplicities if the boundary copies were counted (see grid_gen.stack_multiplicity())
+def pack_graph(grid,idm,kpn,mult=None):
+    loc=np.zeros((kpn.number_of_nodes(),3),dtype=np.int64)
+    for ybox in range(len(idm)):
+        for xbox in range(len(idm[ybox])):
+            for node in range(len(idm[ybox][xbox])):
+                loc[idm[ybox][xbox][node]]=(ybox,xbox,node)
+    arrays={'indptr':kpn.indptr,'indices':kpn.indices,'coords':kpn.coords,'rad':kpn.rad,'flag':kpn.flag,'bound':kpn.bound,'cell':kpn.cell,'mult':kpn.mult,'loc':loc,
+            'row_len':np.array([len(row) for row in grid],dtype=np.int64)}
+    if mult is not None:
+        arrays['stack_mult']=np.asarray(mult,dtype=np.int64)
+    return arrays
+
+#Function to rebuild a compiled graph from the arrays pack_graph() makes. Returns the grid, index matrix, sparse adjacency matrix, kpGraph, and stack multiplicities (None if the
+#boundary copies weren't counted), ready to drop into a kinetoplast object
+def unpack_graph(arrays):
+    kpn=kpGraph(arrays['indptr'],arrays['indices'],arrays['coords'],arrays['rad'],arrays['flag'],arrays['bound'],arrays['cell'],arrays['mult'])
+    num_nodes=kpn.number_of_nodes()
+    kpg=csr_matrix((np.ones(len(kpn.indices),dtype=np.int8),kpn.indices,kpn.indptr),shape=(num_nodes,num_nodes))
+    grid=[[list() for xbox in range(row_len)] for row_len in arrays['row_len'].tolist()]
+    idm=[[list() for xbox in range(row_len)] for row_len in arrays['row_len'].tolist()]
+    coords=kpn.coords.tolist()
+    rad=kpn.rad.tolist()
+    flag=kpn.flag.tolist()
+    loc=arrays['loc']
+    #Put the nodes back into their stacks in order, rebuilding each one's grid tuple, with the boundary flag on the end if it had one
+    for ind in np.lexsort((loc[:,2],loc[:,1],loc[:,0])).tolist():
+        ybox,xbox=int(loc[ind,0]),int(loc[ind,1])
+        node=tuple(coords[ind])+(rad[ind],)
+        if flag[ind]>=0:
+            node+=(flag[ind]==1,)
+        grid[ybox][xbox].append(node)
+        idm[ybox][xbox].append(ind)
+    mult=None
+    if 'stack_mult' in arrays:
+        mult=np.array(arrays['stack_mult'])
+    return grid,idm,kpg,kpn,mult
+
+#Function to get the file one of a stored graph's arrays is saved in
+def array_file(name,key):
+    return name+'\\'+key+'.npy'
+
+#Function to check whether the store has a graph saved under name (the store folder plus the key)
+def has_graph(name):
+    return can_map(name) or os.path.exists(name+'.npz')
+
+#Function to check whether a stored graph can be memory-mapped. That's every graph but the ones the store used to save as a single .npz file
+def can_map(name):
+    return os.path.exists(array_file(name,'indptr'))
+
+#Function to save packed arrays into the folder name, one .npy file each
+def save_arrays(name,arrays):
+    if not os.path.exists(name):
+        os.makedirs(name,exist_ok=True)
+    for key in arrays:
+        np.save(array_file(name,key),np.ascontiguousarray(arrays[key]))
+    return
+
+#Function to save a compiled graph into the folder name. The arrays are written raw, uncompressed, so they load about as fast as the disk can read them, or can be mapped
+#without being read at all
+def save_graph(name,grid,idm,kpn,mult=None):
+    save_arrays(name,pack_graph(grid,idm,kpn,mult))
+    return
+
+#Function to get the arrays of a stored graph. With mmap_mode='r', every array is memory-mapped read-only instead of read in, so only the pages actually touched are ever loaded,
+#and processes mapping the same graph all share the one copy in the OS's file cache. Graphs saved as a single .npz file are always read in whole
+def load_arrays(name,mmap_mode=None):
+    if name.endswith('.npz'):
+        name=name[:-4]
+    if not can_map(name):
+        with np.load(name+'.npz') as f:
+            return {key:f[key] for key in f.files}
+    keys=list(graph_keys)
+    if os.path.exists(array_file(name,'stack_mult')):
+        keys.append('stack_mult')
+    return {key:np.load(array_file(name,key),mmap_mode=mmap_mode) for key in keys}
+
+#Function to load a graph saved by save_graph(). Returns the same things as unpack_graph(). Pass mmap_mode='r' to leave the kpGraph's arrays mapped (see load_arrays()); the grid
+#and index matrix are always rebuilt in memory
+def load_graph(name,mmap_mode=None):
+    return unpack_graph(load_arrays(name,mmap_mode))
+
+#Function to open just the kpGraph of a stored graph, memory-mapped (see load_arrays()). This is all a dissolution needs, and unlike load_graph() it costs next to nothing however
+#big the graph is, since neither the grid nor the adjacency matrix is rebuilt and no array is read until it's used
+def open_graph(name):
+    arrays=load_arrays(name,'r')
+    return kpGraph(arrays['indptr'],arrays['indices'],arrays['coords'],arrays['rad'],arrays['flag'],arrays['bound'],arrays['cell'],arrays['mult'])
+
+#Function to put a compiled graph in the store folder, under key or, if no key is given, under a hash of its contents. A graph already in the store isn't written again. Returns
+#the name it's saved under
+def store_graph(store,grid,idm,kpn,mult=None,key=None):
+    if not os.path.exists(store):
+        os.makedirs(store,exist_ok=True)
+    arrays=pack_graph(grid,idm,kpn,mult)
+    if key is None:
+        key=content_key(arrays)
+    name=store+key
+    if not has_graph(name):
+        save_arrays(name,arrays)
+    return name
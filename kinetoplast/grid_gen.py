@@ -5,104 +5,144 @@ Date created: 05/21/2020
 Date last modified: 08/30/2020
 Python Version: 3.7.2
 '''
-from random import uniform
 import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.spatial import cKDTree
 import matplotlib.pyplot as plt
 import prob_funcs
-from copy import deepcopy
 import datetime
 import time
+import gc
 
-#Function to create a grid of points of size xdim x ydim. The grid will be broken up into 1x1 squares, and each square will have exactly one point randomly placed within it.
-def craft_grid(xdim,ydim,rad,flag_bound=False):
-    #Define the grid list
-    grid=list()
-    #Run through each row of the grid
-    for ybox in range(ydim):
-        #Define and clear a list to house the row
-        row=list()
-        del row[:]
-        #Run through each column of the grid
-        for xbox in range(xdim):
-            #Choose a random (x,y) coordinate within the box
-            xcoord=uniform(xbox,(xbox+1))
-            ycoord=uniform(ybox,(ybox+1))
-            #If the boundary nodes need to be flagged
-            if flag_bound:
-                #Flag the nodes in the boundary cells with a fourth tuple entry of "True" and all other nodes with a fourth tupe lentry of "False"
-                if ybox==0 or xbox==0 or ybox==(ydim-1) or xbox==(xdim-1):
-                    row.append([(xcoord,ycoord,rad,True),])
-                else:
-                    row.append([(xcoord,ycoord,rad,False),])
-            else:
-                #Add it as a tuple to the row
-                row.append([(xcoord,ycoord,rad),])
-        #Add the row to the grid (as a shallow copy, for reasons that are hopefully obvious)
-        grid.append(row.copy())
-    #Return the finished grid
-    return grid
+#Layout of the node arrays the *_nodes() generators build, one entry per node: its center, probability field radius, boundary flag, and where it sits in the grid. flag is
+#the optional last entry of the node's grid tuple, same as in kpGraph (1 for True, 0 for False, -1 if the boundary isn't being flagged). cell is the number of the grid cell the
+#node is in, counting along each row in turn, and stack is its place in that cell's stack. Nodes are listed cell by cell and in stack order, which is the order node_mtx() numbers
+#them in, so a node's index is just its position in the array
+node_dtype=np.dtype([('x',float),('y',float),('rad',float),('flag',np.int8),('cell',np.int64),('stack',np.int64)])
+
+#Function to start a node array with one node in each of num_cells cells, all of the given radius. flag is an array of boundary flags, or None if they aren't being flagged
+def _new_nodes(num_cells,rad,flag=None):
+    nodes=np.zeros(num_cells,dtype=node_dtype)
+    nodes['rad']=rad
+    nodes['cell']=np.arange(num_cells)
+    if flag is None:
+        nodes['flag']=-1
+    else:
+        nodes['flag']=flag
+    return nodes
+
+#Function to mark the cells on the outside edge of a grid with the given number of rows and columns, as a boolean array in cell order
+def _edge_cells(rows,columns):
+    ybox,xbox=np.divmod(np.arange(rows*columns),columns)
+    return (ybox==0)|(ybox==(rows-1))|(xbox==0)|(xbox==(columns-1))
+
+#Function to turn a node array into the grid everything else works on: a list of rows, each a list of cells, each a list of node tuples (x,y,rad), with the boundary flag tacked
+#on the end if the nodes have one
+def nodes_to_grid(nodes,rows,columns):
+    x=nodes['x'].tolist()
+    y=nodes['y'].tolist()
+    rad=nodes['rad'].tolist()
+    #Building millions of little tuples and lists keeps setting off the garbage collector, which then combs through every one built so far, though none of them can ever be in a
+    #reference cycle. So, hold it off until the grid is done
+    gc_enabled=gc.isenabled()
+    gc.disable()
+    try:
+        if len(nodes)>0 and np.all(nodes['flag']>=0):
+            tuples=list(zip(x,y,rad,(nodes['flag']==1).tolist()))
+        else:
+            tuples=list(zip(x,y,rad))
+        #Nodes are in cell order, so each cell's stack is one run of the tuples
+        ends=np.searchsorted(nodes['cell'],np.arange(1,rows*columns+1)).tolist()
+        stacks=[tuples[start:end] for start,end in zip([0]+ends[:-1],ends)]
+        return [stacks[(ybox*columns):((ybox+1)*columns)] for ybox in range(rows)]
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+#Function to create the nodes of a grid of size xdim x ydim. The grid will be broken up into 1x1 squares, and each square will have exactly one point randomly placed within it.
+#Pass rng (a numpy Generator) to draw the points from it
+def craft_nodes(xdim,ydim,rad,flag_bound=False,rng=None):
+    if rng is None:
+        rng=np.random.default_rng()
+    nodes=_new_nodes(xdim*ydim,rad,_edge_cells(ydim,xdim) if flag_bound else None)
+    ybox,xbox=np.divmod(nodes['cell'],xdim)
+    #Choose a random (x,y) coordinate within each box
+    nodes['x']=xbox+rng.random(len(nodes))
+    nodes['y']=ybox+rng.random(len(nodes))
+    return nodes
+
+#Function to create a grid of points of size xdim x ydim, as a grid of nested lists (see craft_nodes())
+def craft_grid(xdim,ydim,rad,flag_bound=False,rng=None):
+    return nodes_to_grid(craft_nodes(xdim,ydim,rad,flag_bound,rng),ydim,xdim)
 
-#Function to super-saturate the grid boundary with 10 nodes per cell
-def add_boundary(grid,xdim,ydim,rad,saturation,flag_bound=False):
+#Function to super-saturate the grid boundary with 10 nodes per cell. Pass rng (a numpy Generator) to place the new nodes from it
+def add_boundary(grid,xdim,ydim,rad,saturation,flag_bound=False,rng=None):
+    if rng is None:
+        rng=np.random.default_rng()
     #Run through the top and bottom rows
     for xbox in range(xdim):
         #Add more nodes to each cell in the top/bottom rows
         for i in range(saturation):
-            xcoord=uniform(xbox,(xbox+1))
-            ycoord=uniform(0,1)
+            xcoord=rng.uniform(xbox,(xbox+1))
+            ycoord=rng.uniform(0,1)
             #Flag the nodes as boundary nodes if we're flagging boundary nodes
             if flag_bound:
                 grid[0][xbox].append((xcoord,ycoord,rad,True))
             else:
                 grid[0][xbox].append((xcoord,ycoord,rad))
-            xcoord=uniform(xbox,(xbox+1))
-            ycoord=uniform((ydim-1),ydim)
-            if flag_boundary:
+            xcoord=rng.uniform(xbox,(xbox+1))
+            ycoord=rng.uniform((ydim-1),ydim)
+            if flag_bound:
                 grid[(ydim-1)][xbox].append((xcoord,ycoord,rad,True))
             else:
                 grid[(ydim-1)][xbox].append((xcoord,ycoord,rad))
     #Do same for the leftmost and rightmost columns. Omit the corner cells, since these are already done in the above loop
     for ybox in range(1,(ydim-1),1):
         for i in range(saturation):
-            xcoord=uniform(0,1)
-            ycoord=uniform(ybox,(ybox+1))
+            xcoord=rng.uniform(0,1)
+            ycoord=rng.uniform(ybox,(ybox+1))
             if flag_bound:
                 grid[ybox][0].append((xcoord,ycoord,rad,True))
             else:
                 grid[ybox][0].append((xcoord,ycoord,rad))
-            xcoord=uniform((xdim-1),xdim)
-            ycoord=uniform(ybox,(ybox+1))
+            xcoord=rng.uniform((xdim-1),xdim)
+            ycoord=rng.uniform(ybox,(ybox+1))
             if flag_bound:
                 grid[ybox][(xdim-1)].append((xcoord,ycoord,rad,True))
             else:
                 grid[ybox][(xdim-1)].append((xcoord,ycoord,rad))
     return grid
 
-#Function to add maxi-circles of a given radius throughout the grid
-def add_maxi_circles(grid,xdim,ydim,maxi_rad,amount,hexg=False,flag_bound=False):
+#Function to add maxi-circles of a given radius throughout the grid. Pass rng (a numpy Generator) to place them from it
+def add_maxi_circles(grid,xdim,ydim,maxi_rad,amount,hexg=False,flag_bound=False,rng=None):
+    if rng is None:
+        rng=np.random.default_rng()
+    #In a hexagonal grid, each maxi circle goes in the stack of the node closest to it. Build a KD-tree over every node, remembering which stack each one lives in
+    if hexg:
+        tree_stacks=[(band,stack) for band in range(len(grid)) for stack in range(len(grid[band])) for node in grid[band][stack]]
+        tree=cKDTree([node[0:2] for band in grid for stack in band for node in stack])
+        placed_maxi=list()
     #Create as many maxi circles as desired
     for i in range(amount):
         #Get the coordinates
-        x_coord=uniform(0,xdim)
-        y_coord=uniform(0,ydim)
+        x_coord=rng.uniform(0,xdim)
+        y_coord=rng.uniform(0,ydim)
         #Get the cell the coordinates live in
         xbox=int(np.floor(x_coord))
         ybox=int(np.floor(y_coord))
         #if we are in a hexagonal grid, then there is more work to do to figure out where in the grid to put the new node
         if hexg:
             maxi_tup=[x_coord,y_coord,maxi_rad]
-            #Initialize d0 to be the maximum possible distance between two nodes in the grid
-            d0=dist((0,0),(xdim,ydim))
-            #Run through every row, every node stack in the row, and every node in the stack
-            for band in range(len(grid)):
-                for stack in range(len(grid[band])):
-                    for node in grid[band][stack]:
-                        #Find the distance from this node to the maxi circle
-                        d=dist(node,maxi_tup)
-                        #If this node is closer to the maxi circle than the previous closest node, note it's indices
-                        if d<d0:
-                            maxi_ind=(band,stack)
-                            d0=d
+            #Find the grid node closest to the maxi circle with a KD-tree over the grid as it was before any maxi circles went in, then see if any maxi circle already added
+            #is closer still
+            d0,nearest=tree.query(maxi_tup[0:2])
+            maxi_ind=tree_stacks[nearest]
+            for placed,placed_ind in placed_maxi:
+                d=dist(placed,maxi_tup)
+                if d<d0:
+                    maxi_ind=placed_ind
+                    d0=d
+            placed_maxi.append((maxi_tup,maxi_ind))
             #Add the new node to the stack closest to its position. Flag it as being not a boundary, even if it winds up in a boundary cell, if we're flagging the boundary
             if flag_bound:
                 grid[maxi_ind[0]][maxi_ind[1]].append(tuple(maxi_tup+[False]))
@@ -148,184 +188,425 @@ def grid_visualizer(grid):
     plt.show()
     return
 
-#Function to assign each node a graph vertex index.
+#Function to assign each node a graph vertex index. Nodes are numbered cell by cell, so each stack's indices are just the next run of numbers
 def node_mtx(grid):
-    #Initialize the index list
-    idm=deepcopy(grid)
+    idm=list()
     ind=0
-    #Run through each row of the grid
-    for ybox in range(len(grid)):
-        #Run through each cell in the row
-        for xbox in range(len(grid[ybox])):
-            #Run through each node in the cell
-            for node in range(len(grid[ybox][xbox])):
-                #Assign the node an index, and replace the relevent entry in the index matrix with the index
-                idm[ybox][xbox][node]=ind
-                ind+=1
+    #Hold off the garbage collector while the lists are built, as in nodes_to_grid()
+    gc_enabled=gc.isenabled()
+    gc.disable()
+    try:
+        #Run through each row of the grid
+        for row in grid:
+            idm_row=list()
+            #Run through each cell in the row, giving its nodes the next indices
+            for stack in row:
+                idm_row.append(list(range(ind,(ind+len(stack)))))
+                ind+=len(stack)
+            idm.append(idm_row)
+    finally:
+        if gc_enabled:
+            gc.enable()
     return idm, ind
 
 #Function to creates an adjacency matrix for the graph of links.
-def to_graph(grid,ringed=False):
+def to_graph(grid,ringed=False,dense=False,rng=None):
     ymax=len(grid)
     xmax=len(grid[0])
     #Record start time
     start=time.time()
     #Grab the index matrix, which is the grid with every entry replaced by an index integer, and number of nodes in the grid
     idm,num_nodes=node_mtx(grid)
-    #Create an empty adjacency matrix
-    g=np.zeros((num_nodes,num_nodes))
-    #Create a dictionary to keep track of which pairs of nodes have already been processed to prevent repeat processing (which would increase the probability of links)
-    already_tried=dict()
-    #Run through each row in the grid
-    for ybox in range(ymax):
-        row=grid[ybox]
-        #Run through each cell in the row
-        for xbox in range(xmax):
-            cell=row[xbox]
-            #Run through each node in the cell
-            for node in range(len(cell)):
-                #If we are ringing and this is a boundary box, we don't want to test for links via integration with any of the other nodes beyond the base node. Instead, later
-                #on a connection will be made between any node the base node connects to and all other nodes in the stack.
-                if ringed and (ybox==0 or ybox==(ymax-1) or xbox==0 or ybox==(xmax-1)) and node!=0:
-                    break
-                #Grab the coordinates and the radius, as well as the assigned index in idm
-                cent1=cell[node][0:2]
-                rad1=cell[node][2]
-                node1_ind=idm[ybox][xbox][node]
-                #Run through every cell that might conceivably have a node within range of the current node. The exception to this is that maxi circles within range may not
-                #be checked here. But, that's ok, because they will have their own place in the sun when the outer loop reaches them
-                for adj_y in range(int(np.floor(ybox-2*rad1)),int(np.ceil(ybox+1+2*rad1)),1):
-                    for adj_x in range(int(np.floor(xbox-2*rad1)),int(np.ceil(xbox+1+2*rad1)),1):
-                        #Screen for negative indices and indices out of grid bounds. Also, don't check for links between nodes in the same cell and 
-                        if adj_y>=0 and adj_x>=0 and (xbox,ybox)!=(adj_x,adj_y) and adj_y<len(grid):
-                            if adj_x<len(grid[adj_y]):
-                                adj_cell=grid[adj_y][adj_x]
-                                #Run through each node in the adjacent cell
-                                for adj_node in range(len(adj_cell)):
-                                    #Grab the second node's center, radius, and index
-                                    cent2=adj_cell[adj_node][0:2]
-                                    rad2=adj_cell[adj_node][2]
-                                    node2_ind=idm[adj_y][adj_x][adj_node]
-                                    #Sort the indices. The lower-value index will always be the key in already_checked, which should minimize the number/size of needed
-                                    #dictionary entries. Since thumbing through already_checked is (or, I guess, 'was' at this point) more than 50% the processing time,
-                                    #minimizing the size of this object is critical to performance optimization
-                                    ind_lis=[node1_ind,node2_ind]
-                                    ind_lis.sort()
-                                    #Enclosed in a try loop because if the lower-value node has not yet been encountered, trying to call its dictionary entry will result in an
-                                    #error
-                                    try:
-                                        #If the node pair has not yet been checked
-                                        if ind_lis[1] not in already_tried[ind_lis[0]]:
-                                            #Check for a link, create (or don't) the link, and add the pair to already_tried
-                                            already_tried, g=are_linked(cent1,cent2,rad1,rad2,node1_ind,node2_ind,already_tried,g)
-                                    #If an error is raised, then the lower-value node has not yet been encountered, so this pair has obviously not yet been checked
-                                    except:
-                                        #Check for a link, create (or don't) the link, and add the pair to already_tried
-                                        already_tried, g=are_linked(cent1,cent2,rad1,rad2,node1_ind,node2_ind,already_tried,g)
+    #Create an empty edge set. The adjacency matrix is only built from it once compilation is done, as a sparse matrix
+    g=set()
+    #Gather the node centers, radii, and stacks into arrays, and find every pair of nodes close enough to possibly link. Each pair comes up exactly once, so there's no need to
+    #keep track of which pairs have already been tried
+    cents,rads,stacks=node_arrays(grid,idm,num_nodes)
+    pairs=candidate_pairs(cents,rads,stacks)
+    #If we are ringing, we don't want to test for links via integration between nodes beyond the base node of a boundary stack. Instead, later on a connection will be made
+    #between any node the base node connects to and all other nodes in the stack. These nodes still get tested against everything else, as before.
+    if ringed:
+        skip=ring_skip(grid,idm,num_nodes)
+        pairs=pairs[~(skip[pairs[:,0]]&skip[pairs[:,1]])]
+    #Check every candidate pair for a link at once and add the accepted ones to the edge set
+    edges=are_linked_batch(cents[pairs[:,0]],cents[pairs[:,1]],rads[pairs[:,0]],rads[pairs[:,1]],pairs[:,0],pairs[:,1],rng)
+    g.update(zip(edges[:,0].tolist(),edges[:,1].tolist()))
     #Ensures all boundary stacks link to adjacent boundary stacks if desired. This is a very non-optimal implementation. It would be much better to integrate this into the
     #above loop rather thabn do an entirely seperate one. However, this is the easiest solution right now and with the present algorithm and usage does not add a noticable
     #amount of processing time.
     if ringed:
-        #Grab the height/width of the grid
-        ymax=len(grid)
-        xmax=len(grid[0])
-        #Run through every box and node in the top/bottom rows
-        for row in (0,(ymax-1)):
-            for box in range(0,(xmax)):
-                node_0_ind=idm[row][box][0]
-                for node in range(len(grid[row][box])):
-                    #Grab the node's index
-                    node_ind=idm[row][box][node]
-                    #Run through the two boxes to the left/right of this box (also boundary cells)
-                    for adj_box in ((box-1),(box+1)):
-                        if adj_box>=0 and adj_box<xmax:
-                            #Run through each node in the adjacent cell
-                            for adj_node in range(len(grid[row][adj_box])):
-                                #Establish a link between the two nodes
-                                adj_node_ind=idm[row][adj_box][adj_node]
-                                g=graphite_add_connection(g,node_ind,adj_node_ind)
-                    #Run through the other boxes that might have a node in range. I'm assuming rad=1, since it always seems to these days.
-                    for adj_row in ((row-1),(row+1)):
-                        for adj_box in ((box-1),box,(box+1)):
-                            if adj_row>=0 and adj_box>=0 and adj_row<ymax and adj_box<xmax:
-                                #Run through each node in the boxes
-                                for adj_node in range(len(grid[adj_row][adj_box])):
-                                    #If the node has a link to the base node in the boundary stack
-                                    adj_ind=idm[adj_row][adj_box][adj_node]
-                                    if g[node_0_ind][adj_ind]==1:
-                                        #Add a connection between the node and the current boundary node
-                                        g=graphite_add_connection(g,node_ind,adj_ind)
-        #Do the same as the above, but with the leftmost/rightmost columns, excluding corners. The corners happen naturally when doing the others
-        for row in range(1,ymax,1):
-            for box in (0,(xmax-1)):
-                for node in range(len(grid[row][box])):
-                    node_ind=idm[row][box][node]
-                    for adj_row in ((row-1),(row-1)):
-                        for adj_node in range(len(grid[adj_row][box])):
-                            adj_node_ind=idm[adj_row][box][adj_node]
-                            g=graphite_add_connection(g,node_ind,adj_node_ind)
-                    for adj_row in ((row-1),row,(row+1)):
-                        for adj_box in ((box-1),(box+1)):
-                            if adj_row>=0 and adj_box>=0 and adj_row<ymax and adj_box<xmax:
-                                for adj_node in range(len(grid[adj_row][adj_box])):
-                                    adj_ind=idm[adj_row][adj_box][adj_node]
-                                    if g[node_0_ind][adj_ind]==1:
-                                        g=graphite_add_connection(g,node_ind,adj_ind)
+        g=ring_links(grid,idm,g)
     #Display the time spent on compilation
     end=time.time()
     print("Time to compile: "+str(datetime.timedelta(seconds=(end-start))))
-    return g, idm
+    return to_adjacency(g,num_nodes,dense), idm
+
+#Function to mark the nodes of a ringed grid that aren't tested for links against each other: every node in a boundary stack but the base node. Those get their links from the
+#base node in ring_links() instead
+def ring_skip(grid,idm,num_nodes):
+    ymax=len(grid)
+    xmax=len(grid[0])
+    skip=np.zeros(num_nodes,dtype=bool)
+    for ybox in range(ymax):
+        for xbox in range(xmax):
+            if ybox==0 or ybox==(ymax-1) or xbox==0 or ybox==(xmax-1):
+                skip[idm[ybox][xbox][1:]]=True
+    return skip
+
+#Function to ring the boundary of a compiled grid, adding the ring links to the edge set g. Every boundary node links to all the nodes in the boundary stacks beside it, and
+#to everything its stack's base node links to in the stacks around it. No links are drawn at random here, so ringing the same links always gives the same ring
+def ring_links(grid,idm,g):
+    #Grab the height/width of the grid
+    ymax=len(grid)
+    xmax=len(grid[0])
+    #Run through every box and node in the top/bottom rows
+    for row in (0,(ymax-1)):
+        for box in range(0,(xmax)):
+            node_0_ind=idm[row][box][0]
+            for node in range(len(grid[row][box])):
+                #Grab the node's index
+                node_ind=idm[row][box][node]
+                #Run through the two boxes to the left/right of this box (also boundary cells)
+                for adj_box in ((box-1),(box+1)):
+                    if adj_box>=0 and adj_box<xmax:
+                        #Run through each node in the adjacent cell
+                        for adj_node in range(len(grid[row][adj_box])):
+                            #Establish a link between the two nodes
+                            adj_node_ind=idm[row][adj_box][adj_node]
+                            g=graphite_add_connection(g,node_ind,adj_node_ind)
+                #Run through the other boxes that might have a node in range. I'm assuming rad=1, since it always seems to these days.
+                for adj_row in ((row-1),(row+1)):
+                    for adj_box in ((box-1),box,(box+1)):
+                        if adj_row>=0 and adj_box>=0 and adj_row<ymax and adj_box<xmax:
+                            #Run through each node in the boxes
+                            for adj_node in range(len(grid[adj_row][adj_box])):
+                                #If the node has a link to the base node in the boundary stack
+                                adj_ind=idm[adj_row][adj_box][adj_node]
+                                if has_connection(g,node_0_ind,adj_ind):
+                                    #Add a connection between the node and the current boundary node
+                                    g=graphite_add_connection(g,node_ind,adj_ind)
+    #Do the same as the above, but with the leftmost/rightmost columns, excluding corners. The corners happen naturally when doing the others
+    for row in range(1,ymax,1):
+        for box in (0,(xmax-1)):
+            for node in range(len(grid[row][box])):
+                node_ind=idm[row][box][node]
+                for adj_row in ((row-1),(row-1)):
+                    for adj_node in range(len(grid[adj_row][box])):
+                        adj_node_ind=idm[adj_row][box][adj_node]
+                        g=graphite_add_connection(g,node_ind,adj_node_ind)
+                for adj_row in ((row-1),row,(row+1)):
+                    for adj_box in ((box-1),(box+1)):
+                        if adj_row>=0 and adj_box>=0 and adj_row<ymax and adj_box<xmax:
+                            for adj_node in range(len(grid[adj_row][adj_box])):
+                                adj_ind=idm[adj_row][adj_box][adj_node]
+                                if has_connection(g,node_0_ind,adj_ind):
+                                    g=graphite_add_connection(g,node_ind,adj_ind)
+    return g
 
 #Function to convert a hex grid into an adjacency matrix and index matrix. Different from to_graph because I can assume some things that significantly reduce computation
 #time in a hex grid. Like where every edge will be which removes the need for probability function integration
-def to_graph_hex(grid,spacing):
+def to_graph_hex(grid,spacing,dense=False):
+    #Grab the radius of 'standard" nodes in the base grid
+    base_rad=grid[0][0][0][2]
     #Record start time
     start=time.time()
     #Grab the index matrix, which is the grid with every entry replaced by an index integer, and number of nodes in the grid
     idm,num_nodes=node_mtx(grid)
-    #Create an empty adjacency matrix
-    g=np.zeros((num_nodes,num_nodes))
-    #Run through each node in the grid
-    for ybox in range(len(grid)):
-        for xbox in range(len(grid[ybox])):
-            for node in range(len(grid[ybox][xbox])):
-                #Get its coordinates and index
-                stuff=grid[ybox][xbox][node]
-                coords=stuff[0:2]
-                rad=stuff[2]
-                node_ind=idm[ybox][xbox][node]
-                #Run through the two next-nearest rows
-                for adj_y in range(int((ybox-1*rad)),int((ybox+2*rad)),1):
-                    #Run through the four nodes in these rows to the left and the right of the primary node, plus nodes with the same xbox
-                    for adj_x in range(int(xbox-1*rad),int(xbox+3*rad),1):
-                        #Screen for nonexistant rows/nodes, and make sure we aren't looking for a connect from a node to itself
-                        if adj_y>=0 and adj_x>=0 and adj_y<len(grid) and adj_x<len(grid[adj_y])and (adj_x,adj_y)!=(xbox,ybox):
-                            #Run through each node in the adjacent stack
-                            for adj_node in range(len(grid[adj_y][adj_x])):
-                                #Grab its coordinates
-                                adj_stuff=grid[adj_y][adj_x][adj_node]
-                                adj_coords=adj_stuff[0:2]
-                                adj_rad=adj_stuff[2]
-                                #If the two nodes are nearest-neighbors (hexagon edges are equal to sqrt(1/3)*spacing. Next-nearest neighbors are [spacing] apart.
-                                if dist(coords,adj_coords)<=float(np.sqrt(2/3)*spacing):
-                                    #Grab the adjacent node's index and add a connection
-                                    adj_ind=idm[adj_y][adj_x][adj_node]
-                                    g=graphite_add_connection(g,node_ind,adj_ind)
-                                #If one of the nodes is a maxi cricle
-                                elif rad!=adj_rad and (dist(coords,adj_coords)-adj_rad)<=rad and (dist(coords,adj_coords)+adj_rad)>=rad:
-                                    #Grab the adjacent node's index and add a connection
-                                    adj_ind=idm[adj_y][adj_x][adj_node]
-                                    g=graphite_add_connection(g,node_ind,adj_ind)
+    cents,rads,stacks=node_arrays(grid,idm,num_nodes)
+    starts,counts=stack_arrays(grid)
+    #Hexagon edges are sqrt(1/3)*spacing long and next-nearest neighbors are [spacing] apart, so anything within sqrt(2/3)*spacing is a nearest neighbor
+    near=float(np.sqrt(2/3)*spacing)
+    #Every row of the grid is a zig-zag of the two sub-lattices, so consecutive stacks in a row are always nearest neighbors. Between rows, stack p of row y sits directly below
+    #stack p of row y+1 (and links to it) whenever y+p is even
+    rows,cols=np.indices(counts.shape)
+    pairs=np.concatenate((stencil_pairs(starts,counts,0,1),stencil_pairs(starts,counts,1,0,(rows+cols)%2==0)))
+    #Only the nodes actually sitting on the lattice can use the stencil. That's the first node in each stack and the boundary copies placed directly atop it
+    on_lattice=(rads==base_rad)&np.all(cents==cents[starts.ravel()[stacks]],axis=1)
+    edges=[lattice_edges(pairs,cents,rads,base_rad,near,on_lattice)]
+    #Maxi circles (and anything else off the lattice) get checked against the nodes inside the same stack windows the old stack-by-stack search looked through. Nothing
+    #further away than the nearest-neighbor distance or the reach of the two radii can link, so only the nodes a KD-tree turns up within that distance need checking
+    off_lattice=np.nonzero(~on_lattice)[0]
+    if len(off_lattice)>0:
+        ys,xs=np.divmod(stacks,counts.shape[1])
+        reach=cKDTree(cents).query_ball_point(cents[off_lattice],np.maximum(near,rads[off_lattice]+rads.max()))
+        for node_ind,adj_inds in zip(off_lattice,reach):
+            edges.append(hex_window_edges(node_ind,np.asarray(adj_inds,dtype=np.int64),cents,rads,stacks,ys,xs,near))
     #Display the time spent on compilation
     print("Time to compile: "+str(datetime.timedelta(seconds=(time.time()-start))))
-    return g, idm
+    return to_adjacency(np.concatenate(edges),num_nodes,dense), idm
+
+#Function to find everything a maxi circle (or other off-lattice node) in a hex grid links to, out of the candidate nodes adj_inds. A pair links if either node has the other
+#within its stack window (one row below to two rows above and one stack to the left to three stacks to the right, all scaled by the node's radius) and, seen from that node,
+#they are nearest neighbors or the other node's probability field crosses the periphery of its own
+def hex_window_edges(node_ind,adj_inds,cents,rads,stacks,ys,xs,near):
+    rad=rads[node_ind]
+    y=ys[node_ind]
+    x=xs[node_ind]
+    adj_rads=rads[adj_inds]
+    adj_ys=ys[adj_inds]
+    adj_xs=xs[adj_inds]
+    d=np.sqrt(np.sum((cents[adj_inds]-cents[node_ind])**2,axis=1))
+    #Windows are built with int(), which rounds toward zero, so use trunc() rather than floor()
+    win=(adj_ys>=int(y-rad))&(adj_ys<int(y+2*rad))&(adj_xs>=int(x-rad))&(adj_xs<int(x+3*rad))
+    adj_win=(y>=np.trunc(adj_ys-adj_rads))&(y<np.trunc(adj_ys+2*adj_rads))&(x>=np.trunc(adj_xs-adj_rads))&(x<np.trunc(adj_xs+3*adj_rads))
+    circ=(adj_rads!=rad)&(d-adj_rads<=rad)&(d+adj_rads>=rad)
+    adj_circ=(adj_rads!=rad)&(d-rad<=adj_rads)&(d+rad>=adj_rads)
+    linked=((win&((d<=near)|circ))|(adj_win&((d<=near)|adj_circ)))&(stacks[adj_inds]!=stacks[node_ind])
+    adj_inds=adj_inds[linked]
+    return np.column_stack((np.full(len(adj_inds),node_ind),adj_inds))
 
-#Function to add an edge to the adjacency matrix of a hexagonal grid. Works like are_linked() below, but dosen't integrate proability functions                 
+#Function to add an edge to the edge set of a grid. Works like are_linked() below, but dosen't integrate proability functions. Edges are stored once, lower index first
 def graphite_add_connection(g,node_ind,adj_ind):
-    g[node_ind][adj_ind]=1
-    g[adj_ind][node_ind]=1
+    if node_ind<adj_ind:
+        g.add((node_ind,adj_ind))
+    else:
+        g.add((adj_ind,node_ind))
     return g
 
+#Function to check whether the edge set already links two nodes
+def has_connection(g,node_ind,adj_ind):
+    if node_ind<adj_ind:
+        return (node_ind,adj_ind) in g
+    return (adj_ind,node_ind) in g
+
+#Function to give an index to every node added to the grid since idm was made, numbering them on from num_nodes. idm is extended in place, so the nodes that were already there
+#keep their indices. Returns one row per new node, in index order: its index, then the row, cell, and position within the cell where it sits in the grid
+def extend_idm(grid,idm,num_nodes):
+    new=list()
+    ind=num_nodes
+    for ybox in range(len(grid)):
+        for xbox in range(len(grid[ybox])):
+            for node in range(len(idm[ybox][xbox]),len(grid[ybox][xbox])):
+                idm[ybox][xbox].append(ind)
+                new.append((ind,ybox,xbox,node))
+                ind+=1
+    return np.array(new,dtype=np.int64).reshape(-1,4)
+
+#Function to get the edges out of a compiled sparse adjacency matrix as an (n,2) array, so new edges can be added to them and the matrix rebuilt with to_adjacency()
+def adjacency_edges(adj):
+    adj=csr_matrix(adj)
+    rows=np.repeat(np.arange(adj.shape[0]),np.diff(adj.indptr))
+    upper=adj.indices>=rows
+    return np.column_stack((rows[upper],adj.indices[upper]))
+
+#Function to link boundary copies added to an already compiled lattice. Every copy sits right on top of the first node in its stack (its base) and the lattice compilers only
+#look at where nodes are, so a copy links to exactly what its base links to. That includes the copies already sitting on the base's neighbors, and the new copies sitting on
+#them get added here. Nothing links to the other copies in its own stack. adj is the compiled matrix from before the copies went in, copies their new indices, and bases the
+#index of each one's base
+def copy_edges(adj,copies,bases):
+    adj=csr_matrix(adj)
+    #Every copy against every neighbor of its base
+    deg=adj.indptr[bases+1]-adj.indptr[bases]
+    src=np.repeat(copies,deg)
+    dst=adj.indices[np.repeat(adj.indptr[bases],deg)+np.arange(deg.sum())-np.repeat(np.cumsum(deg)-deg,deg)]
+    #Every copy against the new copies sitting on those neighbors. Sorting the new copies by base puts the ones on each node in a block
+    by_base=np.argsort(bases,kind='stable')
+    sorted_bases=bases[by_base]
+    lo=np.searchsorted(sorted_bases,dst,'left')
+    num_on=np.searchsorted(sorted_bases,dst,'right')-lo
+    src2=np.repeat(src,num_on)
+    dst2=copies[by_base][np.repeat(lo,num_on)+np.arange(num_on.sum())-np.repeat(np.cumsum(num_on)-num_on,num_on)]
+    return np.concatenate((np.column_stack((src,dst)),np.column_stack((src2,dst2)))).astype(np.int64).reshape(-1,2)
+
+#Function to find every pair of nodes that includes one of the new nodes (indices num_old on) and whose probability fields could overlap. Same as candidate_pairs(), but the
+#pairs between old nodes, which were already tried when the grid was first compiled, are left out
+def new_candidate_pairs(cents,rads,stacks,num_old):
+    new_inds=np.arange(num_old,len(rads))
+    if len(new_inds)==0:
+        return np.zeros((0,2),dtype=np.int64)
+    reach=cKDTree(cents).query_ball_point(cents[new_inds],rads[new_inds]+rads.max())
+    node1=np.repeat(new_inds,[len(hits) for hits in reach])
+    node2=np.concatenate([np.asarray(hits,dtype=np.int64) for hits in reach])
+    #Pairs of new nodes turn up from both ends, so only keep one copy
+    keep=(node2<num_old)|(node2<node1)
+    pairs=np.sort(np.column_stack((node1[keep],node2[keep])),axis=1)
+    d=np.sqrt(np.sum((cents[pairs[:,0]]-cents[pairs[:,1]])**2,axis=1))
+    keep=(d<=(rads[pairs[:,0]]+rads[pairs[:,1]]))&(stacks[pairs[:,0]]!=stacks[pairs[:,1]])
+    return pairs[keep]
+
+#Function to compile just the nodes added to a grid since it was compiled into adj and idm by to_graph(), instead of the whole grid again. Only pairs with a new node in them get
+#tried, each the same way to_graph() would, so the links between the old nodes are kept as they are. If the grid is ringed, the ring is then run again over all the links, which
+#draws nothing at random, so the new boundary nodes get ringed without any of the links already there changing. Returns the new adjacency matrix, the extended index matrix,
+#and the new nodes (see extend_idm())
+def to_graph_delta(grid,adj,idm,rng=None,dense=False,ringed=False):
+    start=time.time()
+    num_old=adj.shape[0]
+    new=extend_idm(grid,idm,num_old)
+    if len(new)==0:
+        return adj,idm,new
+    num_nodes=num_old+len(new)
+    cents,rads,stacks=node_arrays(grid,idm,num_nodes)
+    pairs=new_candidate_pairs(cents,rads,stacks,num_old)
+    if ringed:
+        skip=ring_skip(grid,idm,num_nodes)
+        pairs=pairs[~(skip[pairs[:,0]]&skip[pairs[:,1]])]
+    edges=np.concatenate((adjacency_edges(adj),are_linked_batch(cents[pairs[:,0]],cents[pairs[:,1]],rads[pairs[:,0]],rads[pairs[:,1]],pairs[:,0],pairs[:,1],rng)))
+    if ringed:
+        edges=ring_links(grid,idm,set(zip(edges[:,0].tolist(),edges[:,1].tolist())))
+    print("Time to compile "+str(len(new))+" new nodes: "+str(datetime.timedelta(seconds=(time.time()-start))))
+    return to_adjacency(edges,num_nodes,dense),idm,new
+
+#Function to compile just the nodes added to a hex grid since it was compiled into adj and idm by to_graph_hex() (or this function), instead of the whole grid again. Boundary
+#copies take their base's links (see copy_edges()), and maxi circles are checked against the nodes around them just as to_graph_hex() does. Returns the new adjacency matrix,
+#the extended index matrix, and the new nodes (see extend_idm())
+def to_graph_hex_delta(grid,spacing,adj,idm,dense=False):
+    start=time.time()
+    num_old=adj.shape[0]
+    new=extend_idm(grid,idm,num_old)
+    if len(new)==0:
+        return adj,idm,new
+    num_nodes=num_old+len(new)
+    #A new node is a boundary copy if it's the same as the first node in its stack
+    copy=np.array([grid[ybox][xbox][node]==grid[ybox][xbox][0] for ind,ybox,xbox,node in new.tolist()],dtype=bool)
+    bases=np.array([idm[ybox][xbox][0] for ind,ybox,xbox,node in new.tolist()],dtype=np.int64)
+    edges=[adjacency_edges(adj),copy_edges(adj,new[copy,0],bases[copy])]
+    #Everything else is a maxi circle
+    off_lattice=new[~copy,0]
+    if len(off_lattice)>0:
+        cents,rads,stacks=node_arrays(grid,idm,num_nodes)
+        near=float(np.sqrt(2/3)*spacing)
+        ys,xs=np.divmod(stacks,len(grid[0]))
+        reach=cKDTree(cents).query_ball_point(cents[off_lattice],np.maximum(near,rads[off_lattice]+rads.max()))
+        for node_ind,adj_inds in zip(off_lattice,reach):
+            edges.append(hex_window_edges(node_ind,np.asarray(adj_inds,dtype=np.int64),cents,rads,stacks,ys,xs,near))
+    print("Time to compile "+str(len(new))+" new nodes: "+str(datetime.timedelta(seconds=(time.time()-start))))
+    return to_adjacency(np.concatenate(edges),num_nodes,dense),idm,new
+
+#Function to turn an edge set (or array) into a symmetric sparse (CSR) adjacency matrix. A dense matrix takes 8*N^2 bytes, which runs out of memory long before the grids get interesting,
+#so it is only built if asked for (which is handy for debugging small grids)
+def to_adjacency(g,num_nodes,dense=False):
+    #The lattice compilers hand over an (n,2) array of edges that may list an edge more than once or in either order, rather than an edge set
+    if isinstance(g,np.ndarray):
+        edges=np.unique(np.sort(g.astype(np.int64).reshape(-1,2),axis=1),axis=0)
+    else:
+        edges=np.array(sorted(g),dtype=np.int64).reshape(-1,2)
+    #Each edge appears in both the (i,j) and (j,i) entries, except for self-loops which only get the one entry
+    off_diag=edges[:,0]!=edges[:,1]
+    rows=np.concatenate((edges[:,0],edges[off_diag,1]))
+    cols=np.concatenate((edges[:,1],edges[off_diag,0]))
+    adj=csr_matrix((np.ones(len(rows),dtype=np.int8),(rows,cols)),shape=(num_nodes,num_nodes))
+    adj.sort_indices()
+    if dense:
+        return adj.toarray()
+    return adj
+
+#Function to get the index of the first node in every stack and the number of nodes in it, as arrays shaped like the grid. node_mtx() numbers the nodes stack by stack, so each
+#stack's nodes run from its start to its start plus its count. Assumes every row has the same number of stacks, which is true of all the regular lattices
+def stack_arrays(grid):
+    counts=np.array([[len(stack) for stack in row] for row in grid],dtype=np.int64)
+    starts=(np.cumsum(counts)-counts.ravel()).reshape(counts.shape)
+    return starts,counts
+
+#Function to turn a stencil into node pairs. Every stack at (row,col) is paired with the stack at (row+dy,col+dx), if it exists and if where (an optional boolean array shaped
+#like the grid) is True for the first stack. Each pair of stacks then expands to every pairing of their nodes, so stacked boundary copies come along for free
+def stencil_pairs(starts,counts,dy,dx,where=None):
+    ymax,xmax=counts.shape
+    src=(slice(max(0,-dy),ymax-max(0,dy)),slice(max(0,-dx),xmax-max(0,dx)))
+    dst=(slice(max(0,dy),ymax+min(0,dy)),slice(max(0,dx),xmax+min(0,dx)))
+    start1,count1,start2,count2=starts[src],counts[src],starts[dst],counts[dst]
+    if where is not None:
+        keep=where[src]
+        start1,count1,start2,count2=start1[keep],count1[keep],start2[keep],count2[keep]
+    start1,count1,start2,count2=start1.ravel(),count1.ravel(),start2.ravel(),count2.ravel()
+    #Number the node pairs within each stack pair and split the numbers into a position in each stack
+    per_pair=count1*count2
+    pair_num=np.repeat(np.arange(len(per_pair)),per_pair)
+    k=np.arange(per_pair.sum())-np.repeat(np.cumsum(per_pair)-per_pair,per_pair)
+    return np.column_stack((start1[pair_num]+k//count2[pair_num],start2[pair_num]+k%count2[pair_num]))
+
+#Function to keep the stencil pairs that are actually nearest neighbors: both are standard nodes (and on the lattice, if on_lattice is given) and their centers are no more
+#than near apart. If near isn't given, the nodes have to be no more than a radius apart (with a little slack for rounding)
+def lattice_edges(pairs,cents,rads,base_rad,near=None,on_lattice=None):
+    d=np.sqrt(np.sum((cents[pairs[:,0]]-cents[pairs[:,1]])**2,axis=1))
+    if near is None:
+        keep=(d-base_rad)<=0.001
+    else:
+        keep=d<=near
+    keep&=(rads[pairs[:,0]]==base_rad)&(rads[pairs[:,1]]==base_rad)
+    if on_lattice is not None:
+        keep&=on_lattice[pairs[:,0]]&on_lattice[pairs[:,1]]
+    return pairs[keep]
+
+#Function to link every maxi circle (anything without the base radius) to every node whose probability field intersects the periphery of the maxi circle's field. Rather than
+#measuring the distance to every node in the grid, a KD-tree picks out the nodes within the maxi circle's radius plus the largest radius around, and only those are checked
+#against the annulus
+def maxi_edges(cents,rads,base_rad):
+    maxi=np.nonzero(rads!=base_rad)[0]
+    if len(maxi)==0:
+        return np.zeros((0,2),dtype=np.int64)
+    reach=cKDTree(cents).query_ball_point(cents[maxi],rads[maxi]+rads.max())
+    node1=np.repeat(maxi,[len(adj_inds) for adj_inds in reach])
+    node2=np.concatenate([np.asarray(adj_inds,dtype=np.int64) for adj_inds in reach])
+    d=np.sqrt(np.sum((cents[node1]-cents[node2])**2,axis=1))
+    keep=(d<(rads[node1]+rads[node2]))&(d>abs(rads[node1]-rads[node2]))
+    return np.column_stack((node1[keep],node2[keep]))
+
+#Function to gather the center coordinates, radius, and stack of every node into arrays indexed by node index. Every stack (grid cell) gets its own stack number.
+def node_arrays(grid,idm,num_nodes):
+    cents=np.zeros((num_nodes,2))
+    rads=np.zeros(num_nodes)
+    stacks=np.zeros(num_nodes,dtype=np.int64)
+    stack_num=0
+    for ybox in range(len(grid)):
+        for xbox in range(len(grid[ybox])):
+            for node in range(len(grid[ybox][xbox])):
+                ind=idm[ybox][xbox][node]
+                cents[ind]=grid[ybox][xbox][node][0:2]
+                rads[ind]=grid[ybox][xbox][node][2]
+                stacks[ind]=stack_num
+            stack_num+=1
+    return cents,rads,stacks
+
+#Function to find every pair of nodes whose probability fields could overlap (center distance no more than the sum of the radii), using a KD-tree instead of scanning
+#neighboring cells. Each unordered pair is returned once, as a row of an (n,2) array with the lower index first. Pairs within the same stack are left out, since nodes in the
+#same cell never link. The regular nodes are paired up with a single fixed-radius query. Maxi circles (anything with a larger radius than the typical node) each get their own
+#query out to their full reach, so they find everything they touch no matter how many cells they span.
+def candidate_pairs(cents,rads,stacks):
+    if len(rads)==0:
+        return np.zeros((0,2),dtype=np.int64)
+    tree=cKDTree(cents)
+    base_rad=np.median(rads)
+    small=np.nonzero(rads<=base_rad)[0]
+    big=np.nonzero(rads>base_rad)[0]
+    #Regular nodes against regular nodes. Two of them can't be further apart than twice the largest regular radius and still overlap
+    small_pairs=cKDTree(cents[small]).query_pairs(2*rads[small].max(),output_type='ndarray')
+    found=[small[small_pairs]]
+    #Maxi circles against everything
+    if len(big)>0:
+        reach=tree.query_ball_point(cents[big],rads[big]+rads.max())
+        lens=np.array([len(hits) for hits in reach])
+        node1=np.repeat(big,lens)
+        node2=np.concatenate([np.asarray(hits,dtype=np.int64) for hits in reach])
+        #Pairs of maxi circles turn up from both ends, so only keep one copy
+        keep=(node1!=node2)&((rads[node2]<=base_rad)|(node1<node2))
+        found.append(np.column_stack((node1[keep],node2[keep])))
+    pairs=np.concatenate(found).astype(np.int64).reshape(-1,2)
+    pairs=np.sort(pairs,axis=1)
+    #Throw out pairs that are out of range or in the same stack
+    d=np.sqrt(np.sum((cents[pairs[:,0]]-cents[pairs[:,1]])**2,axis=1))
+    keep=(d<=(rads[pairs[:,0]]+rads[pairs[:,1]]))&(stacks[pairs[:,0]]!=stacks[pairs[:,1]])
+    return pairs[keep]
+
+#Batched version of are_linked(). Takes arrays with the centers, radii, and indices of both nodes in every candidate pair, applies the maxi circle rules as masks, draws every
+#random link in one go from rng (a numpy Generator; a fresh one is made if none is given), and returns the accepted pairs as an (n,2) array of node indices, lower index first
+def are_linked_batch(cent1,cent2,rad1,rad2,node1_inds,node2_inds,rng=None):
+    if rng is None:
+        rng=np.random.default_rng()
+    cent1=np.asarray(cent1,dtype=float).reshape(-1,2)
+    cent2=np.asarray(cent2,dtype=float).reshape(-1,2)
+    rad1=np.asarray(rad1,dtype=float)
+    rad2=np.asarray(rad2,dtype=float)
+    d=np.sqrt((cent1[:,0]-cent2[:,0])**2+(cent1[:,1]-cent2[:,1])**2)
+    maxi=rad1!=rad2
+    #Maxi circles connect to everything touching their circumference, and to nothing else
+    linked=maxi&(d>=abs(rad1-rad2))&(d<=(rad1+rad2))
+    #Everything else gets randomized based on the prob distribution function
+    normal=~maxi
+    linked[normal]=prob_funcs.are_linked_batch(cent1[normal],cent2[normal],rad1[normal],rad2[normal],rng)
+    lo=np.minimum(node1_inds,node2_inds)[linked]
+    hi=np.maximum(node1_inds,node2_inds)[linked]
+    return np.column_stack((lo,hi)).astype(np.int64)
+
 #Function to detrmine if two nodes share a link based on their probability distribution overlap
 def are_linked(cent1,cent2,rad1,rad2,node1_ind,node2_ind,already_tried,g):
     node_lis=[node1_ind,node2_ind]
@@ -339,85 +620,54 @@ def are_linked(cent1,cent2,rad1,rad2,node1_ind,node2_ind,already_tried,g):
     d=np.sqrt((cent1[0]-cent2[0])**2+(cent1[1]-cent2[1])**2)
     #This is here to guarentee that maxi circles connect to everything touching their circumference
     if rad1!=rad2 and d>=abs(rad1-rad2) and d<=(rad1+rad2):
-        g[node1_ind][node2_ind]=1
-        g[node2_ind][node1_ind]=1
+        g=graphite_add_connection(g,node1_ind,node2_ind)
     #And maxi circles do not connect to anything else
     elif rad1!=rad2:
         pass
     #Run the prob_funcs function that randomizes the existance of a link between the kDNA loops based on the prob distribution function
     elif prob_funcs.are_linked(cent1,cent2,rad1,rad2):
-        #If there is a link, mark down the existance of an edge in the adjacency matrix
-        g[node1_ind][node2_ind]=1
-        g[node2_ind][node1_ind]=1
+        #If there is a link, mark down the existance of an edge in the edge set
+        g=graphite_add_connection(g,node1_ind,node2_ind)
     return already_tried,g
 
-#Function to generate a regular hexagonal grid by overlaying two regular triangular grids
+#Function to generate the nodes of a regular hexagonal grid by overlaying two regular triangular grids. Each row is effectively two, one for each sub-lattice, so there are
+#int(ydim/2) rows. Each holds int(xdim/2) nodes from each sub-lattice, less one so the grid has "even" sides: even rows leave off the first node of the first sub-lattice and odd
+#rows the last node of the second. Every node gets a radius of 1. The nodes in the first row, last row, and first two and last two cells of every row are the boundary
+def hexagonal_nodes(spacing,ydim,xdim,flag_bound=False):
+    rows=int(ydim/2)
+    columns=2*int(xdim/2)-1
+    nodes=_new_nodes(rows*columns,1)
+    y,cell=np.divmod(nodes['cell'],columns)
+    even=(y%2==0)
+    #Cells alternate between the two sub-lattices, starting with the second in even rows and the first in odd ones. x is the node's place in its sub-lattice's row
+    second=((y+cell)%2==0)
+    x=(cell+1-y%2)//2
+    #The bottom-left point will be at (0.5,0.5). After this, nodes are spaced as equilateral triangles, with odd rows shifted right by 1/2 the spacing. The second sub-lattice
+    #sits 0.5*spacing further right and sqrt(1/12)*spacing further up
+    nodes['x']=np.select([even&~second,even&second,~even&~second],[0.5+spacing*x,0.5+0.5*spacing+spacing*x,0.5+spacing*x+spacing/2],
+                         0.5+0.5*spacing+spacing*x+spacing/2)
+    nodes['y']=np.where(second,0.5+np.sqrt(1/12)*spacing+y*spacing*(np.sqrt(3)/2),0.5+y*spacing*(np.sqrt(3)/2))
+    if flag_bound:
+        nodes['flag']=(y==0)|(y==(rows-1))|(cell<=1)|(cell>=(columns-2))
+    return nodes
+
+#Function to generate a regular hexagonal grid, as a tuple of rows of nested lists (see hexagonal_nodes()). The nodes always get a radius of 1, so rad does nothing
 def hexagonal_grid(spacing, ydim, xdim, rad=0.5,flag_bound=False):
-    grid=list()
-    #Run through each row the user wants to generate. Each row is effectively two, one for each sub-lattice, so only iterate over 1/2 the height
-    for y in range(int(ydim/2)):
-        row=list()
-        del row[:]
-        #Run through the nodes the user wants to be in each row. Two nodes are added per iteration, one for each sub-lattice, so halve the number of iterations
-        for x in range(int(xdim/2)):
-            #If we are on an even row
-            if y%2==0:
-                #Don't do this for the first column in order to ensure the grid has "even" sides
-                if x!=0:
-                    #If we're flagging the boundary, this node will be a boundary node if it is in the first row, last row, last column, or second column
-                    if flag_bound:
-                        if y==0 or y==(int(ydim/2)-1) or x==1 or x==(int(xdim/2)-1):
-                            row.append([(0.5+spacing*x,0.5+y*spacing*(np.sqrt(3)/2),1,True),])
-                        else:
-                            row.append([(0.5+spacing*x,0.5+y*spacing*(np.sqrt(3)/2),1,False),])
-                    else:
-                        #Add the coordiantes of the node to the grid. The bottom-left point will be at (0.5,0.5). After this, nodes are spaced as equilateral triangles
-                        row.append([(0.5+spacing*x,0.5+y*spacing*(np.sqrt(3)/2),1),])
-                #If we're flagging the boundary, this node will be a boundary node if it is in the first row, last row, first column, or last column
-                if flag_bound:
-                    if y==0 or y==(int(ydim/2)-1) or x==0 or x==(int(xdim/2)-1):
-                        row.append([(0.5+0.5*spacing+spacing*x,0.5+np.sqrt(1/12)*spacing+y*spacing*(np.sqrt(3)/2),1,True),])
-                    else:
-                        row.append([(0.5+0.5*spacing+spacing*x,0.5+np.sqrt(1/12)*spacing+y*spacing*(np.sqrt(3)/2),1,False),])
-                else:
-                    #Add the corresponding point in the other sub-lattice, with x-coordinate increased by 0.5*spacing and y coordinate increased by sqrt(1/12)*spacing
-                    row.append([(0.5+0.5*spacing+spacing*x,0.5+np.sqrt(1/12)*spacing+y*spacing*(np.sqrt(3)/2),1),])
-            #If we are in an odd row
-            else:
-                #If we're flagging the boundary, this node will be a boundary node if it is in the first row, last row, first column, or last column
-                if flag_bound:
-                    if y==0 or y==(int(ydim/2)-1) or x==0 or x==(int(xdim/2)-1):
-                        row.append([(0.5+spacing*x+spacing/2,0.5+y*spacing*(np.sqrt(3)/2),1,True),])
-                    else:
-                        row.append([(0.5+spacing*x+spacing/2,0.5+y*spacing*(np.sqrt(3)/2),1,False),])
-                else:
-                    #The row's x-position has to be shifted by 1/2 the spacing to create a triangular grid
-                    row.append([(0.5+spacing*x+spacing/2,0.5+y*spacing*(np.sqrt(3)/2),1),])
-                #Don't do this for the last column in order to ensure the grid has "even" sides
-                if x!=(int(xdim/2)-1):
-                    #If we're flagging the boundary, this node will be a boundary node if it is in the first row, last row, first column, or second-to-last column
-                    if flag_bound:
-                        if y==0 or y==(int(ydim/2)-1) or x==0 or x==(int(xdim/2)-2):
-                            row.append([(0.5+0.5*spacing+spacing*x+spacing/2,0.5+np.sqrt(1/12)*spacing+y*spacing*(np.sqrt(3)/2),1,True),])
-                        else:
-                            row.append([(0.5+0.5*spacing+spacing*x+spacing/2,0.5+np.sqrt(1/12)*spacing+y*spacing*(np.sqrt(3)/2),1,False),])
-                    else:
-                        #Add the corresponding point in the other sub-lattice, with x-coordinate increased by 0.5*spacing and y coordinate increased by sqrt(1/12)*spacing
-                        row.append([(0.5+0.5*spacing+spacing*x+spacing/2,0.5+np.sqrt(1/12)*spacing+y*spacing*(np.sqrt(3)/2),1),])
-        #Add the row to the grid
-        grid.append(row.copy())
-    #Return the grid
-    return tuple(grid)
+    return tuple(nodes_to_grid(hexagonal_nodes(spacing,ydim,xdim,flag_bound),int(ydim/2),2*int(xdim/2)-1))
 
 #Function to supersaturate a hexagonal grid boundary with non-random node placement. New nodes will be placed directly atop the first node, will connect to everything the first
 #node connects to (and nothing more), and will not connect to other nodes in the same position. Unlike add_reg_boundary() below, the hex grid is special in that there are
-#effectively two columns' worth of boundary nodes on either side, as opposed to the one column on each side which add_reg_boundary() assumes
-def hexagonal_boundary(grid,sat):
+#effectively two columns' worth of boundary nodes on either side, as opposed to the one column on each side which add_reg_boundary() assumes. If mult (from stack_multiplicity())
+#is given, the copies are counted there instead of being added to the grid
+def hexagonal_boundary(grid,sat,mult=None):
     #Run through the top and bottom rows
     for row in (0,(len(grid)-1)):
         #Run through each point in these rows
         for node in range(len(grid[row])):
             #Both subrows in these two superrows are boundary rows. So, duplicate each node
+            if mult is not None:
+                mult[row][node]+=sat
+                continue
             for i in range(sat):
                 grid[row][node].append(grid[row][node][0])
     #Run through all the other rows
@@ -425,77 +675,55 @@ def hexagonal_boundary(grid,sat):
         #Run through the first two and last two nodes in these rows
         for node in (0,1,(len(grid[row])-2),(len(grid[row])-1)):
             #These are boundary nodes. So, duplicate them
+            if mult is not None:
+                mult[row][node]+=sat
+                continue
             for i in range(sat):
                 grid[row][node].append(grid[row][node][0])
     return grid
 
-#Function to generate a regular rectangular grid
+#Function to start counting boundary copies instead of adding them to the grid. Gives an array shaped like the grid with a 1 for every stack, which add_reg_boundary() and
+#hexagonal_boundary() add their saturation to when passed it. Every copy of a node sits on the same spot, links to exactly what the first node does in the lattice compilers,
+#and never links to the other copies, so the compiled graph only needs the first node, counted as many times as the stack has copies (see graph_funcs.to_graph()). The
+#dissolution then removes one copy at a time, and the node only goes once every copy has
+def stack_multiplicity(grid):
+    return np.ones((len(grid),len(grid[0])),dtype=np.int64)
+
+#Function to generate the nodes of a regular rectangular grid, one at every integer point
+def rectangular_nodes(rows, columns, spacing=1,rad=1,flag_bound=False):
+    nodes=_new_nodes(rows*columns,rad,_edge_cells(rows,columns) if flag_bound else None)
+    nodes['y'],nodes['x']=np.divmod(nodes['cell'],columns)
+    return nodes
+
+#Function to generate a regular rectangular grid, as a grid of nested lists
 def rectangular_grid(rows, columns, spacing=1,rad=1,flag_bound=False):
-    grid=list()
-    #Run through each row
-    for y in range(rows):
-        row=list()
-        del row[:]
-        #Run through each column
-        for x in range(columns):
-            #If we're flagging the boundary, do that
-            if flag_bound:
-                if y==0 or y==(rows-1) or x==0 or x==(columns-1):
-                    row.append([(x,y,rad,True),])
-                else:
-                    row.append([(x,y,rad,False),])
-            else:
-                #Add the coordinates as a node to the row
-                row.append([(x,y,rad),])
-        #Add the row to the grid
-        grid.append(row.copy())
-    #Return the grid
-    return grid
+    return nodes_to_grid(rectangular_nodes(rows,columns,spacing,rad,flag_bound),rows,columns)
 
-#Function to generate a regular triangular grid
+#Function to generate the nodes of a regular triangular grid. The bottom-left point will be at (0.5,0.5). After this, nodes are spaced as equilateral triangles, with odd rows
+#shifted right by 1/2 the spacing
+def triangular_nodes(rows, num_in_row, spacing=1,rad=1,flag_bound=False):
+    nodes=_new_nodes(rows*num_in_row,rad,_edge_cells(rows,num_in_row) if flag_bound else None)
+    y,x=np.divmod(nodes['cell'],num_in_row)
+    nodes['x']=np.where(y%2==0,0.5+spacing*x,0.5+spacing*x+spacing/2)
+    nodes['y']=0.5+y*spacing*(np.sqrt(3)/2)
+    return nodes
+
+#Function to generate a regular triangular grid, as a grid of nested lists
 def triangular_grid(rows, num_in_row, spacing=1,rad=1,flag_bound=False):
-     grid=list()
-     #Run through each row the user wants to generate
-     for y in range(rows):
-         row=list()
-         del row[:]
-         #Run through the nodes the user wants to be in each row
-         for x in range(num_in_row):
-             #If we are on an even row
-             if y%2==0:
-                 #If we're flagging the boundary, do that
-                 if flag_bound:
-                     if y==0 or y==(rows-1) or x==0 or x==(num_in_row-1):
-                         row.append([(0.5+spacing*x,0.5+y*spacing*(np.sqrt(3)/2),rad,True),])
-                     else:
-                         row.append([(0.5+spacing*x,0.5+y*spacing*(np.sqrt(3)/2),rad,False),])
-                 else:
-                     #Add the coordiantes of the node to the grid. The bottom-left point will be at (0.5,0.5). After this, nodes are spaced as equilateral triangles
-                     row.append([(0.5+spacing*x,0.5+y*spacing*(np.sqrt(3)/2),rad),])
-            #If we are in an odd row
-             else:
-                 #If we're flagging the boundary, do that
-                 if flag_bound:
-                     if y==0 or y==(rows-1) or x==0 or x==(num_in_row-1):
-                         row.append([(0.5+spacing*x+spacing/2,0.5+y*spacing*(np.sqrt(3)/2),rad,True),])
-                     else:
-                         row.append([(0.5+spacing*x+spacing/2,0.5+y*spacing*(np.sqrt(3)/2),rad,False),])
-                 else:
-                     #The row's x-position has to be shifted by 1/2 the spacing to create a triangular grid
-                     row.append([(0.5+spacing*x+spacing/2,0.5+y*spacing*(np.sqrt(3)/2),rad),])
-         #Add the row to the grid
-         grid.append(row.copy())
-     #Return the grid
-     return grid, spacing
-
-#Adds a regular boundary (new points placed directly atop existing ones) to a triangular, rectangular, or regularized randomized grid
-def add_reg_boundary(grid,saturation):
+    return nodes_to_grid(triangular_nodes(rows,num_in_row,spacing,rad,flag_bound),rows,num_in_row), spacing
+
+#Adds a regular boundary (new points placed directly atop existing ones) to a triangular, rectangular, or regularized randomized grid. If mult (from stack_multiplicity()) is
+#given, the copies are counted there instead of being added to the grid. Only do that for the lattices; in a randomized grid every copy gets its own random links
+def add_reg_boundary(grid,saturation,mult=None):
     #Grab number of rows/columns
     ymax=len(grid)-1
     xmax=len(grid[0])-1
     #Supersaturate the entire bottom/top rows
     for row in (0,ymax):
         for stack in range(len(grid[row])):
+            if mult is not None:
+                mult[row][stack]+=saturation
+                continue
             cur_node=grid[row][stack][0]
             for i in range(saturation):
                 #Each new node is a duplicate of the existing node. Incidentally, this removes the need for a flag_bound dichotomy
@@ -503,129 +731,50 @@ def add_reg_boundary(grid,saturation):
     #Supersaturate the entire first/last columns, excluding the corners as these were already done in the above step
     for row in range(1,ymax,1):
         for stack in (0,xmax):
+            if mult is not None:
+                mult[row][stack]+=saturation
+                continue
             cur_node=grid[row][stack][0]
             for i in range(saturation):
                 grid[row][stack].append(cur_node)
     return grid
 
 #Generates an adjacency and index matrix using a rectantular grid
-def to_graph_rectangular(grid):
+def to_graph_rectangular(grid,dense=False):
     #Grab the radius of 'standard" nodes in the base grid
     base_rad=grid[0][0][0][2]
     #Record start time
     start=time.time()
     #Grab the index matrix, which is the grid with every entry replaced by an index integer, and number of nodes in the grid
     idm,num_nodes=node_mtx(grid)
-    #Create an empty adjacency matrix
-    g=np.zeros((num_nodes,num_nodes))
-    #Run through each node in the grid
-    for row in range(len(grid)):
-         for stack in range(len(grid[row])):
-             for node in range(len(grid[row][stack])):
-                 #Retrieve the coordinates and radius, as well as the node's index
-                 stuff=grid[row][stack][node]
-                 coords=stuff[0:2]
-                 rad=stuff[2]
-                 node_ind=idm[row][stack][node]
-                 #If this is not a maxi circle
-                 if rad==base_rad:
-                     #Run through the four nearest-neighbor stacks
-                     for adj_nodes in [(row-1,stack),(row+1,stack),(row,stack-1),(row,stack+1)]:
-                         #Make sure it exists
-                         if adj_nodes[0]>=0 and adj_nodes[0]<len(grid) and adj_nodes[1]>=0 and adj_nodes[1]<len(grid[0]):
-                             #Run through every node in the stack
-                             for adj_node in range(len(grid[adj_nodes[0]][adj_nodes[1]])):
-                                 #Grab the adjacent node's coordiantes and radius
-                                 adj_stuff=grid[adj_nodes[0]][adj_nodes[1]][adj_node]
-                                 adj_coords=adj_stuff[0:2]
-                                 adj_rad=adj_stuff[2]
-                                 #If the adjacent node is not a maxi circle
-                                 if adj_rad==rad:
-                                     #And they are nearest neighbors (this is guarenteed in the current scheme, since seperation=radius=1. But, if this ever changes, this will
-                                     #be here to acomodate the new algorithm)
-                                     if (dist(coords,adj_coords)-rad)<=0.001:
-                                         #Retrieve the adacent node's index and create a link in the adjacency matrix
-                                         adj_ind=idm[adj_nodes[0]][adj_nodes[1]][adj_node]
-                                         g[node_ind][adj_ind]=1
-                                         g[adj_ind][node_ind]=1
-                 #If this node is a maxi circle
-                 else:
-                     #Run through every node in the grid
-                     for adj_row in range(len(grid)):
-                         for adj_stack in range(len(grid[adj_row])):
-                             for adj_node in range(len(grid[adj_row][adj_stack])):
-                                 adj_stuff=grid[adj_row][adj_stack][adj_node]
-                                 adj_coords=adj_stuff[0:2]
-                                 adj_rad=adj_stuff[2]
-                                 d=dist(adj_coords, coords)
-                                 #If the probability field of the adjacent node intersects the periphery of the maxi cirlce's field
-                                 if d<(adj_rad+rad) and d>abs(adj_rad-rad):
-                                     #Add a connection in the adjacency matrix
-                                     adj_ind=idm[adj_row][adj_stack][adj_node]
-                                     g[node_ind][adj_ind]=1
-                                     g[adj_ind][node_ind]=1
+    cents,rads,stacks=node_arrays(grid,idm,num_nodes)
+    starts,counts=stack_arrays(grid)
+    #The nearest-neighbor stacks are the ones directly left/right and above/below. Listing the right and upper neighbor of every stack covers each pair once. Standard nodes link
+    #to the standard nodes in those stacks as long as they're no more than a radius apart (this is guarenteed in the current scheme, since seperation=radius=1. But, if this
+    #ever changes, this will be here to acomodate the new algorithm)
+    pairs=np.concatenate((stencil_pairs(starts,counts,0,1),stencil_pairs(starts,counts,1,0)))
+    edges=np.concatenate((lattice_edges(pairs,cents,rads,base_rad),maxi_edges(cents,rads,base_rad)))
     #Display the time spent on compilation
     print("Time to compile: "+str(datetime.timedelta(seconds=(time.time()-start))))
-    return tuple(g), tuple(idm)
+    return to_adjacency(edges,num_nodes,dense), tuple(idm)
 
 #Generates an adjacency and index matrix using a triangular grid
-def to_graph_triangular(grid,spacing):
+def to_graph_triangular(grid,spacing,dense=False):
     #Grab the radius of 'standard" nodes in the base grid
     base_rad=grid[0][0][0][2]
     #Record start time
     start=time.time()
     #Grab the index matrix, which is the grid with every entry replaced by an index integer, and number of nodes in the grid
     idm,num_nodes=node_mtx(grid)
-    #Create an empty adjacency matrix
-    g=np.zeros((num_nodes,num_nodes))
-    #Run through each node in the grid
-    for row in range(len(grid)):
-         for stack in range(len(grid[row])):
-             for node in range(len(grid[row][stack])):
-                 #Retrieve the coordinates and radius, as well as the node's index
-                 stuff=grid[row][stack][node]
-                 coords=stuff[0:2]
-                 rad=stuff[2]
-                 node_ind=idm[row][stack][node]
-                 #If this is not a maxi circle
-                 if rad==base_rad:
-                     #Run through the six nearest-neighbor stacks
-                     for adj_nodes in [(row+1,stack),(row+1,stack+1),(row,stack-1),(row,stack+1),(row-1,stack),(row,stack+1),(row+1,stack-1),(row-1,stack-1)]:
-                         #Make sure it exists
-                         if adj_nodes[0]>=0 and adj_nodes[0]<len(grid) and adj_nodes[1]>=0 and adj_nodes[1]<len(grid[0]):
-                             #Run through every node in the stack
-                             for adj_node in range(len(grid[adj_nodes[0]][adj_nodes[1]])):
-                                 #Grab the adjacent node's coordiantes and radius
-                                 adj_stuff=grid[adj_nodes[0]][adj_nodes[1]][adj_node]
-                                 adj_coords=adj_stuff[0:2]
-                                 adj_rad=adj_stuff[2]
-                                 #If the adjacent node is not a maxi circle
-                                 if adj_rad==rad:
-                                     #And they are nearest neighbors (this is guarenteed in the current scheme, since seperation=radius=1. But, if this ever changes, this will
-                                     #be here to acomodate the new algorithm)
-                                     if (dist(coords,adj_coords)-rad)<=0.001:
-                                         #Retrieve the adacent node's index and create a link in the adjacency matrix
-                                         adj_ind=idm[adj_nodes[0]][adj_nodes[1]][adj_node]
-                                         g[node_ind][adj_ind]=1
-                                         g[adj_ind][node_ind]=1
-                 #If this node is a maxi circle
-                 else:
-                     #Run through every node in the grid
-                     for adj_row in range(len(grid)):
-                         for adj_stack in range(len(grid[adj_row])):
-                             for adj_node in range(len(grid[adj_row][adj_stack])):
-                                 adj_stuff=grid[adj_row][adj_stack][adj_node]
-                                 adj_coords=adj_stuff[0:2]
-                                 adj_rad=adj_stuff[2]
-                                 d=dist(adj_coords, coords)
-                                 #If the probability field of the adjacent node intersects the periphery of the maxi cirlce's field
-                                 if d<(adj_rad+rad) and d>abs(adj_rad-rad):
-                                     #Add a connection in the adjacency matrix
-                                     adj_ind=idm[adj_row][adj_stack][adj_node]
-                                     g[node_ind][adj_ind]=1
-                                     g[adj_ind][node_ind]=1
-                                
+    cents,rads,stacks=node_arrays(grid,idm,num_nodes)
+    starts,counts=stack_arrays(grid)
+    #Every stack neighbors the ones directly left and right of it. Odd rows are shifted right by half the spacing, so the two neighbors in the row above are stacks col-1 and col
+    #for an even row, and col and col+1 for an odd one. Listing the right and upper neighbors of every stack covers each pair once
+    rows=np.indices(counts.shape)[0]
+    even=(rows%2==0)
+    pairs=np.concatenate((stencil_pairs(starts,counts,0,1),stencil_pairs(starts,counts,1,0),stencil_pairs(starts,counts,1,-1,even),stencil_pairs(starts,counts,1,1,~even)))
+    edges=np.concatenate((lattice_edges(pairs,cents,rads,base_rad),maxi_edges(cents,rads,base_rad)))
     #Display the time spent on compilation
     print("Time to compile: "+str(datetime.timedelta(seconds=(time.time()-start))))
-    return tuple(g), tuple(idm)
+    return to_adjacency(edges,num_nodes,dense), tuple(idm)
 
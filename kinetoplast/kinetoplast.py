@@ -10,18 +10,23 @@ import prob_funcs
 import graph_funcs as gf
 import networkx as nx
 import bf_search as bf
+import results_io as rio
 import dissolusion_plot as dp
 import numpy as np
 import os
 
 #Class defining the kinetoplast object. This should let you have multiple kinetoplasts simulants running around at once. Maybe one day they'll even interact with eachother.
 class kinetoplast:
-    #Object instantiates with a base grid of the given dimensions and probability field radius. The adjacency matrix and network just have placeholder values
-    def __init__(self,xdim,ydim,rad,flag_bound=False,file_location='C:\\Users\\natha\\OneDrive\\Desktop\\CSULB\\kinetoplast'):
+    #Object instantiates with a base grid of the given dimensions and probability field radius. The adjacency matrix and network just have placeholder values. Pass rng (a numpy
+    #Generator) to draw everything random in the graph from it: the grid's nodes here, and the links whenever the graph is compiled, in full or just its new nodes
+    def __init__(self,xdim,ydim,rad,flag_bound=False,file_location='C:\\Users\\natha\\OneDrive\\Desktop\\CSULB\\kinetoplast',rng=None):
+        if rng is None:
+            rng=np.random.default_rng()
+        self.rng=rng
         self.xdim=xdim
         self.ydim=ydim
         self.rad=rad
-        self.grid=gg.craft_grid(xdim,ydim,rad)
+        self.grid=gg.craft_grid(xdim,ydim,rad,rng=rng)
         self.kpg=list()
         self.kpn=''
         self.idm=list()
@@ -37,33 +42,46 @@ class kinetoplast:
             file_location+="\\"
         self.file_location=file_location
 
-    #Method to add extra nodes in the boundary cells BEYOND the usual one
+    #Method to add extra nodes in the boundary cells BEYOND the usual one. If the graph has already been compiled, only the new nodes get compiled into it
     def add_boundary(self,saturation,reg=False):
         self.supersat=True
         self.reg=reg
+        self.sat+=saturation
         #The boundary can be a random placement of more nodes in each boundary cell or a stacking of additional nodes directly atop the first one
         if reg:
             self.grid=gg.add_reg_boundary(self.grid,saturation)
         else:
-            self.grid=gg.add_boundary(self.grid,self.xdim,self.ydim,self.rad,saturation)
+            self.grid=gg.add_boundary(self.grid,self.xdim,self.ydim,self.rad,saturation,rng=self.rng)
+        self._compile_new()
 
-    #Method to sprinkle maxi circles of a given radius and number throughout the grid
+    #Method to sprinkle maxi circles of a given radius and number throughout the grid. If the graph has already been compiled, only the new nodes get compiled into it
     def add_maxi_circles(self, maxi_rad, amount):
         self.maxi_rad=maxi_rad
         self.amount=amount
-        self.grid=gg.add_maxi_circles(self.grid,self.xdim,self.ydim,maxi_rad,amount)
+        self.grid=gg.add_maxi_circles(self.grid,self.xdim,self.ydim,maxi_rad,amount,rng=self.rng)
+        self._compile_new()
 
-    #Method to compile the current grid into an adjacency matrix and networkx graph object
-    def compile_graph(self,ringed=False):
+    #Method to compile the current grid into an adjacency matrix and networkx graph object. The links are drawn from the kinetoplast's rng unless another one is passed
+    def compile_graph(self,ringed=False,rng=None):
+        if rng is None:
+            rng=self.rng
         self.maxi=True
         self.ringed=ringed
-        self.kpg, idm =gg.to_graph(self.grid,ringed)
-        self.kpn=gf.to_network(self.kpg, self.grid,idm)
+        self.kpg, self.idm =gg.to_graph(self.grid,ringed,rng=rng)
+        self.kpn=gf.to_graph(self.kpg, self.grid,self.idm)
+
+    #Method to compile nodes added to the grid since the graph was last compiled into the graph, leaving the links between the nodes it already has alone. Does nothing if the
+    #graph hasn't been compiled yet
+    def _compile_new(self):
+        if not isinstance(self.kpn,gf.kpGraph):
+            return
+        self.kpg, self.idm, new =gg.to_graph_delta(self.grid,self.kpg,self.idm,rng=self.rng,ringed=self.ringed)
+        self.kpn=gf.extend_graph(self.kpn,self.kpg,self.grid,self.idm,new)
 
     #Debug method. Uses an algebraic circle intersect formula for diagnosing problems with the integrator
     def compile_graph_alg(self):
         self.kpg, idm =gg.to_graph_alg(self.grid)
-        self.kpn=gf.to_network(self.kpg, self.grid,idm)
+        self.kpn=gf.to_graph(self.kpg, self.grid,idm)
 
     #Method to plot the grid, with no connections between nodes. Will pop up a pyplot figure in a seperate window
     def plot_grid(self):
@@ -73,6 +91,10 @@ class kinetoplast:
     def plot_graph(self):
         gf.graph_visualizer(self.kpn)
 
+    #Method to get the adjacency matrix as a dense numpy array. The compiled matrix is kept sparse, so only do this for small grids (it's handy for debugging)
+    def dense_kpg(self):
+        return self.kpg.toarray()
+
     #Method to find the minimum degree in the graph
     def min_deg(self):
         return gf.min_deg(self.kpn)
@@ -83,13 +105,36 @@ class kinetoplast:
 
     def _makeDirectories(self):
         if not os.path.exists(self.file_location+'data\\'):
-            os.makedirs(self.file_location+'data\\')
+            os.makedirs(self.file_location+'data\\',exist_ok=True)
         if not os.path.exists(self.file_location+'pics\\'):
-            os.makedirs(self.file_location+'pics\\')
+            os.makedirs(self.file_location+'pics\\',exist_ok=True)
         return
 
-    #Method to run a dissolution search on the current kpn graph object. Will spit out the excel datafiles and a dissolution plot for each 
-    def dissolve(self, resolution, thresh, excel_name,auto_name=True):
+    #Method to run a dissolution search on the current kpn graph object. Will spit out the datafiles and a dissolution plot for each, and return the results 
+    def dissolve(self, resolution, thresh, excel_name,auto_name=True,seed=None,order=None,base=None):
+        if auto_name:
+            if self.supersat and self.maxi:
+                excel_name+='_maxiSat'
+            elif self.supersat:
+                excel_name+='_sat'
+            elif self.maxi:
+                excel_name+='_maxi'
+            else:
+                excel_name+='_base'
+        self._makeDirectories()
+        #Draw the removal order (unless we're replaying a saved one) and save it next to the datafile so this run can be replayed exactly
+        if order is None:
+            order=bf.removal_order(self.kpn,seed)
+        bf.save_order(order,self.file_location+'data\\'+excel_name)
+        results=bf.iter_search(resolution,self.kpn,thresh,order,base)
+        #Stream the results to the datafile, then plot them
+        results=rio.write_results(results,resolution,self.file_location+'data\\'+excel_name)
+        dp.plot_results(self.file_location+'pics\\'+excel_name,results)
+        return results
+
+    #Method to run a dissolution search that only records summary statistics for each step (largest and second largest components, number of components, mean finite cluster
+    #size, and surviving edges) rather than every component size. Spits out the excel datafile, but no dissolution plot
+    def dissolve_summary(self, resolution, thresh, excel_name,auto_name=True,seed=None,order=None,base=None):
         if auto_name:
             if self.supersat and self.maxi:
                 excel_name+='_maxiSat'
@@ -100,12 +145,15 @@ class kinetoplast:
             else:
                 excel_name+='_base'
         self._makeDirectories()
-        results=bf.bf_search(resolution,self.kpn,thresh)
-        bf.excel_io(results,resolution, self.file_location+'data\\'+excel_name)
-        dp.module_main(self.file_location+'pics\\'+excel_name, self.file_location+'data\\'+excel_name)
+        #Draw the removal order (unless we're replaying a saved one) and save it next to the datafile so this run can be replayed exactly
+        if order is None:
+            order=bf.removal_order(self.kpn,seed)
+        bf.save_order(order,self.file_location+'data\\'+excel_name)
+        results=bf.iter_search(resolution,self.kpn,thresh,order,base,summary=True)
+        return rio.write_summary(results,resolution,self.file_location+'data\\'+excel_name)
 
     #Method to run a dissolution search and output component plots at the given predetermined critical points
-    def dissolve_with_pics(self, resolution, thresh, excel_name,auto_name=True,picStep=500):
+    def dissolve_with_pics(self, resolution, thresh, excel_name,auto_name=True,picStep=500,seed=None,order=None,base=None):
         if auto_name:
             if self.supersat and self.maxi:
                 excel_name+='_maxiSat'
@@ -119,12 +167,18 @@ class kinetoplast:
         crit_points=list(np.linspace(0,int(nodenum-nodenum%picStep),num=int((nodenum-nodenum%picStep)/picStep+1),dtype=int))+[nodenum,]
         self._makeDirectories()
         path=self.file_location+'pics\\'+excel_name+"_componentPlots\\"
-        results=bf.bf_search_with_pics(resolution,self.kpn,thresh,crit_points,path)
-        bf.excel_io(results,resolution, self.file_location+'data\\'+excel_name)
-        dp.module_main(self.file_location+'pics\\'+excel_name, self.file_location+'data\\'+excel_name)
+        #Draw the removal order (unless we're replaying a saved one) and save it next to the datafile so this run can be replayed exactly
+        if order is None:
+            order=bf.removal_order(self.kpn,seed)
+        bf.save_order(order,self.file_location+'data\\'+excel_name)
+        results=bf.iter_search_with_pics(resolution,self.kpn,thresh,crit_points,path,order,base)
+        #Stream the results to the datafile, then plot them
+        results=rio.write_results(results,resolution,self.file_location+'data\\'+excel_name)
+        dp.plot_results(self.file_location+'pics\\'+excel_name,results)
+        return results
 
     #Method to run a dissolution search and record when the boundary lyses
-    def dissolve_flag_bound(self, resolution, thresh, excel_name):
+    def dissolve_flag_bound(self, resolution, thresh, excel_name,seed=None,order=None,base=None):
         if self.supersat and self.maxi:
             excel_name+='_maxiSat'
         elif self.supersat:
@@ -134,9 +188,15 @@ class kinetoplast:
         else:
             excel_name+='_base'
         self._makeDirectories()
-        results=bf.bf_search_flag_bound(resolution,self.kpn,thresh,self.sat)
-        bf.excel_io(results,resolution, self.file_location+'data\\'+excel_name)
-        dp.module_main(self.file_location+'pics\\'+excel_name,self.flag_bound, self.file_location+'data\\'+excel_name)
+        #Draw the removal order (unless we're replaying a saved one) and save it next to the datafile so this run can be replayed exactly
+        if order is None:
+            order=bf.removal_order(self.kpn,seed)
+        bf.save_order(order,self.file_location+'data\\'+excel_name)
+        results=bf.iter_search_flag_bound(resolution,self.kpn,thresh,self.sat,order,base)
+        #Stream the results to the datafile, then plot them
+        results=rio.write_results(results,resolution,self.file_location+'data\\'+excel_name)
+        dp.plot_results(self.file_location+'pics\\'+excel_name,results,self.flag_bound)
+        return results
     
 
 
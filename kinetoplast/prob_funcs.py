@@ -6,31 +6,51 @@ Date last modified: 06/10/2020
 Python Version: 3.7.2
 '''
 from scipy.integrate import quad, dblquad
-from scipy import sqrt, cos
-from numpy import arccos, isnan, pi
+import numpy as np
+from numpy import arccos, isnan, pi, sqrt, cos
 from random import random
 import warnings
 #Invalid values may periodically be found for angles and areas. These are screened for, but warning messages still pop up. So, disable warnings.
 warnings.simplefilter("ignore")
 
+#Value of the probability function when it is the same everywhere inside the circle, or None when it isn't. While this is set, prob_integrator() skips the numerical integration
+#and uses the closed-form circle intersection area instead. If prob_func() is ever given an r or t dependence, set this to None.
+const_prob=1.5
+
 #Function to define the probability function for every circle. Note that the other functions in this module do not currently support an angle (t) dependence.
 def prob_func(r,t):
-    return 1.5
+    return const_prob
 
 #Function to find the cartesian distance between points p1 and p2
 def dist(p1,p2):
     return sqrt((p1[0]-p2[0])**2+(p1[1]-p2[1])**2)
 
+#Function to find the area of the region where two circles with centers d apart overlap
+def lens_area(d,r1,r2):
+    #If the circles don't reach each other, there is no overlap
+    if d>=(r1+r2):
+        return 0
+    #If one circle lies entirely inside the other, the overlap is just the smaller circle
+    if d<=abs(r1-r2):
+        return pi*min(r1,r2)**2
+    #Otherwise, it's the two circular segments cut off by the chord through the intersection points
+    return r1**2*arccos((d**2+r1**2-r2**2)/(2*d*r1))+r2**2*arccos((d**2+r2**2-r1**2)/(2*d*r2))-sqrt(y(d,r1,r2))/2
+
+#Same as lens_area(), but for whole arrays of center distances and radii at once
+def lens_area_batch(d,r1,r2):
+    d,r1,r2=np.broadcast_arrays(np.asarray(d,dtype=float),np.asarray(r1,dtype=float),np.asarray(r2,dtype=float))
+    A=np.zeros(d.shape)
+    inside=d<=abs(r1-r2)
+    A[inside]=pi*np.minimum(r1,r2)[inside]**2
+    part=(d<(r1+r2))&~inside
+    dp,a,b=d[part],r1[part],r2[part]
+    #Clip the cosines so rounding can't push them out of arccos's domain
+    A[part]=(a**2*arccos(np.clip((dp**2+a**2-b**2)/(2*dp*a),-1,1))+b**2*arccos(np.clip((dp**2+b**2-a**2)/(2*dp*b),-1,1))
+             -sqrt(np.clip(y(dp,a,b),0,None))/2)
+    return A
+
 def alg_area(d,r1,r2):
-    A=r1**2*arccos((d**2+r1**2-r2**2)/(2*d*r1))+r2**2*arccos((d**2+r2**2-r1**2)/(2*d*r2))-sqrt(y(d,r1,r2))/2
-    if isnan(A):
-        A1=pi*r1**2
-        A2=pi*r2**2
-        if A1<A2:
-            A=A1
-        else:
-            A=A2
-    return A*prob_func(r,t)
+    return lens_area(d,r1,r2)*prob_func(0,0)
 
 def y(d,r1,r2):
     return (-d+r1+r2)*(d+r2-r1)*(d-r2+r1)*(d+r1+r2)
@@ -57,6 +77,9 @@ def intersect_check(cent1,cent2,rad1,rad2):
 
 #Function to integrate the probability distribution function over the intersect region.
 def prob_integrator(d,r1,r2):
+    #If the probability function is constant, the integral is just that constant times the overlap area, no integration needed
+    if const_prob is not None:
+        return const_prob*lens_area(d,r1,r2)
     #Find the angle at which the edge fo circle 1 and circle 2 intersect
     th=arccos((r1**2+d**2-r2**2)/(2*d*r1))
     #If the angle does not exist, then one circle is entirely within another
@@ -132,3 +155,27 @@ def are_linked_alg(cent1,cent2,rad1,rad2):
         return True
     else:
         return False
+
+#Batched version of prob_of_link(). cent1 and cent2 are (n,2) arrays of centers, rad1 and rad2 arrays of radii, and the result is an array of link probabilities
+def prob_of_link_batch(cent1,cent2,rad1,rad2):
+    cent1=np.asarray(cent1,dtype=float).reshape(-1,2)
+    cent2=np.asarray(cent2,dtype=float).reshape(-1,2)
+    rad1=np.asarray(rad1,dtype=float)
+    rad2=np.asarray(rad2,dtype=float)
+    d=np.sqrt((cent1[:,0]-cent2[:,0])**2+(cent1[:,1]-cent2[:,1])**2)
+    prob=np.zeros(len(d))
+    #Only pairs that actually intersect have any probability of a link
+    hit=d<(rad1+rad2)
+    if const_prob is not None:
+        prob[hit]=const_prob*lens_area_batch(d[hit],rad1[hit],rad2[hit])/(pi*rad1[hit]**2)
+    else:
+        #No closed form here, so fall back to integrating each pair
+        prob[hit]=[prob_integrator(d[i],rad1[i],rad2[i])/(pi*rad1[i]**2) for i in np.nonzero(hit)[0]]
+    return prob
+
+#Batched version of are_linked(). Draws all the random numbers from the numpy Generator rng in one call and returns a boolean array, True wherever there is a link
+def are_linked_batch(cent1,cent2,rad1,rad2,rng=None):
+    if rng is None:
+        rng=np.random.default_rng()
+    prob=prob_of_link_batch(cent1,cent2,rad1,rad2)
+    return rng.random(len(prob))<=prob
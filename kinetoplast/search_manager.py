@@ -15,12 +15,16 @@ from time import localtime, strftime, time
 from datetime import timedelta
 import os
 import pickle
-from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
 from compTracker import compTracker
+import bf_search as bf
+import results_io as rio
+import dissolusion_plot as dp
+import graph_store as gs
+from graph_funcs import graph_arrays, publish_graph, attach_graph, release_graph, kpGraph, from_networkx
 
 
-def run_hkinetoplast_search(rows=10, columns=10, boundary_sat=0,iterations=100,resolution=50,thresh=10,file_location='C:\\Users\\natha\\OneDrive\\Desktop\\CSULB\\kinetoplast\\',use_prev_file=''):
-    kp=hkinetoplast(columns,rows)
+def run_hkinetoplast_search(rows=10, columns=10, boundary_sat=0,iterations=100,resolution=50,thresh=10,file_location='C:\\Users\\natha\\OneDrive\\Desktop\\CSULB\\kinetoplast\\',use_prev_file='',workers=None,seed=None,multiplicity=False,kp=None,graph_store=None):
     date=strftime("%Y-%m-%d %H:%M:%S", localtime())[0:10].replace('-','')
     excel_name_base=date+'_RKP_NM_hexagonalGrid_sat'+str(boundary_sat+1)
     #All files from this run will go into a folder. If a folder of the same name already esitss, make a new one.
@@ -32,39 +36,48 @@ def run_hkinetoplast_search(rows=10, columns=10, boundary_sat=0,iterations=100,r
             k+=1
         excel_name_base+='_ind'+str(k)
         os.makedirs(file_location+excel_name_base)
-    kp=hkinetoplast(columns,rows,file_location=file_location+excel_name_base)
-    if boundary_sat>0:
-        #Do that
-        kp.add_boundary(boundary_sat)
-    #If we are using the same model, with random elements held fixed, as in another run, pull the numpy grid, networkx grid, and adjacency matrix from the previous file. Add these to the existing file, too, and update the kinetoplast object
-    if use_prev_file!='':
-        cgg,cidm,ckpn=load_graph(file_location+use_prev_file)
-        serialize_graph(cgg,cidm,ckpn,file_location+excel_name_base)
-        kp.grid=cgg
-        kp.idm=cidm
-        kp.kpn=deepcopy(ckpn)
-    #If this is a fresh graph, compile it, export the graph objects, and make a deep copy of kpn so it can be repeatedly dissolved without needed recompilation
+    #Compiled graphs are kept in the graph store, a folder under file_location unless told otherwise
+    if graph_store is None:
+        graph_store=file_location+'graphs\\'
+    #A kinetoplast can be handed in already compiled with its boundary in place (see __main__ below, which sweeps through saturations on one graph). It just needs to write to
+    #this run's folder. It wasn't built straight from the parameters, so its graph is stored under a hash of its contents
+    if kp is not None:
+        kp.file_location=file_location+excel_name_base+'\\'
+        if not isinstance(kp.kpn,kpGraph):
+            kp.compile_graph()
+        graph_name=gs.store_graph(graph_store,kp.grid,kp.idm,kp.kpn,kp.mult)
     else:
-        kp.compile_graph()
-        ckpn=deepcopy(kp.kpn)
-        serialize_graph(kp.grid,kp.idm,ckpn,file_location+excel_name_base)
-    #Do this as many times as the user requests
-    for i in range(iterations):
-        #Generate the output file name
-        excel_name=excel_name_base+'_iter'+str((i+1))
-        if i==0 or i==1:
-            kp.dissolve_with_pics(resolution,thresh,excel_name,auto_name=False,picStep=500)
+        kp=hkinetoplast(columns,rows,file_location=file_location+excel_name_base)
+        #If we are using the same model as in another run, use the graph that run did. Otherwise, look the graph up by what it's built from. There's nothing random in the hex
+        #lattice, so no seed
+        if use_prev_file!='':
+            graph_name=prev_graph_name(file_location+use_prev_file,graph_store)
         else:
-            kp.dissolve(resolution,thresh,excel_name,auto_name=False)
-        kp.kpn=deepcopy(ckpn)
-    ct=compTracker(file_location+excel_name_base,autogenFolder=True,thresh=0)
+            key=gs.graph_key('hexagonal',rows,columns,kp.rad,boundary_sat,sep=kp.sep,multiplicity=multiplicity)
+            graph_name=graph_store+key
+        if use_prev_file!='' or gs.has_graph(graph_name):
+            kp.grid,kp.idm,kp.kpg,kp.kpn,kp.mult=gs.load_graph(graph_name,'r')
+            kp.supersat=boundary_sat>0
+            kp.sat+=boundary_sat
+        #If this is a fresh graph, build and compile it, then put it in the store
+        else:
+            if boundary_sat>0:
+                #Do that. With multiplicity, each boundary stack is compiled as one node counted boundary_sat+1 times instead of boundary_sat+1 separate nodes
+                kp.add_boundary(boundary_sat,multiplicity)
+            kp.compile_graph()
+            gs.store_graph(graph_store,kp.grid,kp.idm,kp.kpn,kp.mult,key)
+    record_graph(graph_name,file_location+excel_name_base)
+    ckpn=kp.kpn
+    #Run the iterations across a pool of worker processes. Every iteration's results come back in memory, so compTracker doesn't have to read them all back in from file
+    all_results=run_iterations(kp,excel_name_base,iterations,resolution,thresh,workers,seed,graph_name)
+    ct=compTracker(file_location+excel_name_base,autogenFolder=True,thresh=0,results=all_results)
     ct.plotLargestComp()
     ct.plotSecondLargestComp()
     ct.export_data(outfolder='C:\\Users\\natha\\OneDrive\\Desktop\\CSULB\\kinetoplast\\to_aggregate\\',extraName='_'+excel_name_base)
     freadme=open(file_location+excel_name_base+'\\readme.txt','w')
     freadme.write("Date: "+strftime("%Y-%m-%d %H:%M:%S", localtime())[0:10]+'\n')
     freadme.write("Type: Hexagonal\n")
-    freadme.write("Number of nodes: "+str(ckpn.number_of_nodes())+'\n')
+    freadme.write("Number of nodes: "+str(ckpn.number_of_copies())+'\n')
     freadme.write("Rows: "+str(kp.xdim)+'\n')
     freadme.write("Columns: "+str(kp.ydim)+'\n')
     freadme.write("Probability field radius: "+str(kp.rad)+'\n')
@@ -75,8 +88,7 @@ def run_hkinetoplast_search(rows=10, columns=10, boundary_sat=0,iterations=100,r
     freadme.close()
     return
 
-def run_kinetoplast_search(rows=10, columns=10, boundary_sat=0,iterations=100,resolution=50,thresh=10,rad=0.95,file_location='C:\\Users\\natha\\OneDrive\\Desktop\\CSULB\\kinetoplast\\',use_prev_file=''):
-    kp=kinetoplast(columns,rows,rad,file_location=file_location)
+def run_kinetoplast_search(rows=10, columns=10, boundary_sat=0,iterations=100,resolution=50,thresh=10,rad=0.95,file_location='C:\\Users\\natha\\OneDrive\\Desktop\\CSULB\\kinetoplast\\',use_prev_file='',workers=None,seed=None,kp=None,graph_store=None,graph_seed=None):
     #Gather start time of computation
     start=time()
     date=strftime("%Y-%m-%d %H:%M:%S", localtime())[0:10].replace('-','')
@@ -90,38 +102,49 @@ def run_kinetoplast_search(rows=10, columns=10, boundary_sat=0,iterations=100,re
             k+=1
         excel_name_base+='_ind'+str(k)
         os.makedirs(file_location+excel_name_base)
-    kp=hkinetoplast(columns,rows,file_location=file_location+excel_name_base)
-    if boundary_sat>0:
-        #Do that
-        kp.add_boundary(boundary_sat)
-    #If we are using the same model, with random elements held fixed, as in another run, pull the numpy grid, networkx grid, and adjacency matrix from the previous file. Add these to the existing file, too, and update the kinetoplast object
-    if use_prev_file!='':
-        cgg,cidm,ckpn=load_graph(file_location+use_prev_file)
-        serialize_graph(cgg,cidm,ckpn,file_location+excel_name_base)
-        kp.grid=cgg
-        kp.idm=cidm
-        kp.kpn=deepcopy(ckpn)
-    #If this is a fresh graph, compile it, export the graph objects, and make a deep copy of kpn so it can be repeatedly dissolved without needed recompilation
+    if graph_store is None:
+        graph_store=file_location+'graphs\\'
+    #A kinetoplast can be handed in already compiled with its boundary in place, as for run_hkinetoplast_search(). Pass the seed its rng was made from as graph_seed so the
+    #readme records it
+    if kp is not None:
+        kp.file_location=file_location+excel_name_base+'\\'
+        if not isinstance(kp.kpn,kpGraph):
+            kp.compile_graph()
+        graph_name=gs.store_graph(graph_store,kp.grid,kp.idm,kp.kpn)
     else:
-        kp.compile_graph()
-        ckpn=deepcopy(kp.kpn)
-        serialize_graph(kp.grid,kp.idm,ckpn,file_location+excel_name_base)
-    #Do this as many times as the user requests
-    for i in range(iterations):
-        #Generate the output file name
-        excel_name=excel_name_base+'_iter'+str((i+1))
-        if i==0 or i==1:
-            kp.dissolve_with_pics(resolution,thresh,excel_name,auto_name=False,picStep=500)
+        if use_prev_file!='':
+            graph_name=prev_graph_name(file_location+use_prev_file,graph_store)
+        else:
+            #Everything random in the graph is drawn from graph_seed, so the same seed always gives the same graph. If none is given, draw one, so the graph can still be stored
+            if graph_seed is None:
+                graph_seed=int(np.random.SeedSequence().entropy)
+            key=gs.graph_key('random',rows,columns,rad,boundary_sat,seed=graph_seed)
+            graph_name=graph_store+key
+        if use_prev_file!='' or gs.has_graph(graph_name):
+            kp=kinetoplast(columns,rows,rad,file_location=file_location+excel_name_base)
+            kp.grid,kp.idm,kp.kpg,kp.kpn,mult=gs.load_graph(graph_name,'r')
+            kp.supersat=boundary_sat>0
+            kp.sat+=boundary_sat
+        #If this is a fresh graph, build and compile it from the seed, then put it in the store
         else:
-            kp.dissolve(resolution,thresh,excel_name,auto_name=False)
-        kp.kpn=deepcopy(ckpn)
-    ct=compTracker(file_location+excel_name_base,autogenFolder=True,thresh=0)
+            kp=kinetoplast(columns,rows,rad,file_location=file_location+excel_name_base,rng=np.random.default_rng(graph_seed))
+            if boundary_sat>0:
+                #Do that
+                kp.add_boundary(boundary_sat)
+            kp.compile_graph()
+            gs.store_graph(graph_store,kp.grid,kp.idm,kp.kpn,key=key)
+    record_graph(graph_name,file_location+excel_name_base)
+    ckpn=kp.kpn
+    #Run the iterations across a pool of worker processes. Every iteration's results come back in memory, so compTracker doesn't have to read them all back in from file
+    all_results=run_iterations(kp,excel_name_base,iterations,resolution,thresh,workers,seed,graph_name)
+    ct=compTracker(file_location+excel_name_base,autogenFolder=True,thresh=0,results=all_results)
     ct.plotLargestComp()
     ct.plotSecondLargestComp()
     ct.export_data(outfolder='C:\\Users\\natha\\OneDrive\\Desktop\\CSULB\\kinetoplast\\to_aggregate\\',extraName='_'+excel_name_base)
     freadme=open(file_location+excel_name_base+'\\readme.txt','w')
     freadme.write("Date: "+strftime("%Y-%m-%d %H:%M:%S", localtime())[0:10]+'\n')
     freadme.write("Type: Random\n")
+    freadme.write("Graph seed: "+str(graph_seed)+'\n')
     freadme.write("Number of nodes: "+str(ckpn.number_of_nodes())+'\n')
     freadme.write("Rows: "+str(kp.xdim)+'\n')
     freadme.write("Columns: "+str(kp.ydim)+'\n')
@@ -141,25 +164,76 @@ def run_kinetoplast_search(rows=10, columns=10, boundary_sat=0,iterations=100,re
         
         
 
-def serialize_graph(gg,idm,kpn,folder):
-    f=open(folder+"\\grid.txt",'wb')
-    pickle.dump(gg,f)
-    f.close()
-    del f
-    #f=open(folder+"\\kpg.txt",'wb')
-    #pickle.dump(kpg,f)
-    #f.close()
-    #del f
-    f=open(folder+"\\idm.txt",'wb')
-    pickle.dump(idm,f)
-    f.close()
-    del f
-    f=open(folder+"\\kpn.txt",'wb')
-    pickle.dump(kpn,f)
+#The compiled graph each worker process dissolves, attached when the worker starts: the shared memory blocks (which have to stay open while the worker runs), the dissolution
+#search base built on top of them, and the multiplicity of each node. Workers never get a copy of the networkx graph, so starting one costs the same however big the graph is
+_worker_blocks=None
+_worker_base=None
+_worker_mult=None
+
+#Function to attach a worker to the graph. spec is either what publish_graph() handed back or, for a graph in the graph store, its name, in which case the arrays are
+#memory-mapped straight from the store's files
+def _init_worker(spec):
+    global _worker_blocks,_worker_base,_worker_mult
+    if isinstance(spec,str):
+        arrays=gs.load_arrays(spec,'r')
+    else:
+        arrays,_worker_blocks=attach_graph(spec)
+    _worker_base=bf.csr_base(arrays['indptr'],arrays['indices'])
+    _worker_mult=arrays['mult']
+    return
+
+#Function for a worker process to run a single iteration. Does the same as kinetoplast.dissolve(), but from the shared graph. The datafile and plot are written to the run's
+#folder as usual, and only the compact results come back
+def _dissolve_iteration(data_name,pic_name,resolution,thresh,seed):
+    order=bf.base_removal_order(_worker_base,seed,_worker_mult)
+    bf.save_order(order,data_name)
+    results=rio.write_results(bf.iter_search(resolution,None,thresh,order,_worker_base),resolution,data_name)
+    dp.plot_results(pic_name,results)
+    return results
+
+#Function to run the dissolution iterations of a search across a pool of worker processes (one per core unless workers says otherwise). If graph_name names kp's graph in the
+#graph store, every worker memory-maps it from there, so the OS's file cache holds the one copy they all read from and the graph never has to fit in RAM. Otherwise, the
+#compiled graph is published to shared memory once and every worker attaches to it. The first two iterations also export component plots, which need the networkx graph, so
+#they run here while the workers get on with the rest. Each iteration gets its own removal order seed spawned from seed, so a whole search can be repeated exactly by passing
+#the same seed. Returns the results of every iteration, in order
+def run_iterations(kp,excel_name_base,iterations,resolution,thresh,workers=None,seed=None,graph_name=None):
+    seeds=np.random.SeedSequence(seed).spawn(iterations)
+    #Generate the output file names
+    excel_names=[excel_name_base+'_iter'+str((i+1)) for i in range(iterations)]
+    kp._makeDirectories()
+    if graph_name is not None and gs.can_map(graph_name):
+        blocks,spec=[],graph_name
+    else:
+        blocks,spec=publish_graph(graph_arrays(kp.kpn))
+    try:
+        with ProcessPoolExecutor(max_workers=workers,initializer=_init_worker,initargs=(spec,)) as pool:
+            futures=[pool.submit(_dissolve_iteration,kp.file_location+'data\\'+excel_names[i],kp.file_location+'pics\\'+excel_names[i],resolution,thresh,seeds[i])
+                     for i in range(2,iterations)]
+            all_results=[kp.dissolve_with_pics(resolution,thresh,excel_names[i],auto_name=False,picStep=500,seed=seeds[i]) for i in range(min(2,iterations))]
+            all_results+=[future.result() for future in futures]
+    finally:
+        release_graph(blocks)
+    return all_results
+
+#Function to note in a run's folder which graph in the store it used, so a later run can use it again (see prev_graph_name()) without another copy of it being saved
+def record_graph(graph_name,folder):
+    f=open(folder+"\\graph.txt",'w')
+    f.write(graph_name)
     f.close()
-    del f
     return
 
+#Function to find the stored graph a previous run used. Runs from before the graph store pickled their graph into their own folder; that graph gets put in the store the first time
+#it's asked for
+def prev_graph_name(folder,graph_store):
+    if os.path.exists(folder+"\\graph.txt"):
+        f=open(folder+"\\graph.txt",'r')
+        graph_name=f.read().strip()
+        f.close()
+        return graph_name
+    gg,idm,kpn=load_graph(folder)
+    return gs.store_graph(graph_store,gg,idm,kpn)
+
+#Function to load the graph pickled into a run's folder by runs from before the graph store
 def load_graph(folder):
     f=open(folder+"\\grid.txt",'rb')
     gg=pickle.load(f)
@@ -177,17 +251,32 @@ def load_graph(folder):
     kpn=pickle.load(f)
     f.close()
     del f
+    #Graphs pickled before kpGraph existed are networkx graphs. Convert them so the dissolutions run on arrays
+    if not isinstance(kpn,kpGraph):
+        kpn=from_networkx(kpn)
     return gg,idm,kpn
 
 if __name__=="__main__":
+    #Compile each grid once and add to its boundary between runs, rather than building and compiling it again for every saturation. Only the new boundary nodes get compiled
+    #each time (see hkinetoplast.add_boundary())
+    kp=hkinetoplast(100,100)
+    kp.compile_graph()
     for sat in range(5,21):
         start=time()
-        run_hkinetoplast_search(rows=100, columns=100, boundary_sat=sat,iterations=100,resolution=50,thresh=50,file_location='C:\\Users\\natha\\OneDrive\\Desktop\\CSULB\\kinetoplast\\',use_prev_file='')
+        kp.add_boundary(sat+1-kp.sat)
+        run_hkinetoplast_search(rows=100, columns=100, boundary_sat=sat,iterations=100,resolution=50,thresh=50,file_location='C:\\Users\\natha\\OneDrive\\Desktop\\CSULB\\kinetoplast\\',use_prev_file='',kp=kp)
         end=time()
         print("Saturation "+str(sat)+" complete; time taken: "+str(timedelta(seconds=(end-start))))
 
+    #The random grid's interior is drawn once here, so every saturation is run on the same interior. Everything random, the boundary nodes added along the way included, comes
+    #from the one seed, so the whole sweep can be rebuilt from it
+    graph_seed=int(np.random.SeedSequence().entropy)
+    kp=kinetoplast(71,71,0.95,rng=np.random.default_rng(graph_seed))
+    kp.compile_graph()
     for sat in range(0,21):
         start=time()
-        run_kinetoplast_search(rows=71, columns=71, boundary_sat=sat,iterations=100,resolution=50,thresh=50,file_location='C:\\Users\\natha\\OneDrive\\Desktop\\CSULB\\kinetoplast\\',use_prev_file='')
+        if sat>0:
+            kp.add_boundary(1)
+        run_kinetoplast_search(rows=71, columns=71, boundary_sat=sat,iterations=100,resolution=50,thresh=50,file_location='C:\\Users\\natha\\OneDrive\\Desktop\\CSULB\\kinetoplast\\',use_prev_file='',kp=kp,graph_seed=graph_seed)
         end=time()
         print("Saturation "+str(sat)+" complete; time taken: "+str(timedelta(seconds=(end-start))))
@@ -10,6 +10,7 @@ import prob_funcs
 import graph_funcs as gf
 import networkx as nx
 import bf_search as bf
+import results_io as rio
 import dissolusion_plot as dp
 from numpy import sqrt
 import os
@@ -28,16 +29,23 @@ class tkinetoplast:
         self.supersat=False
         self.flag_bound=flag_bound
         self.sat=1
+        self.mult=None
         self.maxi_rad='N/A'
         self.amount=0
         if file_location[-1]!="\\":
             file_location+="\\"
         self.file_location=file_location
 
-    #Method to add extra nodes in the boundary cells BEYOND the usual one
-    def add_boundary(self,saturation):
+    #Method to add extra nodes in the boundary cells BEYOND the usual one. With multiplicity, the extra nodes are only counted, and each boundary stack compiles to a single node
+    #that takes as many removals to dissolve as the stack has nodes. The dissolution comes out the same, but the graph is no bigger than the one without a boundary
+    def add_boundary(self,saturation,multiplicity=False):
         self.supersat=True
-        self.grid=gg.add_reg_boundary(self.grid,saturation)
+        if multiplicity:
+            if self.mult is None:
+                self.mult=gg.stack_multiplicity(self.grid)
+            self.grid=gg.add_reg_boundary(self.grid,saturation,self.mult)
+        else:
+            self.grid=gg.add_reg_boundary(self.grid,saturation)
         self.sat+=saturation
 
     #Method to sprinkle maxi circles of a given radius and number throughout the grid
@@ -50,7 +58,7 @@ class tkinetoplast:
     #Method to compile the current grid into an adjacency matrix and networkx graph object
     def compile_graph(self):
         self.kpg, idm =gg.to_graph_triangular(self.grid,self.spacing)
-        self.kpn=gf.to_network(self.kpg, self.grid,idm)
+        self.kpn=gf.to_graph(self.kpg, self.grid,idm,mult=self.mult)
 
      #Method to plot the grid, with no connections between nodes. Will pop up a pyplot figure in a seperate window
     def plot_grid(self):
@@ -60,6 +68,10 @@ class tkinetoplast:
     def plot_graph(self):
         gf.graph_visualizer(self.kpn)
 
+    #Method to get the adjacency matrix as a dense numpy array. The compiled matrix is kept sparse, so only do this for small grids (it's handy for debugging)
+    def dense_kpg(self):
+        return self.kpg.toarray()
+
     #Method to find the minimum degree in the graph
     def min_deg(self):
         return gf.min_deg(self.kpn)
@@ -70,13 +82,36 @@ class tkinetoplast:
 
     def _makeDirectories(self):
         if not os.path.exists(self.file_location+'data\\'):
-            os.makedirs(self.file_location+'data\\')
+            os.makedirs(self.file_location+'data\\',exist_ok=True)
         if not os.path.exists(self.file_location+'pics\\'):
-            os.makedirs(self.file_location+'pics\\')
+            os.makedirs(self.file_location+'pics\\',exist_ok=True)
         return
 
-    #Method to run a dissolution search on the current kpn graph object. Will spit out the excel datafiles and a dissolution plot for each 
-    def dissolve(self, resolution, thresh, excel_name,auto_name=True):
+    #Method to run a dissolution search on the current kpn graph object. Will spit out the datafiles and a dissolution plot for each, and return the results 
+    def dissolve(self, resolution, thresh, excel_name,auto_name=True,seed=None,order=None,base=None):
+        if auto_name:
+            if self.supersat and self.maxi:
+                excel_name+='_maxiSat'
+            elif self.supersat:
+                excel_name+='_sat'
+            elif self.maxi:
+                excel_name+='_maxi'
+            else:
+                excel_name+='_base'
+        self._makeDirectories()
+        #Draw the removal order (unless we're replaying a saved one) and save it next to the datafile so this run can be replayed exactly
+        if order is None:
+            order=bf.removal_order(self.kpn,seed)
+        bf.save_order(order,self.file_location+'data\\'+excel_name)
+        results=bf.iter_search(resolution,self.kpn,thresh,order,base)
+        #Stream the results to the datafile, then plot them
+        results=rio.write_results(results,resolution,self.file_location+'data\\'+excel_name)
+        dp.plot_results(self.file_location+'pics\\'+excel_name,results)
+        return results
+
+    #Method to run a dissolution search that only records summary statistics for each step (largest and second largest components, number of components, mean finite cluster
+    #size, and surviving edges) rather than every component size. Spits out the excel datafile, but no dissolution plot
+    def dissolve_summary(self, resolution, thresh, excel_name,auto_name=True,seed=None,order=None,base=None):
         if auto_name:
             if self.supersat and self.maxi:
                 excel_name+='_maxiSat'
@@ -87,12 +122,15 @@ class tkinetoplast:
             else:
                 excel_name+='_base'
         self._makeDirectories()
-        results=bf.bf_search(resolution,self.kpn,thresh)
-        bf.excel_io(results,resolution, self.file_location+'data\\'+excel_name)
-        dp.module_main(self.file_location+'pics\\'+excel_name, self.file_location+'data\\'+excel_name)
+        #Draw the removal order (unless we're replaying a saved one) and save it next to the datafile so this run can be replayed exactly
+        if order is None:
+            order=bf.removal_order(self.kpn,seed)
+        bf.save_order(order,self.file_location+'data\\'+excel_name)
+        results=bf.iter_search(resolution,self.kpn,thresh,order,base,summary=True)
+        return rio.write_summary(results,resolution,self.file_location+'data\\'+excel_name)
 
     #Method to run a dissolution search and output component plots at the given predetermined critical points
-    def dissolve_with_pics(self, resolution, thresh, excel_name,auto_name=True,picStep=500):
+    def dissolve_with_pics(self, resolution, thresh, excel_name,auto_name=True,picStep=500,seed=None,order=None,base=None):
         if auto_name:
             if self.supersat and self.maxi:
                 excel_name+='_maxiSat'
@@ -102,16 +140,22 @@ class tkinetoplast:
                 excel_name+='_maxi'
             else:
                 excel_name+='_base'
-        nodenum=self.kpn.number_of_nodes()
+        nodenum=self.kpn.number_of_copies()
         crit_points=list(np.linspace(0,int(nodenum-nodenum%picStep),num=int((nodenum-nodenum%picStep)/picStep+1),dtype=int))+[nodenum,]
         self._makeDirectories()
         path=self.file_location+'pics\\'+excel_name+"_componentPlots\\"
-        results=bf.bf_search_with_pics(resolution,self.kpn,thresh,crit_points,path)
-        bf.excel_io(results,resolution, self.file_location+'data\\'+excel_name)
-        dp.module_main(self.file_location+'pics\\'+excel_name, self.file_location+'data\\'+excel_name)
+        #Draw the removal order (unless we're replaying a saved one) and save it next to the datafile so this run can be replayed exactly
+        if order is None:
+            order=bf.removal_order(self.kpn,seed)
+        bf.save_order(order,self.file_location+'data\\'+excel_name)
+        results=bf.iter_search_with_pics(resolution,self.kpn,thresh,crit_points,path,order,base)
+        #Stream the results to the datafile, then plot them
+        results=rio.write_results(results,resolution,self.file_location+'data\\'+excel_name)
+        dp.plot_results(self.file_location+'pics\\'+excel_name,results)
+        return results
 
     #Method to run a dissolution search and record when the boundary lyses
-    def dissolve_flag_bound(self, resolution, thresh, excel_name):
+    def dissolve_flag_bound(self, resolution, thresh, excel_name,seed=None,order=None,base=None):
         if self.supersat and self.maxi:
             excel_name+='_maxiSat'
         elif self.supersat:
@@ -121,7 +165,13 @@ class tkinetoplast:
         else:
             excel_name+='_base'
         self._makeDirectories()
-        results=bf.bf_search_flag_bound(resolution,self.kpn,thresh,self.sat)
-        bf.excel_io(results,resolution, self.file_location+'data\\'+excel_name)
-        dp.module_main(self.file_location+'pics\\'+excel_name,self.flag_bound, self.file_location+'data\\'+excel_name)
+        #Draw the removal order (unless we're replaying a saved one) and save it next to the datafile so this run can be replayed exactly
+        if order is None:
+            order=bf.removal_order(self.kpn,seed)
+        bf.save_order(order,self.file_location+'data\\'+excel_name)
+        results=bf.iter_search_flag_bound(resolution,self.kpn,thresh,self.sat,order,base)
+        #Stream the results to the datafile, then plot them
+        results=rio.write_results(results,resolution,self.file_location+'data\\'+excel_name)
+        dp.plot_results(self.file_location+'pics\\'+excel_name,results,self.flag_bound)
+        return results
     
@@ -5,72 +5,214 @@ Date created: 06/29/2020
 Date last modified: 06/29/2020
 Python Version: 3.7.2
 '''
-from random import choice
-import networkx as nx
-import xlsxwriter
+from bisect import bisect_left, insort
+import numpy as np
+from results_io3D import excel_io, excel_io_summary, summary_header
+from graph_funcs3D import kpGraph
 import os
 
 
-#Function to randomly remove a given number of nodes from the graph
-def dissolve(n, G):
-    #Iterate as many times as the user requests
-    for i in range(n):
-        #Remove a random node
-        G.remove_node(choice(list(G.nodes)))
+#Function to draw the order nodes will be removed in during a dissolution, as one random permutation of the graph's nodes. Drawing it once up front makes each removal
+#O(1), and since the order is just a list it can be saved with save_order() and replayed exactly. Pass a seed to get the same order every time
+def removal_order(G,seed=None):
+    nodes=list(G.nodes)
+    rng=np.random.default_rng(seed)
+    return [nodes[i] for i in rng.permutation(len(nodes))]
+
+#Function to save a removal order next to a datafile, so the dissolution can be replayed later
+def save_order(order,excel_name):
+    np.save(excel_name+'_order.npy',np.asarray(order))
+    return
+
+#Function to load a removal order saved by save_order()
+def load_order(excel_name):
+    return np.load(excel_name+'_order.npy').tolist()
+
+#Function to remove the next n nodes in the removal order from the graph. removed is the number of nodes already taken out, and the updated count is handed back with the graph
+def dissolve(n, G, order, removed=0):
+    G.remove_nodes_from(order[removed:(removed+n)])
     #Return the resultant graph
-    return G
+    return G, min(removed+n,len(order))
+
+#Function to find the root of a node's component in the union-find forest. Every node passed on the way up is pointed directly at the root (path compression), so repeated
+#lookups stay close to constant time
+def _find(parent,node):
+    root=node
+    while parent[root]!=root:
+        root=parent[root]
+    while parent[node]!=root:
+        parent[node],node=root,parent[node]
+    return root
+
+#Function to add one component of the given size to the size histogram. sizes is the sorted list of distinct sizes in the histogram, kept up to date so the step tuples can
+#be read off in order without sorting
+def _hist_add(hist,sizes,size):
+    if size in hist:
+        hist[size]+=1
+    else:
+        hist[size]=1
+        insort(sizes,size)
+
+#Function to take one component of the given size out of the size histogram
+def _hist_remove(hist,sizes,size):
+    if hist[size]==1:
+        del hist[size]
+        del sizes[bisect_left(sizes,size)]
+    else:
+        hist[size]-=1
+
+#Function to pull out everything uf_search() needs from a graph: its nodes, a lookup from node to position, and each node's neighbors by position. The graph itself is only
+#read, never changed, so one base can be built once and shared by any number of dissolutions of the same graph
+def base_arrays(G):
+    #A kpGraph already holds its neighbor lists as CSR arrays
+    if isinstance(G,kpGraph):
+        return csr_base(G.indptr,G.indices)
+    nodes=list(G.nodes)
+    pos={node:i for i,node in enumerate(nodes)}
+    adj=[[pos[neighbor] for neighbor in G.adj[node]] for node in nodes]
+    return nodes,pos,adj
+
+#Neighbor lists read straight out of a kpGraph's CSR arrays. adj[i] is a memoryview slice of indices, which hands back plain ints without copying anything
+class csrAdjacency:
+    def __init__(self,indptr,indices):
+        self.indptr=memoryview(np.ascontiguousarray(indptr,dtype=np.int64))
+        self.indices=memoryview(np.ascontiguousarray(indices,dtype=np.int64))
+
+    def __getitem__(self,node):
+        return self.indices[self.indptr[node]:self.indptr[node+1]]
+
+    def __len__(self):
+        return len(self.indptr)-1
+
+#Function to build a base for iter_search() from CSR arrays instead of a graph. Nodes are just their positions, 0 to n-1
+def csr_base(indptr,indices):
+    num_nodes=len(indptr)-1
+    return range(num_nodes),range(num_nodes),csrAdjacency(indptr,indices)
+
+#Function to run an entire dissolution as a generator, yielding each recorded step as soon as it's known. Uses the Newman-Ziff algorithm: the removal order is fixed up front,
+#then the nodes are added back in reverse order and merged with a weighted union-find, which costs about as much as one connected_components() call. Every merge is written to a
+#log along the way (at most one entry per node), so the dissolution can then be played forward by undoing the merges one removal at a time, yielding steps in the same order
+#the old forward search found them. Only the histogram and the merge log are ever held, so memory doesn't depend on how many steps get recorded. Each step is a tuple of
+#(component size, number of components of that size) pairs, largest first, or a summary row if summary is True (see summary_search()). G is never modified; removed nodes
+#only exist in this run's own union-find arrays. Pass base (from base_arrays()) to skip rebuilding it for every run on the same graph
+def iter_search(step,G,thresh,order=None,base=None,summary=False):
+    if base is None:
+        base=base_arrays(G)
+    nodes,pos,adj=base
+    num_nodes=len(nodes)
+    #The forward search never records anything if the graph starts out no bigger than the threshold
+    if num_nodes<=thresh:
+        return
+    #Draw the removal order if the caller didn't supply one
+    if order is None:
+        order=removal_order(G)
+    order=[pos[node] for node in order]
+    #parent is the union-find forest, size holds the component size at each root, and present notes which nodes have been added back so far
+    parent=list(range(num_nodes))
+    size=[1]*num_nodes
+    present=[False]*num_nodes
+    #Histogram of component sizes, keyed by size with the number of components of that size as the entry, plus the sorted list of sizes present in it
+    hist=dict()
+    sizes=list()
+    #Running totals for the summary rows: number of components, sum of the squared component sizes, and number of edges between nodes that are back
+    num_comps=0
+    sq_sum=0
+    num_edges=0
+    #The merge log. Adding node order[k] merged the component pairs with sizes (merged_a[i],merged_b[i]) for i from log_start[k] up to log_end[k], and brought edges_added[k]
+    #edges back with it
+    merged_a=list()
+    merged_b=list()
+    log_start=[0]*num_nodes
+    log_end=[0]*num_nodes
+    edges_added=[0]*num_nodes
+    for k in range(num_nodes-1,-1,-1):
+        #Add node order[k] back to the graph as a component of its own
+        node=order[k]
+        present[node]=True
+        _hist_add(hist,sizes,1)
+        num_comps+=1
+        sq_sum+=1
+        root=node
+        log_start[k]=len(merged_a)
+        #Merge it with the component of every neighbor that is already back
+        for neighbor in adj[node]:
+            if present[neighbor]:
+                edges_added[k]+=1
+                adj_root=_find(parent,neighbor)
+                if adj_root!=root:
+                    merged_a.append(size[root])
+                    merged_b.append(size[adj_root])
+                    num_comps-=1
+                    sq_sum+=2*size[root]*size[adj_root]
+                    _hist_remove(hist,sizes,size[root])
+                    _hist_remove(hist,sizes,size[adj_root])
+                    #Hang the smaller tree off the larger one to keep the trees shallow
+                    if size[root]<size[adj_root]:
+                        root,adj_root=adj_root,root
+                    parent[adj_root]=root
+                    size[root]+=size[adj_root]
+                    _hist_add(hist,sizes,size[root])
+        log_end[k]=len(merged_a)
+        num_edges+=edges_added[k]
+    #The union-find arrays aren't needed for the forward pass
+    del parent,size,present
+    #Now play the dissolution forward. Steps are recorded after every [step] removals, and only then: if the graph runs out of nodes before the largest component gets down to
+    #the threshold, the last full step is the last one recorded. That way step i is always exactly i*step dissolutions in, which is how the results get labelled
+    for k in range(num_nodes+1):
+        if k>0:
+            #Remove node order[k-1] by undoing the merges it caused, last one first, then taking its own singleton component away
+            for i in range(log_end[k-1]-1,log_start[k-1]-1,-1):
+                _hist_remove(hist,sizes,merged_a[i]+merged_b[i])
+                _hist_add(hist,sizes,merged_a[i])
+                _hist_add(hist,sizes,merged_b[i])
+                num_comps+=1
+                sq_sum-=2*merged_a[i]*merged_b[i]
+            _hist_remove(hist,sizes,1)
+            num_comps-=1
+            sq_sum-=1
+            num_edges-=edges_added[k-1]
+        if k%step==0:
+            if summary:
+                yield _summary_row(k,hist,sizes,num_nodes-k,num_comps,sq_sum,num_edges)
+            else:
+                #Two-tuples of (component size, number of components with this size), largest components first
+                yield tuple((comp_size,hist[comp_size]) for comp_size in reversed(sizes))
+            #Stop at the first step where the largest component is no bigger than the threshold
+            if len(sizes)==0 or sizes[-1]<=thresh:
+                return
+
+#Function to run a whole dissolution and collect every step from iter_search(). Returns the same master tuple as the old bf_search(), or an array of summary rows if summary is
+#True
+def uf_search(step,G,thresh,order=None,base=None,summary=False):
+    steps=iter_search(step,G,thresh,order,base,summary)
+    if summary:
+        return np.array(list(steps),dtype=float).reshape(-1,len(summary_header))
+    return tuple(steps)
+
+#Function to build one summary row from the union-find's running totals. The second largest component is the largest one if there's a tie for first. The mean finite cluster
+#size is the size of the component a random surviving node outside the largest component belongs to, on average (sum of s^2 over sum of s, leaving out the largest component)
+def _summary_row(dissolutions,hist,sizes,num_present,num_comps,sq_sum,num_edges):
+    largest=0
+    second=0
+    if len(sizes)>0:
+        largest=sizes[-1]
+        if hist[largest]>1:
+            second=largest
+        elif len(sizes)>1:
+            second=sizes[-2]
+    finite=num_present-largest
+    mean_finite=0
+    if finite>0:
+        mean_finite=(sq_sum-largest**2)/finite
+    return (dissolutions,largest,second,num_comps,mean_finite,num_edges)
+
+#Function to run a dissolution that only records summary statistics. Instead of every (size, count) pair, each step gets one row of summary_header: number of dissolutions,
+#largest component, second largest component, number of components, mean finite cluster size, and number of surviving edges. Returns a (steps, 6) array, so the memory and
+#output size only grow with the number of steps. Use iter_search(...,summary=True) to get the rows one at a time instead
+def summary_search(step,G,thresh,order=None,base=None):
+    return uf_search(step,G,thresh,order,base,summary=True)
 
 #Function to delte nodes and track the number and size of components
-def bf_search(step,G,thresh):
-    #Define list to hold all the component zise info at every step
-    master=list()
-    #The largest component in G is assumed to contain all the nodes at the start
-    max_size=nx.number_of_nodes(G)
-    #Go until every componet in G is smaller than the given threshold size
-    while max_size>thresh:
-        #Define list to hold all the component sizes at this step
-        cur_step_info=list()
-        del cur_step_info[:]
-        #Generate a list of component sizes. There will be one entry for each component, being the number of nodes in the component. The list will be in descending order.
-        components=[len(c) for c in sorted(nx.connected_components(G), key=len, reverse=True)]
-        prev_component=0
-        #Run through each component length
-        for component in components:
-            #If the components with this length have not already been tallied
-            if component !=prev_component:
-                #Add a two-tuple to the current step list, the first element being the length of the component, the second being the number of components with this length
-                cur_step_info.append((component,components.count(component)))
-                prev_component=component
-        #Add the current step info to the master list
-        master.append(tuple(cur_step_info))
-        #Get the largest component at this step
-        max_size=components[0]
-        #Dissolve more nodes in G
-        G=dissolve(step,G)
-    #Return the master list
-    return tuple(master)
-
-#Function to write results to file
-def excel_io(master,step_size, excel_name):
-    #Create output file
-    workbook=xlsxwriter.Workbook(excel_name+".xlsx")
-    #Add a worksheet to the output file
-    worksheet = workbook.add_worksheet()
-    #Add header
-    worksheet.write(0, 0, 'Dissolutions; Step size = '+str(step_size))
-    worksheet.write(0, 1, 'From here on, columns give pairs of numbers, 1st being component size and 2nd being the number of components of that size')
-    cur_row=1
-    #Run through each step
-    for step in master:
-        #Write the number of dissolutions at this step in the left column
-        worksheet.write(cur_row, 0, str(((cur_row-1)*step_size)))
-        cur_col=1
-        #Run through each component size tuple
-        for component in step:
-            #Write the tuple to the file
-            worksheet.write(cur_row, cur_col, str(component))
-            cur_col+=1
-        cur_row+=1
-    #Closet the output workbook
-    workbook.close()
-    return
+def bf_search(step,G,thresh,order=None,base=None):
+    #The union-find dissolution does all the work; see iter_search(), which hands out the same steps one at a time
+    return uf_search(step,G,thresh,order,base)
@@ -7,62 +7,141 @@ Python Version: 3.7.2
 '''
 import networkx as nx
 import numpy as np
+from scipy.sparse import csr_matrix, issparse
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+
+#Function to pull the edges out of an adjacency matrix as an (n,2) array, lower index first. Each edge shows up once, ordered by its lower index and then its higher one
+def edge_array(adj_mtx):
+    #The compilers hand over a sparse adjacency matrix. A dense one still works (handy when debugging small grids), but gets converted
+    if not issparse(adj_mtx):
+        adj_mtx=csr_matrix(np.asarray(adj_mtx))
+    adj_mtx=csr_matrix(adj_mtx)
+    rows=np.repeat(np.arange(adj_mtx.shape[0]),np.diff(adj_mtx.indptr))
+    cols=adj_mtx.indices
+    upper=cols>rows
+    return np.column_stack((rows[upper],cols[upper]))
 
 #Function to turn the grid and adjacency matrix into a networkx graph object
 def to_network(adj_mtx,grid,idm):
-    #Create an empty graph object
-    G=nx.Graph()
-    #Add every center as a node in the graph
-    G.add_nodes_from(range((len(adj_mtx))))
+    #Gather each node's coordinates into a list indexed by node index
+    coords=[None]*adj_mtx.shape[0]
     for zbox in range(len(grid)):
         #Run through each row in the grid
         for ybox in range(len(grid[zbox])):
             #Run through each cell in the row
             for xbox in range(len(grid[zbox][ybox])):
-                #Run through each node in the cell
+                #Run through each node in the cell and assign the node the coordinates in the grid
                 cell=grid[zbox][ybox][xbox]
                 for node in range(len(cell)):
-                    #Grab the node's assigned index
-                    node_ind=idm[zbox][ybox][xbox][node]
-                    #Assign the center's node the coordinates in the grid
-                    G.nodes[node_ind]['Coords']=cell[node]
-                    #Find all vertices the current node is already linked to
-                    cur_neighbors=nx.neighbors(G,node_ind)
-                    #Run through the node's row in the adjacency matrix
-                    for ind2 in range(len(adj_mtx[node_ind])):
-                        #If there is not already an edge connecting the two nodes and the adjacency matrix says there should be
-                        if ind2 not in cur_neighbors and adj_mtx[node_ind][ind2]==1:
-                            #Add an edge
-                            G.add_edge(node_ind,ind2)
+                    coords[idm[zbox][ybox][xbox][node]]=cell[node]
+    #Create the graph and add every node with its coordinates, then every edge, in one go each. Adding the edges lower index first in ascending order gives every node the same
+    #neighbor ordering the old row-by-row scan did
+    G=nx.Graph()
+    G.add_nodes_from((node_ind,{'Coords':coords[node_ind]}) for node_ind in range(len(coords)))
+    G.add_edges_from(edge_array(adj_mtx).tolist())
     return G
 
-#Function to plot a graph version of the kinetoplast model
+#Compact graph of the kinetoplast model, backed by NumPy arrays instead of networkx's dict-of-dicts. Nodes are numbered 0 to n-1. The neighbors of node i are
+#indices[indptr[i]:indptr[i+1]], in ascending order (the same CSR layout scipy uses), and every edge shows up once from each end. coords holds each node's x, y, and z
+#coordinates and rad its radius. The dissolution search, degree statistics, and plotting all work on it directly; use to_networkx() to get a networkx graph for anything else
+class kpGraph:
+    __slots__=('indptr','indices','coords','rad')
+
+    def __init__(self,indptr,indices,coords,rad):
+        self.indptr=indptr
+        self.indices=indices
+        self.coords=coords
+        self.rad=rad
+
+    @property
+    def nodes(self):
+        return range(len(self.indptr)-1)
+
+    def number_of_nodes(self):
+        return len(self.indptr)-1
+
+    def number_of_edges(self):
+        return len(self.indices)//2
+
+    #Method to get every node's degree as an array
+    def degree(self):
+        return np.diff(self.indptr)
+
+    def neighbors(self,node):
+        return self.indices[self.indptr[node]:self.indptr[node+1]]
+
+    #Method to get the edges as an (n,2) array, lower index first, like edge_array()
+    def edge_array(self):
+        rows=np.repeat(np.arange(self.number_of_nodes()),self.degree())
+        upper=self.indices>rows
+        return np.column_stack((rows[upper],self.indices[upper]))
+
+    #Method to build the same networkx graph to_network() would have, for ad-hoc analysis. The graph is a copy, so changing it doesn't change this one
+    def to_networkx(self):
+        coords=self.coords.tolist()
+        rad=self.rad.tolist()
+        G=nx.Graph()
+        G.add_nodes_from((node,{'Coords':tuple(coords[node])+(rad[node],)}) for node in range(len(coords)))
+        G.add_edges_from(self.edge_array().tolist())
+        return G
+
+#Function to build a kpGraph from an edge array (like the one edge_array() gives) and each node's grid tuple
+def _kpgraph_from(edges,tuples):
+    num_nodes=len(tuples)
+    #List every edge from both ends, then sort by node so each node's neighbors end up together, in ascending order
+    rows=np.concatenate((edges[:,0],edges[:,1])).astype(np.int64)
+    cols=np.concatenate((edges[:,1],edges[:,0])).astype(np.int64)
+    edge_order=np.lexsort((cols,rows))
+    indptr=np.zeros(num_nodes+1,dtype=np.int64)
+    indptr[1:]=np.cumsum(np.bincount(rows,minlength=num_nodes))
+    coords=np.array([t[:3] for t in tuples],dtype=float).reshape(num_nodes,3)
+    rad=np.array([t[3] for t in tuples],dtype=float)
+    return kpGraph(indptr,cols[edge_order],coords,rad)
+
+#Function to turn the grid and adjacency matrix into a kpGraph. Nodes are the same as to_network() gives
+def to_graph(adj_mtx,grid,idm):
+    #Gather each node's grid tuple into a list indexed by node index
+    tuples=[None]*adj_mtx.shape[0]
+    for zbox in range(len(grid)):
+        #Run through each row in the grid
+        for ybox in range(len(grid[zbox])):
+            #Run through each cell in the row
+            for xbox in range(len(grid[zbox][ybox])):
+                cell=grid[zbox][ybox][xbox]
+                for node in range(len(cell)):
+                    tuples[idm[zbox][ybox][xbox][node]]=cell[node]
+    return _kpgraph_from(edge_array(adj_mtx),tuples)
+
+#Function to turn a networkx graph (like the ones to_network() made) into a kpGraph. Nodes are renumbered in the order G lists them
+def from_networkx(G):
+    nodes=list(G.nodes)
+    pos={node:i for i,node in enumerate(nodes)}
+    edges=np.array([(pos[u],pos[v]) for u,v in G.edges],dtype=np.int64).reshape(-1,2)
+    return _kpgraph_from(edges,[G.nodes[node]['Coords'] for node in nodes])
+
+#Function to plot a graph version of the kinetoplast model, looking down the z-axis
 def graph_visualizer(kpn):
-    #Run throughe each edge
-    for edge in kpn.edges:
-        #Extract the coordinates of its two endpoints and plot them with a line connecting them
-        link_x=(kpn.nodes[edge[0]]['Coords'][0],kpn.nodes[edge[1]]['Coords'][0])
-        link_y=(kpn.nodes[edge[0]]['Coords'][1],kpn.nodes[edge[1]]['Coords'][1])
-        plt.plot(link_x,link_y,'.b-')
-    x=list()
-    y=list()
-    #Run through each node
-    for node in kpn.nodes:
-        try:
-            #Collect their coordinates
-            x.append(kpn.nodes[node]['Coords'][0])
-            y.append(kpn.nodes[node]['Coords'][1])
-        except:
-            print(node)
-    #Plot them all
-    plt.scatter(x,y)
+    if not isinstance(kpn,kpGraph):
+        kpn=from_networkx(kpn)
+    ax=plt.gca()
+    #Draw every edge as one collection rather than one plot call each, with the endpoints marked like the '.b-' lines used to
+    edges=kpn.edge_array()
+    ax.add_collection(LineCollection(kpn.coords[edges][:,:,:2],colors='b'))
+    ends=kpn.coords[edges.reshape(-1)]
+    ax.plot(ends[:,0],ends[:,1],'.b',linestyle='none')
+    #Plot the nodes
+    ax.scatter(kpn.coords[:,0],kpn.coords[:,1])
+    ax.autoscale_view()
     #Display the plot
     plt.show()
     return
 
 #Function to compute average degree of the graph
 def avg_deg(G):
+    #A kpGraph's degrees come straight from its CSR offsets
+    if isinstance(G,kpGraph):
+        return float(np.mean(G.degree()))
     #Get a list of two-tuples, first element being a node index and second being its degree
     lis=tuple(G.degree())
     #Extract all the degrees
@@ -73,6 +152,8 @@ def avg_deg(G):
 
 #Function to compute minimum degree of the graph
 def min_deg(G):
+    if isinstance(G,kpGraph):
+        return int(np.min(G.degree()))
     #Get a list of two-tuples, first element being a node index and second being its degree
     lis=tuple(G.degree())
     #Extract all the degrees
@@ -7,40 +7,68 @@ Python Version: 3.7.2
 '''
 from random import uniform
 import numpy as np
+from scipy.sparse import csr_matrix
 import matplotlib.pyplot as plt
-from copy import deepcopy
 import datetime
 import time
+import gc
 import prob_funcs3D as prob_funcs
 
-#Function to create a grid of points of size xdim x ydim x zdim. The grid will be broken up into 1x1x1 boxes, each with exactly one point randomly placed within it.
-def craft_grid3D(xdim,ydim,zdim,rad):
-    #Define the grid list
-    grid=list()
-    #Run through each plane of the grid
-    for zbox in range(zdim):
-        #Define and clear a list to house the plane
-        plane=list()
-        del plane[:]
-        #Run through each row of the grid
-        for ybox in range(ydim):
-            #Define and clear a list to house the row
-            row=list()
-            del row[:]
-            #Run through each column of the grid
-            for xbox in range(xdim):
-                #Choose a random (x,y) coordinate within the box
-                xcoord=uniform(xbox,(xbox+1))
-                ycoord=uniform(ybox,(ybox+1))
-                zcoord=uniform(zbox,(zbox+1))
-                #Add it as a tuple to the row
-                row.append([(xcoord,ycoord,zcoord,rad),])
-            #Add the row to the plane (as a shallow copy, for reasons that are hopefully obvious)
-            plane.append(row.copy())
-        #Add the plane to the grid
-        grid.append(plane.copy())
-    #Return the finished grid
-    return grid
+#Layout of the node arrays the *_nodes() generators build, one entry per node: its center, probability field radius, boundary flag, and where it sits in the grid. flag is
+#the optional last entry of the node's grid tuple (1 for True, 0 for False, -1 if there isn't one, which for now is always). cell is the number of the grid cell the node is in,
+#counting along each row of each plane in turn, and stack is its place in that cell's stack. Nodes are listed cell by cell and in stack order, which is the order node_mtx()
+#numbers them in, so a node's index is just its position in the array
+node_dtype=np.dtype([('x',float),('y',float),('z',float),('rad',float),('flag',np.int8),('cell',np.int64),('stack',np.int64)])
+
+#Function to start a node array with one node in each of num_cells cells, all of the given radius
+def _new_nodes(num_cells,rad):
+    nodes=np.zeros(num_cells,dtype=node_dtype)
+    nodes['rad']=rad
+    nodes['flag']=-1
+    nodes['cell']=np.arange(num_cells)
+    return nodes
+
+#Function to turn a node array into the grid everything else works on: a list of planes, each a list of rows, each a list of cells, each a list of node tuples (x,y,z,rad), with
+#the boundary flag tacked on the end if the nodes have one
+def nodes_to_grid(nodes,planes,rows,columns):
+    x=nodes['x'].tolist()
+    y=nodes['y'].tolist()
+    z=nodes['z'].tolist()
+    rad=nodes['rad'].tolist()
+    #None of the tuples and lists built here can be in a reference cycle, so keep the garbage collector from combing through them over and over while they're built
+    gc_enabled=gc.isenabled()
+    gc.disable()
+    try:
+        if len(nodes)>0 and np.all(nodes['flag']>=0):
+            tuples=list(zip(x,y,z,rad,(nodes['flag']==1).tolist()))
+        else:
+            tuples=list(zip(x,y,z,rad))
+        #Nodes are in cell order, so each cell's stack is one run of the tuples
+        ends=np.searchsorted(nodes['cell'],np.arange(1,planes*rows*columns+1)).tolist()
+        stacks=[tuples[start:end] for start,end in zip([0]+ends[:-1],ends)]
+        grid_rows=[stacks[(row*columns):((row+1)*columns)] for row in range(planes*rows)]
+        return [grid_rows[(zbox*rows):((zbox+1)*rows)] for zbox in range(planes)]
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+#Function to create the nodes of a grid of size xdim x ydim x zdim. The grid will be broken up into 1x1x1 boxes, each with exactly one point randomly placed within it. Pass rng
+#(a numpy Generator) to draw the points from it
+def craft_nodes3D(xdim,ydim,zdim,rad,rng=None):
+    if rng is None:
+        rng=np.random.default_rng()
+    nodes=_new_nodes(xdim*ydim*zdim,rad)
+    zbox,rest=np.divmod(nodes['cell'],xdim*ydim)
+    ybox,xbox=np.divmod(rest,xdim)
+    #Choose a random (x,y,z) coordinate within each box
+    nodes['x']=xbox+rng.random(len(nodes))
+    nodes['y']=ybox+rng.random(len(nodes))
+    nodes['z']=zbox+rng.random(len(nodes))
+    return nodes
+
+#Function to create a grid of points of size xdim x ydim x zdim, as a grid of nested lists (see craft_nodes3D())
+def craft_grid3D(xdim,ydim,zdim,rad,rng=None):
+    return nodes_to_grid(craft_nodes3D(xdim,ydim,zdim,rad,rng),zdim,ydim,xdim)
 
 #Function to add maxi-circles of a given radius throughout the grid
 def add_maxi_circles(grid,xdim,ydim,zdim,maxi_rad,amount):
@@ -58,31 +86,38 @@ def add_maxi_circles(grid,xdim,ydim,zdim,maxi_rad,amount):
         grid[zbox][ybox][xbox].append((x_coord,y_coord,z_coord,maxi_rad))
     return grid
     
-#Function to assign each node a graph vertex index.
+#Function to assign each node a graph vertex index. Nodes are numbered cell by cell, so each stack's indices are just the next run of numbers
 def node_mtx(grid):
-    #Initialize the index list
-    idm=deepcopy(grid)
+    idm=list()
     ind=0
-    for zbox in range(len(grid)):
-        #Run through each row of the grid
-        for ybox in range(len(grid[zbox])):
-            #Run through each cell in the row
-            for xbox in range(len(grid[zbox][ybox])):
-                #Run through each node in the cell
-                for node in range(len(grid[zbox][ybox][xbox])):
-                    #Assign the node an index, and replace the relevent entry in the index matrix with the index
-                    idm[zbox][ybox][xbox][node]=ind
-                    ind+=1
+    #Hold off the garbage collector while the lists are built, as in nodes_to_grid()
+    gc_enabled=gc.isenabled()
+    gc.disable()
+    try:
+        for plane in grid:
+            idm_plane=list()
+            #Run through each row of the plane
+            for row in plane:
+                idm_row=list()
+                #Run through each cell in the row, giving its nodes the next indices
+                for stack in row:
+                    idm_row.append(list(range(ind,(ind+len(stack)))))
+                    ind+=len(stack)
+                idm_plane.append(idm_row)
+            idm.append(idm_plane)
+    finally:
+        if gc_enabled:
+            gc.enable()
     return idm, ind
 
 #Function to creates an adjacency matrix for the graph of links.
-def to_graph(grid):
+def to_graph(grid,dense=False):
     #Record start time
     start=time.time()
     #Grab the index matrix, which is the grid with every entry replaced by an index integer, and number of nodes in the grid
     idm,num_nodes=node_mtx(grid)
-    #Create an empty adjacency matrix
-    g=np.zeros((num_nodes,num_nodes))
+    #Create an empty edge set. The adjacency matrix is only built from it once compilation is done, as a sparse matrix
+    g=set()
     #Create a dictionary to keep track of which pairs of nodes have already been processed to prevent repeat processing (which would increase the probability of links)
     already_tried=dict()
     #Run through each plane in the grid
@@ -137,7 +172,7 @@ def to_graph(grid):
     #Display the time spent on compilation
     end=time.time()
     print("Time to compile: "+str(datetime.timedelta(seconds=(end-start))))
-    return g, idm
+    return to_adjacency(g,num_nodes,dense), idm
 
 #Function to detrmine if two nodes share a link based on their probability distribution overlap
 def are_linked(cent1,cent2,rad1,rad2,node1_ind,node2_ind,already_tried,g):
@@ -152,54 +187,41 @@ def are_linked(cent1,cent2,rad1,rad2,node1_ind,node2_ind,already_tried,g):
     d=np.sqrt((cent1[0]-cent2[0])**2+(cent1[1]-cent2[1])**2+(cent1[2]-cent2[2])**2)
     #This is here to guarentee that maxi circles connect to everything touching their circumference
     if rad1!=rad2 and d>=abs(rad1-rad2) and d<=(rad1+rad2):
-        g[node1_ind][node2_ind]=1
-        g[node2_ind][node1_ind]=1
+        g=graphite_add_connection(g,node1_ind,node2_ind)
     #And maxi circles do not connect to anything else
     elif rad1!=rad2:
         pass
     #Run the prob_funcs function that randomizes the existance of a link between the kDNA loops based on the prob distribution function
     elif prob_funcs.are_linked(cent1,cent2,rad1,rad2):
-        #If there is a link, mark down the existance of an edge in the adjacency matrix
-        g[node1_ind][node2_ind]=1
-        g[node2_ind][node1_ind]=1
+        #If there is a link, mark down the existance of an edge in the edge set
+        g=graphite_add_connection(g,node1_ind,node2_ind)
     return already_tried,g
 
-def graphite_grid(xdim,ydim,zdim):
+#Function to generate the nodes of a graphite grid: zdim planes of hexagonal grid, one unit apart, with every other plane shifted 0.5*spacing right and sqrt(1/12)*spacing up.
+#Each plane is laid out like grid_gen.hexagonal_nodes(): int(ydim/2) rows, each holding int(xdim/2) nodes from each of two triangular sub-lattices, less one so the plane has
+#"even" sides. Every node gets a radius of 1
+def graphite_nodes(xdim,ydim,zdim):
     spacing=1
-    grid=list()
-    del grid[:]
-    #Run through each layer in the grid
-    for z in range(zdim):
-        plane=list()
-        del plane[:]
-        #Run through each row the user wants to generate. Each row is effectively two, one for each sub-lattice, so only iterate over 1/2 the height
-        for y in range(int(ydim/2)):
-            row=list()
-            del row[:]
-            #Run through the nodes the user wants to be in each row. Two nodes are added per iteration, one for each sub-lattice, so halve the number of iterations
-            for x in range(int(xdim/2)):
-                #If we are on an even row
-                if y%2==0:
-                    #Don't do this for the first column in order to ensure the grid has "even" sides
-                    if x!=0:
-                        #Add the coordiantes of the node to the grid. The bottom-left point will be at (0.5,0.5). After this, nodes are spaced as equilateral triangles
-                        #The plane's z and y coordinates will also all be shifted every other plane, hence the z%2 terms
-                        row.append([(0.5+spacing*x+(0.5*spacing*(z%2)),0.5+y*spacing*(np.sqrt(3)/2)+(np.sqrt(1/12)*spacing*(z%2)),z,1),])
-                    #Add the corresponding point in the other sub-lattice, with x-coordinate increased by 0.5*spacing and y coordinate increased by sqrt(1/12)*spacing
-                    row.append([(0.5+0.5*spacing+spacing*x+(0.5*spacing*(z%2)),0.5+np.sqrt(1/12)*spacing+y*spacing*(np.sqrt(3)/2)+(np.sqrt(1/12)*spacing*(z%2)),z,1),])
-                #If we are in an odd row
-                else:
-                    #The row's x-position has to be shifted by 1/2 the spacing to create a triangular grid
-                    row.append([(0.5+spacing*x+spacing/2+(0.5*spacing*(z%2)),0.5+y*spacing*(np.sqrt(3)/2)+(np.sqrt(1/12)*spacing*(z%2)),z,1),])
-                    #Don't do this for the last column in order to ensure the grid has "even" sides
-                    if x!=(int(xdim/2)-1):
-                        #Add the corresponding point in the other sub-lattice, with x-coordinate increased by 0.5*spacing and y coordinate increased by sqrt(1/12)*spacing
-                        row.append([(0.5+0.5*spacing+spacing*x+spacing/2+(0.5*spacing*(z%2)),0.5+np.sqrt(1/12)*spacing+y*spacing*(np.sqrt(3)/2)+(np.sqrt(1/12)*spacing*(z%2)),z,1),])
-            #Add the row to the grid
-            plane.append(row.copy())
-        grid.append(plane.copy())
-    #Return the grid
-    return tuple(grid)
+    rows=int(ydim/2)
+    columns=2*int(xdim/2)-1
+    nodes=_new_nodes(zdim*rows*columns,1)
+    z,rest=np.divmod(nodes['cell'],rows*columns)
+    y,cell=np.divmod(rest,columns)
+    even=(y%2==0)
+    #Cells alternate between the two sub-lattices, starting with the second in even rows and the first in odd ones. x is the node's place in its sub-lattice's row
+    second=((y+cell)%2==0)
+    x=(cell+1-y%2)//2
+    #The bottom-left point of the first plane will be at (0.5,0.5). After this, nodes are spaced as equilateral triangles, with odd rows shifted right by 1/2 the spacing. The
+    #second sub-lattice sits 0.5*spacing further right and sqrt(1/12)*spacing further up
+    nodes['x']=np.select([even&~second,even&second,~even&~second],[0.5+spacing*x,0.5+0.5*spacing+spacing*x,0.5+spacing*x+spacing/2],
+                         0.5+0.5*spacing+spacing*x+spacing/2)+(0.5*spacing*(z%2))
+    nodes['y']=np.where(second,0.5+np.sqrt(1/12)*spacing+y*spacing*(np.sqrt(3)/2),0.5+y*spacing*(np.sqrt(3)/2))+(np.sqrt(1/12)*spacing*(z%2))
+    nodes['z']=z
+    return nodes
+
+#Function to generate a graphite grid, as a tuple of planes of nested lists (see graphite_nodes())
+def graphite_grid(xdim,ydim,zdim):
+    return tuple(nodes_to_grid(graphite_nodes(xdim,ydim,zdim),zdim,int(ydim/2),2*int(xdim/2)-1))
 
 #Function to compute Cartesian distance in R3
 def dist(cent1,cent2):
@@ -207,13 +229,13 @@ def dist(cent1,cent2):
 
 #Function to convert a graphite grid into an adjacency matrix and index matrix. Different from to_graph because I can assume some things that significantly reduce computation
 #time in a graphite grid
-def to_graph_graphite(grid):
+def to_graph_graphite(grid,dense=False):
     #Record start time
     start=time.time()
     #Grab the index matrix, which is the grid with every entry replaced by an index integer, and number of nodes in the grid
     idm,num_nodes=node_mtx(grid)
-    #Create an empty adjacency matrix
-    g=np.zeros((num_nodes,num_nodes))
+    #Create an empty edge set. The adjacency matrix is only built from it once compilation is done, as a sparse matrix
+    g=set()
     #Run through each node in the grid
     for zbox in range(len(grid)):
         #Create variable to keep track of which nodes have been linked to the upper vs the lower plane
@@ -275,14 +297,30 @@ def to_graph_graphite(grid):
                         last_connect=int((-1)*last_connect)
     #Display the time spent on compilation
     print("Time to compile: "+str(datetime.timedelta(seconds=(time.time()-start))))
-    return g, idm
+    return to_adjacency(g,num_nodes,dense), idm
 
-#Function to add an edge to the adjacency matrix of a hexagonal grid                 
+#Function to add an edge to the edge set of a grid. Edges are stored once, lower index first
 def graphite_add_connection(g,node_ind,adj_ind):
-    g[node_ind][adj_ind]=1
-    g[adj_ind][node_ind]=1
+    if node_ind<adj_ind:
+        g.add((node_ind,adj_ind))
+    else:
+        g.add((adj_ind,node_ind))
     return g
 
+#Function to turn an edge set into a symmetric sparse (CSR) adjacency matrix. A dense matrix takes 8*N^2 bytes, which the graphite stacks outgrow very quickly, so it is only
+#built if asked for (which is handy for debugging small grids)
+def to_adjacency(g,num_nodes,dense=False):
+    edges=np.array(sorted(g),dtype=np.int64).reshape(-1,2)
+    #Each edge appears in both the (i,j) and (j,i) entries, except for self-loops which only get the one entry
+    off_diag=edges[:,0]!=edges[:,1]
+    rows=np.concatenate((edges[:,0],edges[off_diag,1]))
+    cols=np.concatenate((edges[:,1],edges[off_diag,0]))
+    adj=csr_matrix((np.ones(len(rows),dtype=np.int8),(rows,cols)),shape=(num_nodes,num_nodes))
+    adj.sort_indices()
+    if dense:
+        return adj.toarray()
+    return adj
+
 #Function to plot the grid for you viewing pleasure
 def grid_visualizer(grid):
     #Create seperate lists for all the x coords and all the y coords, with the indices of each list coinciding
@@ -10,6 +10,7 @@ import prob_funcs3D
 import graph_funcs3D as gf
 import networkx as nx
 import bf_search3D as bf
+import results_io3D as rio
 import dissolusion_plot3D as dp
 import os
 
@@ -50,7 +51,11 @@ class hkinetoplast3D:
     #Method to compile the current grid into an adjacency matrix and networkx graph object
     def compile_graph(self):
         self.kpg, idm =gg.to_graph_graphite(self.grid)
-        self.kpn=gf.to_network(self.kpg, self.grid,idm)
+        self.kpn=gf.to_graph(self.kpg, self.grid,idm)
+
+    #Method to get the adjacency matrix as a dense numpy array. The compiled matrix is kept sparse, so only do this for small grids (it's handy for debugging)
+    def dense_kpg(self):
+        return self.kpg.toarray()
 
     #Method to find the minimum degree in the graph
     def min_deg(self):
@@ -62,13 +67,36 @@ class hkinetoplast3D:
 
     def _makeDirectories(self):
         if not os.path.exists(self.file_location+'data\\'):
-            os.makedirs(self.file_location+'data\\')
+            os.makedirs(self.file_location+'data\\',exist_ok=True)
         if not os.path.exists(self.file_location+'pics\\'):
-            os.makedirs(self.file_location+'pics\\')
+            os.makedirs(self.file_location+'pics\\',exist_ok=True)
         return
 
-    ##Method to run a dissolution search on the current kpn graph object. Will spit out the excel datafiles and a dissolution plot for each 
-    def dissolve(self, resolution, thresh, excel_name,auto_name=True):
+    ##Method to run a dissolution search on the current kpn graph object. Will spit out the datafiles and a dissolution plot for each, and return the results 
+    def dissolve(self, resolution, thresh, excel_name,auto_name=True,seed=None,order=None,base=None):
+        if auto_name:
+            if self.supersat and self.maxi:
+                excel_name+='_maxiSat'
+            elif self.supersat:
+                excel_name+='_sat'
+            elif self.maxi:
+                excel_name+='_maxi'
+            else:
+                excel_name+='_base'
+        self._makeDirectories()
+        #Draw the removal order (unless we're replaying a saved one) and save it next to the datafile so this run can be replayed exactly
+        if order is None:
+            order=bf.removal_order(self.kpn,seed)
+        bf.save_order(order,self.file_location+'data\\'+excel_name)
+        results=bf.iter_search(resolution,self.kpn,thresh,order,base)
+        #Stream the results to the datafile, then plot them
+        results=rio.write_results(results,resolution,self.file_location+'data\\'+excel_name)
+        dp.plot_results(self.file_location+'pics\\'+excel_name,results)
+        return results
+
+    #Method to run a dissolution search that only records summary statistics for each step (largest and second largest components, number of components, mean finite cluster
+    #size, and surviving edges) rather than every component size. Spits out the excel datafile, but no dissolution plot
+    def dissolve_summary(self, resolution, thresh, excel_name,auto_name=True,seed=None,order=None,base=None):
         if auto_name:
             if self.supersat and self.maxi:
                 excel_name+='_maxiSat'
@@ -79,9 +107,12 @@ class hkinetoplast3D:
             else:
                 excel_name+='_base'
         self._makeDirectories()
-        results=bf.bf_search(resolution,self.kpn,thresh)
-        bf.excel_io(results,resolution, self.file_location+'data\\'+excel_name)
-        dp.module_main(self.file_location+'pics\\'+excel_name, self.file_location+'data\\'+excel_name)
+        #Draw the removal order (unless we're replaying a saved one) and save it next to the datafile so this run can be replayed exactly
+        if order is None:
+            order=bf.removal_order(self.kpn,seed)
+        bf.save_order(order,self.file_location+'data\\'+excel_name)
+        results=bf.iter_search(resolution,self.kpn,thresh,order,base,summary=True)
+        return rio.write_summary(results,resolution,self.file_location+'data\\'+excel_name)
     
 
 
